@@ -0,0 +1,105 @@
+"""
+为已有图片回填上传时才计算的派生字段
+
+用法 (在 backend 目录下，与 uvicorn 相同的工作目录):
+    python -m app.cli.backfill placeholders
+    python -m app.cli.backfill placeholders --batch-size 1000 --workers 8
+    python -m app.cli.backfill features
+
+只处理目标列为空的图片，按 ID 顺序分批计算、分批提交；中断后重跑即从未完成处继续。
+每批同时写入 updated 变更日志：客户端增量同步能拿到新字段，相似图片索引也据此重建
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import select, update, func
+
+from app.db.database import engine, SessionLocal
+from app.db.base import Image  # 经 base 导入，保证 relationship 依赖的模型都已注册
+from app.services.change_service import record_changes
+from app.services.placeholder_service import placeholder_for_file
+from app.services.similarity_service import features_for_file
+
+# 任务名 -> (判断是否已完成的列, 在进程池中执行的计算函数 (file_path, thumbnail_path) -> {列名: 值})
+JOBS = {
+    "placeholders": (Image.blurhash, placeholder_for_file),
+    "features": (Image.features, features_for_file),
+}
+
+
+async def run_backfill(args) -> int:
+    column, compute = JOBS[args.job]
+    pending_filter = column.is_(None)
+
+    async with SessionLocal() as db:
+        total = (await db.execute(select(func.count(Image.id)).where(pending_filter))).scalar()
+    print(f"[backfill:{args.job}] {total} images pending", flush=True)
+
+    done = errors = 0
+    last_id = 0
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    pool = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        while True:
+            async with SessionLocal() as db:
+                rows = (await db.execute(
+                    select(Image.id, Image.user_id, Image.file_path, Image.thumbnail_path)
+                    .where(pending_filter, Image.id > last_id)
+                    .order_by(Image.id)
+                    .limit(args.batch_size)
+                )).all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+
+                results = await asyncio.gather(
+                    *(loop.run_in_executor(pool, compute, row.file_path, row.thumbnail_path) for row in rows),
+                    return_exceptions=True
+                )
+                values = []
+                changed = {}
+                for row, result in zip(rows, results):
+                    if isinstance(result, Exception):
+                        errors += 1
+                        print(f"Skip image {row.id}: {result}")
+                    else:
+                        values.append({"id": row.id, **result})
+                        changed.setdefault(row.user_id, []).append(row.id)
+
+                if values:
+                    # ORM 按主键批量 UPDATE (executemany)
+                    await db.execute(update(Image), values)
+                    for user_id, image_ids in changed.items():
+                        await record_changes(db, user_id, image_ids, "updated")
+                    await db.commit()
+                done += len(values)
+
+            elapsed = time.perf_counter() - start
+            print(
+                f"[backfill:{args.job}] {done + errors}/{total} updated={done} errors={errors} "
+                f"{(done + errors) / elapsed:.1f} images/s",
+                flush=True
+            )
+    finally:
+        pool.shutdown(cancel_futures=True)
+        await engine.dispose()
+
+    return 1 if errors else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli.backfill", description="Backfill derived image columns")
+    parser.add_argument("job", choices=sorted(JOBS))
+    parser.add_argument("--batch-size", type=int, default=500, help="images per transaction")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run_backfill(parse_args())))
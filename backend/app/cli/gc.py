@@ -0,0 +1,61 @@
+"""
+手动执行的清理任务
+
+用法 (在 backend 目录下):
+    python -m app.cli.gc orphans --dry-run      # 只列出会被删除的孤儿文件
+    python -m app.cli.gc orphans --grace 86400
+    python -m app.cli.gc changes --days 30      # 删除超过保留期的变更日志
+
+周期清理 (ORPHAN_SWEEP_INTERVAL) 默认关闭，开启前先用 --dry-run 确认对账结果
+"""
+import sys
+import asyncio
+import argparse
+
+from app.core.workers import shutdown_pools
+from app.db.database import engine, SessionLocal
+from app.db.base import Image  # noqa: F401 经 base 导入，保证 relationship 依赖的模型都已注册
+from app.services.gc_service import sweep_orphans
+from app.services.change_service import prune_changes
+
+
+async def run_orphans(args) -> int:
+    stats = await sweep_orphans(grace_seconds=args.grace, dry_run=args.dry_run)
+    print(f"[gc:orphans] {stats}")
+    return 1 if stats["aborted"] else 0
+
+
+async def run_changes(args) -> int:
+    async with SessionLocal() as db:
+        removed = await prune_changes(db, retention_days=args.days)
+    print(f"[gc:changes] removed={removed}")
+    return 0
+
+
+JOBS = {
+    "orphans": run_orphans,
+    "changes": run_changes,
+}
+
+
+async def run_gc(args) -> int:
+    try:
+        return await JOBS[args.job](args)
+    finally:
+        shutdown_pools()
+        await engine.dispose()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli.gc", description="Clean up orphaned data")
+    parser.add_argument("job", choices=sorted(JOBS))
+    parser.add_argument("--dry-run", action="store_const", const=True, default=None,
+                        help="only report what would be removed (default: ORPHAN_SWEEP_DRY_RUN)")
+    parser.add_argument("--grace", type=int, default=None, help="orphans: only files older than this many seconds")
+    parser.add_argument("--days", type=int, default=None,
+                        help="changes: keep this many days of change log (default: CHANGE_LOG_RETENTION_DAYS)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run_gc(parse_args())))
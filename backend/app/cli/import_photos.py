@@ -0,0 +1,330 @@
+"""
+服务端目录批量导入 (初次迁移 NAS 图库用，不经过 HTTP 上传)
+
+用法 (在 backend 目录下，与 uvicorn 相同的工作目录):
+    python -m app.cli.import_photos /mnt/nas/photos --user alice
+    python -m app.cli.import_photos /mnt/nas/photos --user alice --workers 8 --batch-size 500 --analyze
+
+- 按内容哈希 (sha256) 去重：该用户库里已有的相同文件直接跳过，上传过的也算
+- 扫描文件头 / 复制原图 / 生成缩略图在进程池中执行
+- 逆地理编码按批去重：坐标取约 100 米精度作为缓存键，同一地点的照片只查一次
+- 每批一个事务集合式写入 Image / Tag / image_tag_map，提交后追加断点文件；
+  中断后原样重跑即可续传，已提交的文件只做一次 stat 比对
+- 中断时已复制但未提交的文件由孤儿清理 (python -m app.cli.gc orphans 或 ORPHAN_SWEEP_INTERVAL) 回收
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.database import engine, SessionLocal
+from app.db.base import Image, User  # 经 base 导入，保证 relationship 依赖的模型都已注册
+from app.db.migrations import verify_schema
+from app.services.image_service import IMAGE_EXTENSIONS, scan_image_file, store_image_file, geocode_batch
+from app.services.tag_service import ensure_tags, link_tags
+from app.services.change_service import record_changes
+from app.services.ai_service import analyze_and_save
+
+# 坐标保留的小数位数 (3 位约 100 米)，作为逆地理编码缓存键
+GEO_PRECISION = 3
+
+
+class Checkpoint:
+    """
+    JSON Lines 断点文件，每行一个已提交 (或确认重复) 的源文件。
+    size / mtime 变化过的文件会重新处理；中断时写了半行的记录直接忽略，由哈希去重兜底
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        self.done[record["path"]] = (record["size"], record["mtime_ns"])
+                    except (ValueError, KeyError):
+                        continue
+        self._file = open(path, "a", encoding="utf-8")
+
+    def is_done(self, path: str, stat) -> bool:
+        return self.done.get(path) == (stat.st_size, stat.st_mtime_ns)
+
+    def mark(self, entries):
+        for path, stat in entries:
+            record = {"path": path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+class Progress:
+    def __init__(self, total: int, interval: float):
+        self.total = total
+        self.interval = interval
+        self.resumed = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.errors = 0
+        self.bytes = 0
+        self.start = time.perf_counter()
+        self._last_report = self.start
+
+    @property
+    def done(self) -> int:
+        return self.resumed + self.imported + self.duplicates + self.errors
+
+    def report(self, force: bool = False):
+        now = time.perf_counter()
+        if not force and now - self._last_report < self.interval:
+            return
+        self._last_report = now
+        elapsed = max(now - self.start, 1e-6)
+        processed = self.done - self.resumed
+        rate = processed / elapsed
+        eta = (self.total - self.done) / rate if rate > 0 else 0
+        percent = self.done / self.total * 100 if self.total else 100.0
+        print(
+            f"[import] {self.done}/{self.total} ({percent:.1f}%) "
+            f"imported={self.imported} duplicates={self.duplicates} resumed={self.resumed} errors={self.errors} | "
+            f"{rate:.1f} files/s {self.bytes / elapsed / 1024 / 1024:.1f} MB/s | "
+            f"elapsed {elapsed:.0f}s eta {eta:.0f}s",
+            flush=True
+        )
+
+
+def _walk(root: str):
+    """按路径顺序遍历，跳过隐藏目录和 NAS 自动生成的目录 (@eaDir 等)"""
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError as e:
+            print(f"Cannot read directory {directory}: {e}")
+            continue
+
+        subdirs = []
+        for entry in entries:
+            if entry.name.startswith((".", "@")):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            elif entry.is_file() and entry.name.rsplit(".", 1)[-1].lower() in IMAGE_EXTENSIONS:
+                yield entry.path, entry.stat()
+        stack.extend(reversed(subdirs))
+
+
+def _geo_key(coords):
+    return (round(coords[0], GEO_PRECISION), round(coords[1], GEO_PRECISION))
+
+
+async def _run_in_pool(pool, fn, items):
+    loop = asyncio.get_running_loop()
+    return await asyncio.gather(
+        *(loop.run_in_executor(pool, fn, item) for item in items),
+        return_exceptions=True
+    )
+
+
+async def _import_batch(batch, scans, user_id: int, args, state: dict):
+    progress, checkpoint, geo_cache = state["progress"], state["checkpoint"], state["geo_cache"]
+    finished = []  # 可以写入断点文件的 (path, stat)
+
+    # 1. 扫描失败的文件计入错误，下次重跑还会再试
+    candidates = []
+    for (path, stat), scan in zip(batch, scans):
+        if isinstance(scan, Exception):
+            progress.errors += 1
+            print(f"Skip {path}: {scan}")
+        else:
+            candidates.append((path, stat, scan))
+
+    # 2. 内容哈希去重 (库内 + 本批内)
+    hashes = list({scan["content_hash"] for _, _, scan in candidates})
+    async with SessionLocal() as db:
+        existing = set((await db.execute(
+            select(Image.content_hash).where(Image.user_id == user_id, Image.content_hash.in_(hashes))
+        )).scalars()) if hashes else set()
+
+    new_items = []
+    for path, stat, scan in candidates:
+        if scan["content_hash"] in existing:
+            progress.duplicates += 1
+            finished.append((path, stat))
+        else:
+            existing.add(scan["content_hash"])
+            new_items.append((path, stat, scan))
+
+    # 3. 复制原图 + 生成缩略图
+    stored = await _run_in_pool(state["pool"], store_image_file, [scan for _, _, scan in new_items])
+
+    # 4. 逆地理编码：只查缓存里没有的坐标
+    if not args.no_geocode:
+        misses = list({
+            _geo_key(scan["coords"]) for _, _, scan in new_items
+            if scan["coords"] and _geo_key(scan["coords"]) not in geo_cache
+        })
+        if misses:
+            for key, result in zip(misses, await geocode_batch(misses, args.geocode_concurrency)):
+                geo_cache[key] = result
+
+    # 5. 一个事务写入本批全部图片和标签
+    rows = []
+    async with SessionLocal() as db:
+        for (path, stat, scan), files in zip(new_items, stored):
+            if isinstance(files, Exception):
+                progress.errors += 1
+                print(f"Skip {path}: {files}")
+                continue
+            address, loc_tags = (None, [])
+            if scan["coords"] and not args.no_geocode:
+                address, loc_tags = geo_cache.get(_geo_key(scan["coords"]), (None, []))
+            image = Image(
+                user_id=user_id,
+                filename=os.path.basename(path),
+                file_path=files["file_path"],
+                thumbnail_path=files["thumbnail_path"],
+                resolution=scan["resolution"],
+                orientation=files["orientation"],
+                capture_time=scan["capture_time"],
+                location=address,
+                content_hash=scan["content_hash"],
+                blurhash=files["blurhash"],
+                dominant_color=files["dominant_color"],
+                aspect_ratio=scan["aspect_ratio"],
+                features=files["features"],
+            )
+            db.add(image)
+            rows.append((image, scan["auto_tags"] + loc_tags, files["file_path"], path, stat))
+
+        if rows:
+            await db.flush()
+            tag_ids = await ensure_tags(db, [name for _, names, *_ in rows for name in names])
+            await link_tags(db, [
+                (image.id, tag_ids[name]) for image, names, *_ in rows for name in names if name in tag_ids
+            ])
+            await record_changes(db, user_id, [image.id for image, *_ in rows], "created")
+            await db.commit()
+
+    for image, _, file_path, path, stat in rows:
+        progress.imported += 1
+        progress.bytes += stat.st_size
+        finished.append((path, stat))
+        if state["ai_queue"] is not None:
+            state["ai_queue"].put_nowait((image.id, file_path))
+
+    checkpoint.mark(finished)
+
+
+async def _ai_worker(queue: asyncio.Queue):
+    while True:
+        image_id, file_path = await queue.get()
+        try:
+            await analyze_and_save(image_id, file_path)
+        finally:
+            queue.task_done()
+
+
+async def run_import(args) -> int:
+    root = os.path.abspath(args.root)
+    if not os.path.isdir(root):
+        print(f"Not a directory: {root}")
+        return 1
+
+    await verify_schema(engine)
+
+    async with SessionLocal() as db:
+        user = (await db.execute(select(User).where(User.username == args.user))).scalars().first()
+    if not user:
+        print(f"User not found: {args.user}")
+        return 1
+
+    checkpoint_path = args.checkpoint or f".import-{args.user}-{hashlib.sha1(root.encode()).hexdigest()[:8]}.jsonl"
+    checkpoint = Checkpoint(checkpoint_path)
+    print(f"Scanning {root} ...", flush=True)
+    files = list(_walk(root))
+    progress = Progress(len(files), args.progress_interval)
+    print(f"Found {len(files)} images, checkpoint: {checkpoint_path}", flush=True)
+
+    todo = []
+    for path, stat in files:
+        if checkpoint.is_done(path, stat):
+            progress.resumed += 1
+        else:
+            todo.append((path, stat))
+
+    # AI 分析：与导入并行，慢于导入时在队列里排队；同时补做该用户之前未完成的分析
+    ai_queue, ai_workers = None, []
+    if args.analyze:
+        if not settings.SILICONFLOW_API_KEY:
+            print("SILICONFLOW_API_KEY not set, skipping AI analysis")
+        else:
+            ai_queue = asyncio.Queue()
+            async with SessionLocal() as db:
+                pending = await db.execute(
+                    select(Image.id, Image.file_path).where(Image.user_id == user.id, Image.ai_description.is_(None))
+                )
+                for row in pending:
+                    ai_queue.put_nowait((row.id, row.file_path))
+            ai_workers = [asyncio.create_task(_ai_worker(ai_queue)) for _ in range(args.ai_concurrency)]
+
+    batches = [todo[i:i + args.batch_size] for i in range(0, len(todo), args.batch_size)]
+    # spawn：子进程不继承事件循环和数据库连接
+    pool = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn"))
+    state = {"pool": pool, "progress": progress, "checkpoint": checkpoint, "geo_cache": {}, "ai_queue": ai_queue}
+    try:
+        # 当前批写库 / 逆地理编码时，进程池已在扫描下一批
+        next_scan = asyncio.ensure_future(_run_in_pool(pool, scan_image_file, [p for p, _ in batches[0]])) if batches else None
+        for i, batch in enumerate(batches):
+            scans = await next_scan
+            if i + 1 < len(batches):
+                next_scan = asyncio.ensure_future(_run_in_pool(pool, scan_image_file, [p for p, _ in batches[i + 1]]))
+            await _import_batch(batch, scans, user.id, args, state)
+            progress.report()
+        progress.report(force=True)
+
+        if ai_queue is not None and ai_queue.qsize():
+            print(f"Waiting for {ai_queue.qsize()} AI analyses ...", flush=True)
+        if ai_queue is not None:
+            await ai_queue.join()
+    finally:
+        for task in ai_workers:
+            task.cancel()
+        pool.shutdown(cancel_futures=True)
+        checkpoint.close()
+        await engine.dispose()
+
+    return 1 if progress.errors else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli.import_photos", description="Bulk import a photo directory")
+    parser.add_argument("root", help="directory to import (walked recursively)")
+    parser.add_argument("--user", required=True, help="username that will own the imported images")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="processes for hashing and thumbnails")
+    parser.add_argument("--batch-size", type=int, default=500, help="images per database transaction")
+    parser.add_argument("--checkpoint", default=None, help="resume file (default: .import-<user>-<hash>.jsonl in cwd)")
+    parser.add_argument("--geocode-concurrency", type=int, default=4, help="parallel AMap requests")
+    parser.add_argument("--no-geocode", action="store_true", help="skip reverse geocoding entirely")
+    parser.add_argument("--analyze", action="store_true", help="run AI analysis for imported images")
+    parser.add_argument("--ai-concurrency", type=int, default=2)
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="seconds between progress lines")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run_import(parse_args())))
@@ -0,0 +1,44 @@
+"""
+数据库迁移
+
+用法 (在 backend 目录下，与 uvicorn 相同的 .env):
+    python -m app.cli.migrate            # 升级到最新版本
+    python -m app.cli.migrate --check    # 只查看版本，落后时返回 1 (适合部署前检查)
+
+已有的、由旧版本 create_all 建出的库可以直接升级：迁移会跳过已存在的表 / 列 / 索引
+"""
+import sys
+import asyncio
+import argparse
+
+from app.db.database import engine
+from app.db.migrations import MIGRATIONS, LATEST_VERSION, current_version, upgrade
+
+
+async def run_migrate(args) -> int:
+    try:
+        async with engine.connect() as conn:
+            version = await conn.run_sync(current_version)
+        print(f"[migrate] current={version if version is not None else 'unmanaged'} latest={LATEST_VERSION}")
+
+        if args.check:
+            for target, description, _ in sorted(MIGRATIONS, key=lambda m: m[0]):
+                if target > (version or 0):
+                    print(f"  pending {target}: {description}")
+            return 0 if (version or 0) >= LATEST_VERSION else 1
+
+        applied = await upgrade(engine)
+        print(f"[migrate] applied {applied} migration(s), schema is at version {max(version or 0, LATEST_VERSION)}")
+        return 0
+    finally:
+        await engine.dispose()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli.migrate", description="Apply database migrations")
+    parser.add_argument("--check", action="store_true", help="only report the schema version")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run_migrate(parse_args())))
@@ -1,4 +1,6 @@
 import os
+import tempfile
+from typing import Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -11,15 +13,150 @@ class Settings(BaseSettings):
     UPLOAD_DIR: str = os.path.join(BASE_DIR, "static", "uploads")
     THUMBNAIL_DIR: str = os.path.join(BASE_DIR, "static", "thumbnails")
 
+    # 原图 / 缩略图存储后端 (见 app/core/storage.py):
+    #   local - UPLOAD_DIR / THUMBNAIL_DIR 下按文件名分片的目录
+    #   s3    - S3 兼容对象存储 (需要 pip install boto3)，S3_ENDPOINT_URL 可指向 MinIO 等
+    STORAGE_BACKEND: str = "local"
+    S3_BUCKET: str = ""
+    S3_PREFIX: str = ""
+    S3_ENDPOINT_URL: Optional[str] = None
+    S3_REGION: str = "us-east-1"
+    S3_ACCESS_KEY: str = ""
+    S3_SECRET_KEY: str = ""
+    # 预签名 URL 有效期 (秒)；超过阈值的文件分片上传
+    S3_PRESIGN_EXPIRES: int = 3600
+    S3_MULTIPART_THRESHOLD: int = 8 * 1024 * 1024
+    S3_MULTIPART_CHUNKSIZE: int = 8 * 1024 * 1024
+    # 上传处理时的本地暂存目录 (仅 s3)
+    STORAGE_STAGING_DIR: str = os.path.join(tempfile.gettempdir(), "smartimage-staging")
+
+    # 原图处理方式:
+    #   keep     - 保留上传的原始字节，只记录 EXIF Orientation (默认，无重编码)
+    #   lossless - JPEG 尝试用 jpegtran 无损旋转，失败则同 keep
+    #   reencode - 旧行为，摆正后整张重新编码
+    ORIGINAL_MODE: str = "keep"
+
+    # 图片处理线程池大小
+    IMAGE_WORKERS: int = 4
+    # 文件删除 / 目录扫描线程池大小
+    IO_WORKERS: int = 2
+
+    # 孤儿文件清理：扫描间隔 (秒，默认 0 关闭，建议先用 python -m app.cli.gc orphans --dry-run 核对)
+    # 与宽限期 (只清理早于此时间的文件，避免误删上传中的文件)；DRY_RUN 只打印不删除；
+    # 数据库记录中能在存储里找到的比例低于 MIN_MATCH_RATIO 时视为路径配置有误，拒绝删除
+    ORPHAN_SWEEP_INTERVAL: int = 0
+    ORPHAN_GRACE_SECONDS: int = 3600
+    ORPHAN_SWEEP_DRY_RUN: bool = False
+    ORPHAN_MIN_MATCH_RATIO: float = 0.5
+
+    # /metrics 的访问令牌：抓取方带 Authorization: Bearer <METRICS_TOKEN>；
+    # 为空时不提供 /metrics (返回 404)，进程级的延迟 / 计数不对普通用户公开
+    METRICS_TOKEN: str = ""
+
+    # 事件循环延迟采样间隔 (秒，0 表示关闭)
+    EVENT_LOOP_LAG_INTERVAL: float = 0.5
+
+    # 按需生成的衍生图 (/api/images/{id}/render) 磁盘缓存
+    RENDITION_CACHE_DIR: str = os.path.join(BASE_DIR, "static", "renditions")
+    RENDITION_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+    RENDER_MAX_DIM: int = 2048
+
+    # 相似图片：内存中保留特征矩阵的用户数与过期时间 (秒)
+    SIMILARITY_CACHE_USERS: int = 8
+    SIMILARITY_CACHE_TTL: int = 600
+
+    # 增量同步：只返回写入超过这么多秒的变更，避免并发事务晚提交的小 ID 被游标跳过
+    CHANGE_FEED_SETTLE_SECONDS: float = 2.0
+    # 变更日志保留天数与清理间隔 (秒，0 表示不自动清理，可用 python -m app.cli.gc changes 手动执行)；
+    # since 早于保留下限的客户端会收到 reset=true，需要全量重新同步
+    CHANGE_LOG_RETENTION_DAYS: int = 30
+    CHANGE_PRUNE_INTERVAL: int = 86400
+    CHANGE_PRUNE_BATCH_SIZE: int = 5000
+
+    # 上传 / AI 分析 / 聊天的按用户限流 (见 app/core/ratelimit.py)
+    # 令牌桶：每分钟补充数与桶容量 (允许的突发)，补充数为 0 表示不限；状态存本机 SQLite，多 worker 共享
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_DB: str = os.path.join(tempfile.gettempdir(), "smartimage-ratelimit.db")
+    RATE_LIMIT_UPLOAD_PER_MINUTE: float = 120
+    RATE_LIMIT_UPLOAD_BURST: int = 60
+    RATE_LIMIT_ANALYZE_PER_MINUTE: float = 10
+    RATE_LIMIT_ANALYZE_BURST: int = 5
+    RATE_LIMIT_CHAT_PER_MINUTE: float = 20
+    RATE_LIMIT_CHAT_BURST: int = 5
+    # 公平队列 (每进程)：各接口并发上限、每用户最多排队数、最长排队秒数；
+    # 上传按大小计权，每这么多字节算一份
+    FAIR_QUEUE_UPLOAD_CONCURRENCY: int = 8
+    FAIR_QUEUE_ANALYZE_CONCURRENCY: int = 2
+    FAIR_QUEUE_CHAT_CONCURRENCY: int = 8
+    FAIR_QUEUE_MAX_PENDING_PER_USER: int = 16
+    FAIR_QUEUE_TIMEOUT: float = 30
+    FAIR_QUEUE_UPLOAD_COST_BYTES: int = 4 * 1024 * 1024
+
     # 数据库与安全
     DATABASE_URL: str = ""
+    # 只读副本 (可选)：列表 / 搜索 / 详情 / 导出等只读接口走副本，写入与鉴权走主库
+    DATABASE_REPLICA_URL: str = ""
+    # 连接池，按角色分别配置 (SQLite 不使用连接池，忽略这些参数)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_REPLICA_POOL_SIZE: int = 10
+    DB_REPLICA_MAX_OVERFLOW: int = 20
+    DB_REPLICA_POOL_TIMEOUT: float = 5
+    DB_POOL_RECYCLE: int = 1800
+    # 用户写入后这么多秒内，他的读请求仍走主库 (读到自己刚写的数据，覆盖复制延迟)
+    DB_REPLICA_STICKY_SECONDS: float = 5
+    # 副本健康检查间隔与超时 (秒)，不健康期间读请求回落到主库
+    DB_REPLICA_HEALTH_INTERVAL: float = 5
+    DB_REPLICA_HEALTH_TIMEOUT: float = 2
+    # 启动时自动执行未完成的迁移 (仅建议开发环境开启；生产环境先跑 python -m app.cli.migrate)
+    DB_AUTO_MIGRATE: bool = False
+    # SQL 日志：DB_ECHO 打印每条语句 (仅本地调试)；慢查询阈值 (毫秒)；
+    # SQL_DEBUG 时响应头带查询数，单请求超过 SQL_QUERY_BUDGET 条告警
+    DB_ECHO: bool = False
+    SQL_SLOW_QUERY_MS: float = 200
+    SQL_DEBUG: bool = False
+    SQL_QUERY_BUDGET: int = 20
     SECRET_KEY: str = ""
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 1440
 
+    # 图片访问 (/api/media、GET /api/images/export)：<img> 带不了 Authorization 头，
+    # 前端登录后换取一个只能访问图片的短期 Cookie (HttpOnly，不进 URL / 访问日志)，有效期 (秒)
+    MEDIA_SESSION_SECONDS: int = 3600
+    MEDIA_COOKIE_NAME: str = "media_session"
+    MEDIA_COOKIE_SECURE: bool = False
+    # 旧版 /static 挂载 (无鉴权，任何人拿到路径即可访问)；仅为兼容旧客户端保留，默认关闭。
+    # STORAGE_BACKEND=s3 时它只能访问迁移前留在本地的文件，新 key 只能经 /api/media (预签名跳转) 访问
+    SERVE_LEGACY_STATIC: bool = False
+
+    # 已认证用户缓存：命中时每个请求只做 JWT 验签，不查库 (TTL 秒，0 表示关闭)
+    AUTH_CACHE_TTL: int = 60
+    AUTH_CACHE_SIZE: int = 10000
+
+    # 密码哈希：bcrypt cost、专用线程数 (并发上限)、最多排队数 (超出返回 503)
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_QUEUE: int = 64
+
     # --- 外部 API 密钥 (自动读取 .env) ---
     SILICONFLOW_API_KEY: str = ""
     AMAP_KEY: str = ""  # <--- 必须添加这行，名字要和 .env 里的一样
+    # 外部 API 地址 (压测时指向本地假服务)
+    AMAP_BASE_URL: str = "https://restapi.amap.com"
+    SILICONFLOW_BASE_URL: str = "https://api.siliconflow.cn/v1"
+
+    # AI 助手：对话模型；历史按估算的 token 数裁剪 (超出预算时按块丢弃最早的消息)，单条历史最长字符数
+    CHAT_MODEL: str = "Qwen/Qwen2.5-72B-Instruct"
+    CHAT_HISTORY_TOKEN_BUDGET: int = 1500
+    CHAT_HISTORY_TRIM_BLOCK: int = 4
+    CHAT_HISTORY_MAX_TURN_CHARS: int = 500
+    # 搜索后的回复:
+    #   auto     - 默认；需要描述 / 解释的提问才让模型再总结一次，其余用模板
+    #   template - 总是根据搜索结果套模板 (无结果 / 同一地点或日期 / 数量)
+    #   single   - 模型在工具调用里顺带写好回复，只调用一次
+    #   llm      - 旧行为，每次都发第二次请求总结
+    CHAT_SUMMARY_MODE: str = "auto"
 
     # 配置读取 .env 文件
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
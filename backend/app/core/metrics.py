@@ -0,0 +1,262 @@
+"""
+轻量的 Prometheus 文本格式指标 (不依赖 prometheus_client)。
+热路径上只做一次字典查找 + 加法；导出时才拼字符串。
+"""
+import time
+import asyncio
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# 默认延迟分桶 (秒)，覆盖 1ms ~ 60s
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    inner = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + inner + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        _registry.append(self)
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _samples(self):
+        if not self.labelnames:
+            return [((), self._default())]
+        return list(self._children.items())
+
+    def _default(self):
+        return self.labels()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self._samples():
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def render(self, name, labelnames, values):
+        return [f"{name}{_format_labels(labelnames, values)} {self.value}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def set(self, value: float):
+        self.value = value
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self.labels().dec(amount)
+
+
+class _CallbackChild:
+    __slots__ = ("fn",)
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    def render(self, name, labelnames, values):
+        try:
+            value = float(self.fn())
+        except Exception:
+            return []
+        return [f"{name}{_format_labels(labelnames, values)} {value}"]
+
+
+class CallbackMetric(_Metric):
+    """导出时才取值，适合把其他模块已有的计数器/队列长度挂出来，热路径零开销"""
+
+    def __init__(self, name: str, documentation: str, kind: str = "gauge", labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+
+    def set_function(self, fn, *values):
+        self._children[values] = _CallbackChild(fn)
+
+    def _samples(self):
+        return list(self._children.items())
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def render(self, name, labelnames, values):
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets, self.counts):
+            cumulative += n
+            lines.append(f"{name}_bucket{_format_labels(labelnames, values, ('le', bound))} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(labelnames, values, ('le', '+Inf'))} {self.count}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, values)} {self.sum}")
+        lines.append(f"{name}_count{_format_labels(labelnames, values)} {self.count}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+
+def render_latest() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4"
+
+
+# ==========================================
+# 业务指标
+# ==========================================
+
+UPLOAD_STAGE_SECONDS = Histogram(
+    "upload_stage_seconds", "Latency of each process_upload pipeline stage", ["stage"]
+)
+UPLOADS_TOTAL = Counter("uploads_total", "Uploads processed", ["result"])
+IMAGE_DECODES = Counter(
+    "image_decodes_total", "HEIF / RAW originals decoded for derived images, by embedded preview or full decode",
+    ["kind", "source"]
+)
+
+EXTERNAL_API_SECONDS = Histogram(
+    "external_api_seconds", "Latency of outbound calls to external APIs", ["service"]
+)
+EXTERNAL_API_ERRORS = Counter(
+    "external_api_errors_total", "Failed outbound calls to external APIs", ["service"]
+)
+
+CHAT_COMPLETION_SECONDS = Histogram(
+    "chat_completion_seconds", "End-to-end latency of /api/chat/completions by reply mode", ["mode"]
+)
+LLM_PROMPT_TOKENS = Counter(
+    "llm_prompt_tokens_total", "Prompt tokens sent to the chat model, by provider prefix-cache result", ["cache"]
+)
+
+BACKGROUND_QUEUE_DEPTH = Gauge(
+    "background_queue_depth", "Background jobs scheduled but not yet finished", ["kind"]
+)
+
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "event_loop_lag_seconds", "Extra delay of a periodic asyncio timer, i.e. event loop blocking",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+
+RENDITION_CACHE = CallbackMetric(
+    "rendition_cache", "On-demand rendition cache statistics", "gauge", ["field"]
+)
+PASSWORD_HASH = CallbackMetric(
+    "password_hash", "bcrypt executor statistics", "gauge", ["field"]
+)
+
+
+@contextmanager
+def track_external_call(service: str):
+    """记录外部 API 调用耗时，抛出异常时同时计入错误数"""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        EXTERNAL_API_ERRORS.labels(service).inc()
+        raise
+    finally:
+        EXTERNAL_API_SECONDS.labels(service).observe(time.perf_counter() - start)
+
+
+async def monitor_event_loop_lag(interval: float):
+    """lifespan 中启动：定时器实际唤醒时间与预期之差即事件循环被阻塞的时长"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG_SECONDS.observe(max(loop.time() - start - interval, 0.0))
@@ -0,0 +1,329 @@
+"""
+昂贵接口 (上传 / AI 分析 / 聊天) 的按用户限流与公平排队
+
+- 令牌桶：状态存放在本机 SQLite 文件 (RATE_LIMIT_DB)，同一台机器上的多个 uvicorn worker 共享额度
+- 加权公平队列：每个进程内按接口限制并发；满了以后按虚拟完成时间放行，
+  同一个用户排再多请求也只是排在自己的队尾，不会挡住其他用户
+"""
+import os
+import math
+import time
+import heapq
+import sqlite3
+import asyncio
+import itertools
+import threading
+from contextlib import asynccontextmanager
+
+from app.core.config import settings
+from app.core.metrics import Counter, Histogram, CallbackMetric
+from app.core.workers import run_in_io_pool
+
+RATE_LIMITED = Counter("rate_limited_total", "Requests rejected by the per-user limiter", ["endpoint", "reason"])
+FAIR_QUEUE_WAIT_SECONDS = Histogram(
+    "fair_queue_wait_seconds", "Time spent waiting for a concurrency slot", ["endpoint"]
+)
+FAIR_QUEUE = CallbackMetric("fair_queue", "Per-endpoint fair queue state", "gauge", ["endpoint", "field"])
+
+
+class RateLimited(Exception):
+    """超出限额，调用方返回 429 / 503 并带上 Retry-After"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+# ---------- 令牌桶 (跨进程共享) ----------
+
+class TokenBucketStore:
+    """
+    每个 key 一行 (剩余令牌, 更新时间)，取令牌在一个 BEGIN IMMEDIATE 事务里完成，多进程并发也不会超发。
+    WAL + synchronous=OFF：数据丢了只是额度重置，不需要落盘保证。
+    take 是阻塞调用 (其他 worker 持锁时最多等 0.1 秒)，由 EndpointLimiter 放到 IO 线程池执行；
+    同一连接上的事务不能交错，进程内用线程锁串行
+    """
+
+    # 超过这么久没有访问的桶早已回满，可以删除
+    PRUNE_AFTER = 3600
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._ops = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # 锁等待很短：拿不到锁说明本机负载已经很高，调用方按放行处理
+            conn = sqlite3.connect(self.path, timeout=0.1, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def take(self, key: str, per_minute: float, burst: int, cost: float = 1.0) -> float:
+        """取 cost 个令牌：成功返回 0，否则不扣减，返回还需等待的秒数"""
+        with self._lock:
+            return self._take(key, per_minute, burst, cost)
+
+    def _take(self, key: str, per_minute: float, burst: int, cost: float) -> float:
+        conn = self._connect()
+        rate = per_minute / 60.0
+        # 多进程共享，用墙上时间而不是 monotonic
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = float(burst) if row is None else min(float(burst), row[0] + max(0.0, now - row[1]) * rate)
+            if tokens >= cost:
+                tokens -= cost
+                wait = 0.0
+            else:
+                wait = (cost - tokens) / rate
+            conn.execute(
+                "INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (key, tokens, now)
+            )
+            self._ops += 1
+            if self._ops % self.PRUNE_EVERY == 0:
+                conn.execute("DELETE FROM buckets WHERE updated < ?", (now - self.PRUNE_AFTER,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def refund(self, key: str, burst: int, cost: float = 1.0):
+        """退还已取走的令牌 (请求随后在排队阶段被拒绝时)，不超过桶容量"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("UPDATE buckets SET tokens = MIN(?, tokens + ?) WHERE key = ?", (float(burst), cost, key))
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# ---------- 加权公平队列 (进程内) ----------
+
+class FairQueue:
+    """
+    并发上限为 concurrency 的信号量，但等待者不是先来先服务：
+    每个请求按 start = max(虚拟时间, 该用户上一个请求的完成标签)、finish = start + cost / weight 打标签，
+    有空位时放行 finish 最小的请求。连续提交大量请求的用户，标签会一路往后排
+    """
+
+    def __init__(self, name: str, concurrency: int, max_pending_per_user: int, timeout: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_pending_per_user = max_pending_per_user
+        self.timeout = timeout
+        self.active = 0
+        self._vtime = 0.0
+        self._finish = {}   # user_id -> 上一个请求的完成标签
+        self._pending = {}  # user_id -> 排队中的请求数
+        self._heap = []     # (finish, seq, start, user_id, future)
+        self._seq = itertools.count()
+
+    def waiting(self) -> int:
+        return sum(self._pending.values())
+
+    def check_capacity(self, user_id):
+        """acquire 前的预检：该用户排队已满时直接拒绝，调用方不必先扣令牌"""
+        must_wait = self.active >= self.concurrency or self._heap
+        if must_wait and self._pending.get(user_id, 0) >= self.max_pending_per_user:
+            raise RateLimited("queue_full", 1)
+
+    def _tag(self, user_id, cost: float, weight: float):
+        start = max(self._vtime, self._finish.get(user_id, 0.0))
+        finish = start + cost / weight
+        self._finish[user_id] = finish
+        if len(self._finish) > 10000:
+            # 完成标签不超过虚拟时间的用户与新用户等价，不必再记
+            self._finish = {k: v for k, v in self._finish.items() if v > self._vtime}
+        return start, finish
+
+    async def acquire(self, user_id, cost: float = 1.0, weight: float = 1.0):
+        if self.active < self.concurrency and not self._heap:
+            start, _ = self._tag(user_id, cost, weight)
+            self.active += 1
+            self._vtime = max(self._vtime, start)
+            return
+
+        if self._pending.get(user_id, 0) >= self.max_pending_per_user:
+            raise RateLimited("queue_full", 1)
+
+        start, finish = self._tag(user_id, cost, weight)
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (finish, next(self._seq), start, user_id, future))
+        self._pending[user_id] = self._pending.get(user_id, 0) + 1
+        queued = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            if not self._abandon(future):
+                return
+            raise RateLimited("queue_timeout", self.timeout)
+        except asyncio.CancelledError:
+            # 客户端断开：如果名额恰好已经分给我们，要还回去
+            if not self._abandon(future):
+                self.release()
+            raise
+        finally:
+            left = self._pending[user_id] - 1
+            if left:
+                self._pending[user_id] = left
+            else:
+                del self._pending[user_id]
+            FAIR_QUEUE_WAIT_SECONDS.labels(self.name).observe(time.perf_counter() - queued)
+
+    def _abandon(self, future) -> bool:
+        """放弃排队；返回 False 表示名额已经分配给了这个请求"""
+        if future.done():
+            return False
+        future.cancel()  # 留在堆里，release 时跳过
+        return True
+
+    def release(self):
+        self.active -= 1
+        while self._heap and self.active < self.concurrency:
+            finish, _, start, user_id, future = heapq.heappop(self._heap)
+            if future.done():
+                continue
+            self.active += 1
+            self._vtime = max(self._vtime, start)
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, user_id, cost: float = 1.0, weight: float = 1.0):
+        await self.acquire(user_id, cost, weight)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+# ---------- 按接口的组合 ----------
+
+class EndpointLimiter:
+    def __init__(self, name: str, per_minute: float, burst: int, concurrency: int):
+        self.name = name
+        self.per_minute = per_minute
+        self.burst = burst
+        self.queue = FairQueue(name, concurrency, settings.FAIR_QUEUE_MAX_PENDING_PER_USER, settings.FAIR_QUEUE_TIMEOUT)
+        FAIR_QUEUE.set_function(lambda: self.queue.active, name, "active")
+        FAIR_QUEUE.set_function(self.queue.waiting, name, "waiting")
+
+    async def _take(self, user_id, cost: float = 1.0) -> float:
+        """取令牌，返回还需等待的秒数 (0 表示已取到)"""
+        if self.per_minute <= 0:
+            return 0.0
+        try:
+            return await run_in_io_pool(
+                get_bucket_store().take, f"{self.name}:{user_id}", self.per_minute, self.burst, cost
+            )
+        except sqlite3.Error as e:
+            # 共享存储不可用时放行，限流不能成为新的故障点
+            print(f"Rate limit store error, allowing request: {e}")
+            return 0.0
+
+    async def check_rate(self, user_id):
+        wait = await self._take(user_id)
+        if wait > 0:
+            raise RateLimited("rate", wait)
+
+    async def _refund(self, user_id):
+        if self.per_minute <= 0:
+            return
+        try:
+            await run_in_io_pool(get_bucket_store().refund, f"{self.name}:{user_id}", self.burst)
+        except sqlite3.Error as e:
+            print(f"Rate limit store error, refund skipped: {e}")
+
+    @asynccontextmanager
+    async def limit(self, user_id, cost: float = 1.0):
+        """先过令牌桶，再在公平队列中等待并发名额；超限抛 RateLimited"""
+        if not settings.RATE_LIMIT_ENABLED:
+            yield
+            return
+        try:
+            # 先看排队名额再扣令牌：因排队已满被拒绝的请求不消耗额度
+            self.queue.check_capacity(user_id)
+            await self.check_rate(user_id)
+            try:
+                await self.queue.acquire(user_id, cost)
+            except RateLimited:
+                # 扣令牌期间队列被别的请求占满；排队超时属于整体过载，同样不算用户的额度
+                await self._refund(user_id)
+                raise
+        except RateLimited as e:
+            RATE_LIMITED.labels(self.name, e.reason).inc()
+            raise
+        try:
+            yield
+        finally:
+            self.queue.release()
+
+    @asynccontextmanager
+    async def wait(self, user_id, cost: float = 1.0):
+        """
+        后台任务用的 limit：与接口共用同一个用户的令牌桶和公平队列，
+        但额度不够或排队超时时等待后重试，而不是拒绝 (任务没有客户端可以重试)
+        """
+        if not settings.RATE_LIMIT_ENABLED:
+            yield
+            return
+        while True:
+            wait = await self._take(user_id)
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+        while True:
+            try:
+                await self.queue.acquire(user_id, cost)
+                break
+            except RateLimited as e:
+                await asyncio.sleep(e.retry_after)
+        try:
+            yield
+        finally:
+            self.queue.release()
+
+
+_store = None
+
+
+def get_bucket_store() -> TokenBucketStore:
+    global _store
+    if _store is None:
+        _store = TokenBucketStore(settings.RATE_LIMIT_DB)
+    return _store
+
+
+LIMITERS = {
+    "upload": EndpointLimiter(
+        "upload", settings.RATE_LIMIT_UPLOAD_PER_MINUTE, settings.RATE_LIMIT_UPLOAD_BURST,
+        settings.FAIR_QUEUE_UPLOAD_CONCURRENCY
+    ),
+    "analyze": EndpointLimiter(
+        "analyze", settings.RATE_LIMIT_ANALYZE_PER_MINUTE, settings.RATE_LIMIT_ANALYZE_BURST,
+        settings.FAIR_QUEUE_ANALYZE_CONCURRENCY
+    ),
+    "chat": EndpointLimiter(
+        "chat", settings.RATE_LIMIT_CHAT_PER_MINUTE, settings.RATE_LIMIT_CHAT_BURST,
+        settings.FAIR_QUEUE_CHAT_CONCURRENCY
+    ),
+}
@@ -1,10 +1,33 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import jwt
 from passlib.context import CryptContext
 from app.core.config import settings
+from app.core.metrics import PASSWORD_HASH
+
+# rounds 即 bcrypt cost；修改后旧哈希会在下次登录时透明重算 (verify_and_update)
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
+
+# bcrypt 单次 100~300ms 纯 CPU，放到专用线程池里，worker 数即并发上限
+_hash_pool = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_pending = 0
+
+# 排队/执行耗时统计 (秒)
+hash_stats = {
+    "completed": 0,
+    "rejected": 0,
+    "queue_time_total": 0.0,
+    "queue_time_max": 0.0,
+    "run_time_total": 0.0,
+}
+
+
+class PasswordHasherBusy(Exception):
+    """排队的哈希任务过多，调用方应返回 503"""
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -12,6 +35,50 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+async def _run_hasher(fn, *args):
+    global _pending
+    if _pending >= settings.PASSWORD_HASH_MAX_QUEUE:
+        hash_stats["rejected"] += 1
+        raise PasswordHasherBusy()
+
+    submitted = time.perf_counter()
+    timing = {}
+
+    def job():
+        started = time.perf_counter()
+        timing["queue"] = started - submitted
+        try:
+            return fn(*args)
+        finally:
+            timing["run"] = time.perf_counter() - started
+
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_pool, job)
+    finally:
+        _pending -= 1
+        if "queue" in timing:
+            hash_stats["completed"] += 1
+            hash_stats["queue_time_total"] += timing["queue"]
+            hash_stats["queue_time_max"] = max(hash_stats["queue_time_max"], timing["queue"])
+            hash_stats["run_time_total"] += timing.get("run", 0.0)
+
+def password_hash_queue_depth() -> int:
+    return _pending
+
+async def hash_password_async(password: str) -> str:
+    return await _run_hasher(pwd_context.hash, password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str):
+    """
+    返回 (是否匹配, 新哈希或 None)；cost 配置变更后新哈希非空，调用方应写回数据库
+    """
+    return await _run_hasher(pwd_context.verify_and_update, plain_password, hashed_password)
+
+PASSWORD_HASH.set_function(password_hash_queue_depth, "queue_depth")
+for _field in hash_stats:
+    PASSWORD_HASH.set_function(lambda f=_field: hash_stats[f], _field)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -20,4 +87,4 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-    return encoded_jwt
\ No newline at end of file
+    return encoded_jwt
@@ -0,0 +1,296 @@
+"""
+原图 / 缩略图的存储抽象。数据库里的 file_path / thumbnail_path 保存的是存储 key：
+
+- local: key 就是相对 BASE_DIR (backend 目录，或绝对) 的文件路径，与旧数据完全兼容；
+  相对 key 一律按 BASE_DIR 解析，与 worker 的启动目录无关。
+  新文件按文件名前 4 位分两级目录 (uploads/ab/cd/<uuid>.jpg)，单目录文件数保持在几千以内
+- s3:    key 为对象名 ({S3_PREFIX}uploads/ab/cd/<uuid>.jpg)，支持分片上传与预签名 URL；
+  旧数据中仍指向本地磁盘的 key 会自动回退到本地读取 / 删除。
+  本地联调可用 MinIO 或 moto_server 作为替身 (S3_ENDPOINT_URL)
+
+写入流程统一为 staging_path(key) 拿到可写的本地路径 -> 生成文件 -> commit(staging, key)；
+local 的 staging 就是最终路径，commit 为空操作，不会多拷贝一次。
+所有方法都是同步阻塞的，异步代码中请放到 IO / 图片线程池里调用
+"""
+import os
+import uuid
+import shutil
+import tempfile
+from contextlib import contextmanager
+from mimetypes import guess_type
+
+from app.core.config import settings
+
+# key 的类别 -> 本地目录
+KINDS = ("uploads", "thumbnails")
+
+
+def _shard(name: str) -> str:
+    return os.path.join(name[:2], name[2:4])
+
+
+def new_file_name(ext: str) -> str:
+    return f"{uuid.uuid4()}.{ext}"
+
+
+class LocalStorage:
+    name = "local"
+
+    def prepare(self):
+        """启动时调用 (lifespan)：创建上传 / 缩略图根目录"""
+        for kind in KINDS:
+            os.makedirs(self._dir(kind), exist_ok=True)
+
+    def _dir(self, kind: str) -> str:
+        directory = settings.UPLOAD_DIR if kind == "uploads" else settings.THUMBNAIL_DIR
+        return os.path.abspath(os.path.join(settings.BASE_DIR, directory))
+
+    def key_for(self, kind: str, file_name: str) -> str:
+        path = os.path.join(self._dir(kind), _shard(file_name), file_name)
+        # 与旧数据一致：BASE_DIR 下的文件存相对路径
+        rel = os.path.relpath(path, settings.BASE_DIR)
+        return path if rel.startswith("..") else rel
+
+    def path(self, key: str) -> str:
+        """key -> 本地绝对路径；相对 key 按 BASE_DIR 解析，不依赖当前工作目录"""
+        return os.path.abspath(os.path.join(settings.BASE_DIR, key))
+
+    def normalize(self, key: str) -> str:
+        """用于对账比较的规范形式"""
+        return self.path(key)
+
+    def staging_path(self, key: str) -> str:
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def commit(self, staging_path: str, key: str):
+        path = self.path(key)
+        if staging_path != path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            shutil.move(staging_path, path)
+
+    def exists(self, key: str) -> bool:
+        return bool(key) and os.path.exists(self.path(key))
+
+    def size(self, key: str) -> int:
+        return os.path.getsize(self.path(key))
+
+    @contextmanager
+    def local_copy(self, key: str):
+        path = self.path(key)
+        if not os.path.exists(path):
+            raise FileNotFoundError(key)
+        yield path
+
+    def iter_chunks(self, key: str, chunk_size: int):
+        with open(self.path(key), "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                yield chunk
+
+    def presigned_url(self, key: str):
+        return None
+
+    def delete(self, keys):
+        for key in keys:
+            try:
+                if key and os.path.exists(self.path(key)):
+                    os.remove(self.path(key))
+            except Exception as e:
+                print(f"Error deleting file {key}: {e}")
+
+    def iter_files(self):
+        """遍历 uploads / thumbnails 下的全部文件，产出 (规范化 key, mtime)"""
+        for kind in KINDS:
+            directory = self._dir(kind)
+            if not os.path.isdir(directory):
+                continue
+            for dirpath, _, filenames in os.walk(directory):
+                for name in filenames:
+                    full = os.path.join(dirpath, name)
+                    try:
+                        yield os.path.abspath(full), os.stat(full).st_mtime
+                    except FileNotFoundError:
+                        continue
+
+
+class S3Storage:
+    name = "s3"
+
+    def __init__(self):
+        self.bucket = settings.S3_BUCKET
+        self.prefix = settings.S3_PREFIX
+        self._client = None
+        self._transfer_config = None
+        # 迁移前写入本地磁盘的旧数据：落在本地上传 / 缩略图目录下的 key
+        self._legacy = LocalStorage()
+        self._legacy_roots = tuple(self._legacy._dir(kind) + os.sep for kind in KINDS)
+
+    def prepare(self):
+        os.makedirs(settings.STORAGE_STAGING_DIR, exist_ok=True)
+
+    @property
+    def client(self):
+        # boto3 只在启用 S3 时才需要安装；客户端线程安全，进程池中每个子进程各建一个
+        if self._client is None:
+            try:
+                import boto3
+                from boto3.s3.transfer import TransferConfig
+                from botocore.config import Config
+            except ImportError:
+                raise RuntimeError("STORAGE_BACKEND=s3 requires boto3 (pip install boto3)")
+            self._client = boto3.client(
+                "s3",
+                endpoint_url=settings.S3_ENDPOINT_URL or None,
+                region_name=settings.S3_REGION,
+                aws_access_key_id=settings.S3_ACCESS_KEY or None,
+                aws_secret_access_key=settings.S3_SECRET_KEY or None,
+                config=Config(
+                    signature_version="s3v4",
+                    # 自建兼容服务一般只支持 path-style
+                    s3={"addressing_style": "path" if settings.S3_ENDPOINT_URL else "auto"},
+                    max_pool_connections=max(settings.IO_WORKERS, settings.IMAGE_WORKERS) * 2,
+                ),
+            )
+            self._transfer_config = TransferConfig(
+                multipart_threshold=settings.S3_MULTIPART_THRESHOLD,
+                multipart_chunksize=settings.S3_MULTIPART_CHUNKSIZE,
+            )
+        return self._client
+
+    def _is_legacy(self, key: str) -> bool:
+        return self._legacy.path(key).startswith(self._legacy_roots)
+
+    def key_for(self, kind: str, file_name: str) -> str:
+        return f"{self.prefix}{kind}/{_shard(file_name).replace(os.sep, '/')}/{file_name}"
+
+    def path(self, key: str) -> str:
+        return key
+
+    def normalize(self, key: str) -> str:
+        return self._legacy.normalize(key) if self._is_legacy(key) else key
+
+    def staging_path(self, key: str) -> str:
+        os.makedirs(settings.STORAGE_STAGING_DIR, exist_ok=True)
+        return os.path.join(settings.STORAGE_STAGING_DIR, f"{uuid.uuid4().hex}-{os.path.basename(key)}")
+
+    def commit(self, staging_path: str, key: str):
+        """超过 S3_MULTIPART_THRESHOLD 的文件自动走分片上传 (并发上传各分片)"""
+        try:
+            self.client.upload_file(
+                staging_path, self.bucket, key,
+                ExtraArgs={"ContentType": guess_type(key)[0] or "application/octet-stream"},
+                Config=self._transfer_config,
+            )
+        finally:
+            if os.path.exists(staging_path):
+                os.remove(staging_path)
+
+    def _head(self, key: str):
+        from botocore.exceptions import ClientError
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def exists(self, key: str) -> bool:
+        if not key:
+            return False
+        if self._is_legacy(key):
+            return self._legacy.exists(key)
+        return self._head(key) is not None
+
+    def size(self, key: str) -> int:
+        if self._is_legacy(key):
+            return self._legacy.size(key)
+        head = self._head(key)
+        if head is None:
+            raise FileNotFoundError(key)
+        return head["ContentLength"]
+
+    @contextmanager
+    def local_copy(self, key: str):
+        """下载到临时文件，离开 with 块后删除"""
+        if self._is_legacy(key):
+            with self._legacy.local_copy(key) as path:
+                yield path
+            return
+
+        from botocore.exceptions import ClientError
+        os.makedirs(settings.STORAGE_STAGING_DIR, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix=os.path.splitext(key)[1], dir=settings.STORAGE_STAGING_DIR)
+        os.close(fd)
+        try:
+            try:
+                self.client.download_file(self.bucket, key, path, Config=self._transfer_config)
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                    raise FileNotFoundError(key)
+                raise
+            yield path
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def iter_chunks(self, key: str, chunk_size: int):
+        if self._is_legacy(key):
+            yield from self._legacy.iter_chunks(key, chunk_size)
+            return
+        body = self.client.get_object(Bucket=self.bucket, Key=key)["Body"]
+        try:
+            yield from body.iter_chunks(chunk_size)
+        finally:
+            body.close()
+
+    def presigned_url(self, key: str):
+        if self._is_legacy(key):
+            return None
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": key},
+            ExpiresIn=settings.S3_PRESIGN_EXPIRES,
+        )
+
+    def delete(self, keys):
+        remote = []
+        for key in keys:
+            if not key:
+                continue
+            if self._is_legacy(key):
+                self._legacy.delete([key])
+            else:
+                remote.append(key)
+        # DeleteObjects 单次最多 1000 个
+        for i in range(0, len(remote), 1000):
+            try:
+                self.client.delete_objects(
+                    Bucket=self.bucket,
+                    Delete={"Objects": [{"Key": k} for k in remote[i:i + 1000]], "Quiet": True},
+                )
+            except Exception as e:
+                print(f"Error deleting objects: {e}")
+
+    def iter_files(self):
+        yield from self._legacy.iter_files()
+        paginator = self.client.get_paginator("list_objects_v2")
+        for kind in KINDS:
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=f"{self.prefix}{kind}/"):
+                for obj in page.get("Contents", []):
+                    yield obj["Key"], obj["LastModified"].timestamp()
+
+
+_storage = None
+
+
+def get_storage():
+    global _storage
+    if _storage is None:
+        if settings.STORAGE_BACKEND == "s3":
+            _storage = S3Storage()
+        elif settings.STORAGE_BACKEND == "local":
+            _storage = LocalStorage()
+        else:
+            raise RuntimeError(f"Unknown STORAGE_BACKEND: {settings.STORAGE_BACKEND}")
+    return _storage
@@ -0,0 +1,45 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from app.core.config import settings
+
+# 图片解码/缩放等 CPU 密集任务的专用线程池 (Pillow 在解码和 resize 时会释放 GIL)
+_image_pool = None
+# 删除文件、目录扫描等阻塞 IO 的线程池，与图片处理隔离，避免互相排队
+_io_pool = None
+
+def get_image_pool() -> ThreadPoolExecutor:
+    global _image_pool
+    if _image_pool is None:
+        _image_pool = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_WORKERS,
+            thread_name_prefix="image-worker"
+        )
+    return _image_pool
+
+async def run_in_image_pool(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_image_pool(), partial(fn, *args, **kwargs))
+
+def get_io_pool() -> ThreadPoolExecutor:
+    global _io_pool
+    if _io_pool is None:
+        _io_pool = ThreadPoolExecutor(
+            max_workers=settings.IO_WORKERS,
+            thread_name_prefix="io-worker"
+        )
+    return _io_pool
+
+async def run_in_io_pool(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_io_pool(), partial(fn, *args, **kwargs))
+
+def shutdown_pools():
+    global _image_pool, _io_pool
+    if _image_pool is not None:
+        _image_pool.shutdown(wait=False, cancel_futures=True)
+        _image_pool = None
+    if _io_pool is not None:
+        # 等待已排队的删除任务完成，避免留下孤儿文件
+        _io_pool.shutdown(wait=True)
+        _io_pool = None
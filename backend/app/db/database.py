@@ -1,22 +1,180 @@
+import time
+import asyncio
+from contextvars import ContextVar
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from app.core.cache import TTLCache
 from app.core.config import settings
+from app.core.metrics import Counter
+from app.db.instrumentation import instrument_engine
+
+DB_READ_ROUTE = Counter("db_read_route_total", "Read-only sessions by the database they were routed to", ["target"])
+
+
+def _pool_options(url: str, size: int, overflow: int, timeout: float) -> dict:
+    # aiosqlite 用 NullPool，不接受连接池参数
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": size,
+        "max_overflow": overflow,
+        "pool_timeout": timeout,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+# 创建异步引擎 (echo 会同步打印每条 SQL，生产环境保持关闭，靠 instrumentation 记录慢查询)
+engine = create_async_engine(
+    settings.DATABASE_URL, echo=settings.DB_ECHO,
+    **_pool_options(settings.DATABASE_URL, settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW, settings.DB_POOL_TIMEOUT)
+)
+instrument_engine(engine)
+
+# 只读副本 (可选)：未配置时所有读写都走主库
+replica_engine = None
+if settings.DATABASE_REPLICA_URL:
+    replica_engine = create_async_engine(
+        settings.DATABASE_REPLICA_URL, echo=settings.DB_ECHO,
+        **_pool_options(settings.DATABASE_REPLICA_URL, settings.DB_REPLICA_POOL_SIZE,
+                        settings.DB_REPLICA_MAX_OVERFLOW, settings.DB_REPLICA_POOL_TIMEOUT)
+    )
+    instrument_engine(replica_engine)
+
+# ---------- 读写分离 ----------
+
+# 当前请求的用户 ID，由鉴权依赖设置
+current_user_id: ContextVar = ContextVar("current_user_id", default=None)
+
+# 最近有写入的用户：粘滞窗口内他们的读请求也走主库，保证读到自己刚写的数据
+# (进程内状态，多节点部署时需要负载均衡按用户粘滞)
+_recent_writers = TTLCache(100000, settings.DB_REPLICA_STICKY_SECONDS)
+
+
+class _ReplicaState:
+    """副本健康状态：后台定时探测，查询中遇到断线也会立即标记为不可用"""
+
+    def __init__(self):
+        self.healthy = replica_engine is not None
+        self.checked_at = 0.0
+
+    def mark(self, healthy: bool, reason: str = ""):
+        if healthy != self.healthy:
+            print(f"{'✅' if healthy else '⚠️'} Read replica {'recovered' if healthy else 'unavailable, reads fall back to primary'}"
+                  f"{': ' + reason if reason else ''}")
+        self.healthy = healthy
+        self.checked_at = time.monotonic()
+
+
+replica_state = _ReplicaState()
+
+
+class _PrimarySession(Session):
+    pass
+
+
+@event.listens_for(_PrimarySession, "do_orm_execute")
+def _track_statement_writes(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
+
+
+@event.listens_for(_PrimarySession, "after_flush")
+def _track_flush_writes(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(_PrimarySession, "after_commit")
+def _start_sticky_window(session):
+    if session.info.pop("wrote", False) and replica_engine is not None:
+        user_id = current_user_id.get()
+        if user_id is not None:
+            _recent_writers.set(user_id, True)
+
+
+@event.listens_for(_PrimarySession, "after_rollback")
+def _reset_writes(session):
+    session.info.pop("wrote", None)
+
+
+class _ReadSession(Session):
+    """
+    只读接口使用的 Session：第一次执行语句时选定目标并在本 Session 内保持不变。
+    副本未配置 / 不健康 / 当前用户处于写后粘滞窗口时走主库；flush 永远走主库
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._flushing or replica_engine is None:
+            return engine.sync_engine
+        target = self.info.get("route")
+        if target is None:
+            user_id = current_user_id.get()
+            if not replica_state.healthy:
+                target = "primary_fallback"
+            elif user_id is not None and _recent_writers.get(user_id):
+                target = "primary_sticky"
+            else:
+                target = "replica"
+            self.info["route"] = target
+            DB_READ_ROUTE.labels(target).inc()
+        return replica_engine.sync_engine if target == "replica" else engine.sync_engine
+
+
+if replica_engine is not None:
+    @event.listens_for(replica_engine.sync_engine, "handle_error")
+    def _replica_error(context):
+        if context.is_disconnect:
+            replica_state.mark(False, str(context.original_exception))
+
+
+async def check_replica() -> bool:
+    """探测一次副本；lifespan 启动时和 replica_health_loop 中调用"""
+    if replica_engine is None:
+        return False
+    try:
+        async with replica_engine.connect() as conn:
+            await asyncio.wait_for(conn.execute(text("SELECT 1")), settings.DB_REPLICA_HEALTH_TIMEOUT)
+        replica_state.mark(True)
+    except Exception as e:
+        replica_state.mark(False, repr(e))
+    return replica_state.healthy
+
+
+async def replica_health_loop():
+    while True:
+        await asyncio.sleep(settings.DB_REPLICA_HEALTH_INTERVAL)
+        await check_replica()
 
-# 创建异步引擎
-engine = create_async_engine(settings.DATABASE_URL, echo=True)
 
 # 创建异步 Session 工厂
 SessionLocal = sessionmaker(
-    autocommit=False, 
-    autoflush=False, 
-    bind=engine, 
+    autocommit=False,
+    autoflush=False,
+    bind=engine,
     class_=AsyncSession,
+    sync_session_class=_PrimarySession,
     expire_on_commit=False  # <--- 【关键修改】添加这一行
 )
 
+# 只读 Session 工厂 (列表、搜索、详情、导出等)
+ReadSessionLocal = sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    class_=AsyncSession,
+    sync_session_class=_ReadSession,
+    expire_on_commit=False
+)
+
 Base = declarative_base()
 
 # 依赖注入项
 async def get_db():
     async with SessionLocal() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+async def get_read_db():
+    """只读接口用：优先走副本 (见 _ReadSession)；在其中写入会直接写主库，但请用 get_db"""
+    async with ReadSessionLocal() as session:
+        yield session
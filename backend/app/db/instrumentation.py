@@ -0,0 +1,106 @@
+"""
+基于 SQLAlchemy 事件的 SQL 性能埋点：
+- 每条语句耗时 -> /metrics (sql_query_seconds)
+- 每个请求的语句数 -> sql_queries_per_request，用来发现标签循环这类 N+1
+- 超过 SQL_SLOW_QUERY_MS 的语句连同参数写日志
+- SQL_DEBUG 模式下响应头带上查询数/耗时，超出 SQL_QUERY_BUDGET 时告警
+"""
+import time
+import logging
+from contextvars import ContextVar
+from sqlalchemy import event
+
+from app.core.config import settings
+from app.core.metrics import Histogram, Counter
+
+logger = logging.getLogger("app.sql")
+
+SQL_QUERY_SECONDS = Histogram(
+    "sql_query_seconds", "Latency of individual SQL statements", ["operation"]
+)
+SQL_SLOW_QUERIES = Counter("sql_slow_queries_total", "SQL statements slower than SQL_SLOW_QUERY_MS")
+SQL_QUERIES_PER_REQUEST = Histogram(
+    "sql_queries_per_request", "Number of SQL statements issued per HTTP request",
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+)
+
+# 当前请求的统计 {"count": int, "time": float}；请求之外 (后台任务、脚本) 为 None
+_request_stats: ContextVar = ContextVar("sql_request_stats", default=None)
+
+# 日志里参数的最大长度，避免把 base64 / 大批量 IN 列表整段打出来
+_MAX_PARAMS_LOG = 500
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # 开始时间记在本条语句的执行上下文上：语句失败时不会触发 after 事件，
+    # 放在连接级的栈里会残留，后续语句取到错位的开始时间
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_query_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+    SQL_QUERY_SECONDS.labels(operation).observe(elapsed)
+
+    stats = _request_stats.get()
+    if stats is not None:
+        stats["count"] += 1
+        stats["time"] += elapsed
+
+    if elapsed * 1000 >= settings.SQL_SLOW_QUERY_MS:
+        SQL_SLOW_QUERIES.inc()
+        params = repr(parameters)
+        if len(params) > _MAX_PARAMS_LOG:
+            params = params[:_MAX_PARAMS_LOG] + "...(truncated)"
+        logger.warning("Slow query (%.1f ms): %s | params=%s", elapsed * 1000, " ".join(statement.split()), params)
+
+
+def instrument_engine(engine):
+    """给 (异步) 引擎挂上事件监听，重复调用无副作用"""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class QueryStatsMiddleware:
+    """
+    纯 ASGI 中间件 (不缓冲响应体)：为每个 HTTP 请求开一份查询计数。
+    后台任务在同一个请求调用内执行，其查询也计入该请求
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = {"count": 0, "time": 0.0}
+        token = _request_stats.set(stats)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and settings.SQL_DEBUG:
+                headers = list(message.get("headers", []))
+                headers.append((b"x-query-count", str(stats["count"]).encode()))
+                headers.append((b"x-query-time-ms", f"{stats['time'] * 1000:.1f}".encode()))
+                if stats["count"] > settings.SQL_QUERY_BUDGET:
+                    headers.append((b"x-query-budget-exceeded", str(settings.SQL_QUERY_BUDGET).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_stats.reset(token)
+            SQL_QUERIES_PER_REQUEST.observe(stats["count"])
+            if settings.SQL_DEBUG and stats["count"] > settings.SQL_QUERY_BUDGET:
+                logger.warning(
+                    "Query budget exceeded: %s %s issued %d queries (budget %d, %.1f ms)",
+                    scope.get("method"), scope.get("path"), stats["count"],
+                    settings.SQL_QUERY_BUDGET, stats["time"] * 1000
+                )
@@ -0,0 +1,182 @@
+"""
+版本化的数据库迁移
+
+- schema_version 表记录已执行到的版本，每个迁移在独立事务中执行并推进版本号
+- 迁移里的表结构是当时的快照，不引用 app.models：模型以后再改，已有迁移的结果也不会变
+- 每一步都先检查再执行 (表 / 列 / 索引已存在则跳过)，此前由 create_all 建出的库可以直接升级
+
+启动时只调用 verify_schema 校验版本；升级请执行 python -m app.cli.migrate
+新增迁移：在文件末尾追加一个 @migration(下一个版本号, 说明) 函数，同时修改对应的模型
+"""
+import sqlalchemy as sa
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.sql import func
+
+# (版本号, 说明, fn(同步 Connection))
+MIGRATIONS = []
+
+
+def migration(version: int, description: str):
+    def decorator(fn):
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return decorator
+
+
+_version_table = sa.Table(
+    "schema_version", sa.MetaData(),
+    sa.Column("version", sa.Integer, nullable=False),
+)
+
+
+# ---------- 幂等的 DDL 小工具 ----------
+
+def _add_column(conn, table_name: str, column: sa.Column):
+    existing = {c["name"] for c in sa.inspect(conn).get_columns(table_name)}
+    if column.name in existing:
+        return
+    ddl = CreateColumn(column).compile(dialect=conn.dialect)
+    table = conn.dialect.identifier_preparer.quote(table_name)
+    conn.execute(sa.text(f"ALTER TABLE {table} ADD COLUMN {ddl}"))
+
+
+def _create_index(conn, name: str, table_name: str, *columns: str):
+    if name in {ix["name"] for ix in sa.inspect(conn).get_indexes(table_name)}:
+        return
+    table = sa.Table(table_name, sa.MetaData(), autoload_with=conn)
+    sa.Index(name, *(table.c[c] for c in columns)).create(conn)
+
+
+# ---------- 迁移 ----------
+
+@migration(1, "baseline: users / images / tags / image_tag_map")
+def _baseline(conn):
+    metadata = sa.MetaData()
+    sa.Table(
+        "users", metadata,
+        sa.Column("id", sa.Integer, primary_key=True, index=True),
+        sa.Column("username", sa.String(64), unique=True, index=True, nullable=False),
+        sa.Column("email", sa.String(128), unique=True, index=True, nullable=False),
+        sa.Column("hashed_password", sa.String(128), nullable=False),
+    )
+    sa.Table(
+        "images", metadata,
+        sa.Column("id", sa.Integer, primary_key=True, index=True),
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id")),
+        sa.Column("filename", sa.String(255), nullable=False),
+        sa.Column("file_path", sa.String(255), nullable=False),
+        sa.Column("thumbnail_path", sa.String(255), nullable=True),
+        sa.Column("upload_time", sa.DateTime(timezone=True), server_default=func.now()),
+        sa.Column("capture_time", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("location", sa.String(128), nullable=True),
+        sa.Column("resolution", sa.String(32), nullable=True),
+        sa.Column("ai_description", sa.Text, nullable=True),
+    )
+    sa.Table(
+        "tags", metadata,
+        sa.Column("id", sa.Integer, primary_key=True, index=True),
+        sa.Column("name", sa.String(32), unique=True, index=True),
+    )
+    sa.Table(
+        "image_tag_map", metadata,
+        sa.Column("image_id", sa.Integer, sa.ForeignKey("images.id"), primary_key=True),
+        sa.Column("tag_id", sa.Integer, sa.ForeignKey("tags.id"), primary_key=True),
+        sa.Column("source", sa.String(16)),
+    )
+    metadata.create_all(conn, checkfirst=True)
+
+
+@migration(2, "images: orientation, content_hash, placeholder and similarity columns")
+def _image_columns(conn):
+    images = sa.Table(
+        "images", sa.MetaData(),
+        sa.Column("orientation", sa.Integer, nullable=True),
+        sa.Column("content_hash", sa.String(64), nullable=True),
+        sa.Column("blurhash", sa.String(32), nullable=True),
+        sa.Column("dominant_color", sa.String(7), nullable=True),
+        sa.Column("aspect_ratio", sa.Float, nullable=True),
+        sa.Column("features", sa.LargeBinary, nullable=True),
+    )
+    for column in images.columns:
+        _add_column(conn, "images", column)
+    _create_index(conn, "ix_images_content_hash", "images", "content_hash")
+
+
+@migration(3, "image_changes change log")
+def _image_changes(conn):
+    metadata = sa.MetaData()
+    # 仅供外键解析，不会被创建
+    sa.Table("users", metadata, sa.Column("id", sa.Integer, primary_key=True))
+    image_changes = sa.Table(
+        "image_changes", metadata,
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("image_id", sa.Integer, nullable=False),
+        sa.Column("kind", sa.String(16), nullable=False),
+        sa.Column("created_at", sa.DateTime, nullable=False),
+        sa.Index("ix_image_changes_user_id_id", "user_id", "id"),
+    )
+    # 表在 create_all 时代可能已建好，索引单独检查
+    image_changes.create(conn, checkfirst=True)
+    _create_index(conn, "ix_image_changes_user_id_id", "image_changes", "user_id", "id")
+
+
+@migration(4, "indexes for list / tag filter / chat search")
+def _hot_query_indexes(conn):
+    # 列表、搜索都是 WHERE user_id = ? ORDER BY capture_time DESC；
+    # 前导列 user_id 同时覆盖只按用户过滤的查询，不再单独建 user_id 索引
+    _create_index(conn, "ix_images_user_id_capture_time", "images", "user_id", "capture_time")
+    # 主键是 (image_id, tag_id)，按标签反查图片需要反向索引
+    _create_index(conn, "ix_image_tag_map_tag_id_image_id", "image_tag_map", "tag_id", "image_id")
+
+
+LATEST_VERSION = max(version for version, _, _ in MIGRATIONS)
+
+
+# ---------- 执行与校验 ----------
+
+def current_version(conn):
+    """尚未纳入迁移管理的库返回 None"""
+    if not sa.inspect(conn).has_table("schema_version"):
+        return None
+    return conn.execute(sa.select(func.max(_version_table.c.version))).scalar() or 0
+
+
+def _set_version(conn, version: int):
+    _version_table.create(conn, checkfirst=True)
+    conn.execute(sa.delete(_version_table))
+    conn.execute(sa.insert(_version_table).values(version=version))
+
+
+async def upgrade(engine) -> int:
+    """执行所有未执行的迁移，返回执行的数量"""
+    async with engine.connect() as conn:
+        version = await conn.run_sync(current_version) or 0
+
+    applied = 0
+    for target, description, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if target <= version:
+            continue
+        print(f"[migrate] {version} -> {target}: {description}", flush=True)
+        # MySQL 的 DDL 会隐式提交，所以每一步都写成可重复执行的
+        async with engine.begin() as conn:
+            await conn.run_sync(fn)
+            await conn.run_sync(_set_version, target)
+        version = target
+        applied += 1
+    return applied
+
+
+async def verify_schema(engine):
+    """启动时调用：版本落后直接拒绝启动，不在线上隐式改表"""
+    async with engine.connect() as conn:
+        version = await conn.run_sync(current_version)
+    if version is None or version < LATEST_VERSION:
+        raise RuntimeError(
+            f"Database schema is at version {version or 0}, this build needs {LATEST_VERSION}. "
+            f"Run: python -m app.cli.migrate"
+        )
+    if version > LATEST_VERSION:
+        # 滚动发布时新版本已迁移、旧节点仍在运行；迁移只做加法，旧代码可以继续工作
+        print(f"⚠️ Database schema version {version} is newer than this build ({LATEST_VERSION})")
+    return version
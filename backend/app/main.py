@@ -1,27 +1,70 @@
+import os
+import hmac
+import asyncio
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, HTTPException
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.db.database import engine
-from app.db.base import Base  # 确保导入了刚才建立的 Base
+from app.db.database import engine, replica_engine, check_replica, replica_health_loop
+from app.db.instrumentation import QueryStatsMiddleware
+import app.db.base  # noqa: F401  确保所有模型都已注册
+from app.db.migrations import upgrade, verify_schema
 from app.core.config import settings
-from app.routers import auth, images, ai_chat
+from app.core.workers import shutdown_pools, run_in_io_pool
+from app.core.storage import get_storage
+from app.core.metrics import render_latest, monitor_event_loop_lag, CONTENT_TYPE_LATEST
+from app.services.gc_service import orphan_sweep_loop, change_prune_loop
+from app.services.chat_service import close_chat_client
+from app.routers import auth, images, ai_chat, media
+
+# 与数据库里存的 static/... 路径一致 (本地存储的相对 key 按 BASE_DIR 解析)
+STATIC_DIR = os.path.join(settings.BASE_DIR, "static")
+
 # --- 新的 Lifespan (生命周期) 定义 ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # 1. 启动时执行 (Startup)
     print("正在启动数据库连接...")
-    async with engine.begin() as conn:
-        # 开发模式下自动创建表
-        await conn.run_sync(Base.metadata.create_all)
-    print("数据库连接成功，表结构已同步。")
+    # 表结构由 python -m app.cli.migrate 管理，启动时只校验版本
+    if settings.DB_AUTO_MIGRATE:
+        await upgrade(engine)
+    version = await verify_schema(engine)
+    print(f"数据库连接成功，表结构版本 {version}。")
+
+    # 目录创建等副作用放在这里，而不是模块导入时
+    os.makedirs(STATIC_DIR, exist_ok=True)
+    await run_in_io_pool(get_storage().prepare)
+    if settings.SERVE_LEGACY_STATIC and get_storage().name != "local":
+        print(f"警告: STORAGE_BACKEND={settings.STORAGE_BACKEND} 时 /static 只能访问本地旧文件，新上传的图片请通过 /api/media 访问")
+
+    # 定期清理数据库中已无记录的孤儿文件
+    background_loops = []
+    # 只读副本：启动时探测一次，之后定期检查，不可用时读请求回落到主库
+    if replica_engine is not None:
+        await check_replica()
+        background_loops.append(asyncio.create_task(replica_health_loop()))
+    if settings.ORPHAN_SWEEP_INTERVAL > 0:
+        background_loops.append(asyncio.create_task(orphan_sweep_loop()))
+    # 变更日志按保留期清理
+    if settings.CHANGE_PRUNE_INTERVAL > 0:
+        background_loops.append(asyncio.create_task(change_prune_loop()))
+    # 事件循环延迟监控 (/metrics 中的 event_loop_lag_seconds)
+    if settings.EVENT_LOOP_LAG_INTERVAL > 0:
+        background_loops.append(asyncio.create_task(monitor_event_loop_lag(settings.EVENT_LOOP_LAG_INTERVAL)))
     
     yield  # 服务运行期间，代码会停在这里
     
     # 2. 关闭时执行 (Shutdown)
+    for task in background_loops:
+        task.cancel()
     print("正在关闭数据库连接...")
+    shutdown_pools()
+    await close_chat_client()
     await engine.dispose()
+    if replica_engine is not None:
+        await replica_engine.dispose()
     print("数据库连接已关闭。")
 
 # --- 初始化 App ---
@@ -45,13 +88,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 挂载静态文件
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# 每请求 SQL 计数 / 慢查询 (见 app/db/instrumentation.py)
+app.add_middleware(QueryStatsMiddleware)
+
+# 旧版静态文件挂载：没有鉴权，只为兼容直接拼 /static 路径的旧客户端保留，默认关闭；
+# 前端已改走 /api/media (按用户鉴权，带 ETag 与缓存头)
+# check_dir=False：目录在 lifespan 中创建，导入模块时不要求它已存在
+if settings.SERVE_LEGACY_STATIC:
+    app.mount("/static", StaticFiles(directory=STATIC_DIR, check_dir=False), name="static")
 
 # 注册路由
 app.include_router(auth.router, prefix="/api/auth", tags=["Auth"])
 app.include_router(images.router, prefix="/api/images", tags=["Images"])
 app.include_router(ai_chat.router, prefix="/api/chat", tags=["AI Chat"])
+app.include_router(media.router, prefix="/api/media", tags=["Media"])
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    # 未配置 METRICS_TOKEN 时当作不存在；令牌比较用常量时间
+    if not settings.METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    expected = f"Bearer {settings.METRICS_TOKEN}"
+    if not hmac.compare_digest(request.headers.get("authorization", "").encode(), expected.encode()):
+        raise HTTPException(status_code=401, detail="Invalid metrics token", headers={"WWW-Authenticate": "Bearer"})
+    return Response(render_latest(), media_type=CONTENT_TYPE_LATEST)
 
 @app.get("/")
 def read_root():
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Table
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Table, Float, LargeBinary, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.database import Base
@@ -9,11 +9,15 @@ image_tag_map = Table(
     Base.metadata,
     Column("image_id", Integer, ForeignKey("images.id"), primary_key=True),
     Column("tag_id", Integer, ForeignKey("tags.id"), primary_key=True),
-    Column("source", String(16), default="manual") # manual 或 ai
+    Column("source", String(16), default="manual"), # manual 或 ai
+    # 主键是 (image_id, tag_id)，按标签反查图片走这个索引
+    Index("ix_image_tag_map_tag_id_image_id", "tag_id", "image_id"),
 )
 
 class Image(Base):
     __tablename__ = "images"
+    # 列表 / 搜索：WHERE user_id = ? ORDER BY capture_time DESC
+    __table_args__ = (Index("ix_images_user_id_capture_time", "user_id", "capture_time"),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -25,7 +29,14 @@ class Image(Base):
     capture_time = Column(DateTime(timezone=True), nullable=True)
     location = Column(String(128), nullable=True)
     resolution = Column(String(32), nullable=True)
+    orientation = Column(Integer, nullable=True, default=1) # EXIF Orientation，原图未旋转时由前端/衍生图处理
     ai_description = Column(Text, nullable=True)
+    content_hash = Column(String(64), nullable=True, index=True) # 原图 sha256，目录导入时据此去重
+    # 列表占位：缩略图加载前前端用它们排版瀑布流并画出模糊预览
+    blurhash = Column(String(32), nullable=True)
+    dominant_color = Column(String(7), nullable=True) # #rrggbb
+    aspect_ratio = Column(Float, nullable=True) # 显示宽 / 高 (已考虑 Orientation)
+    features = Column(LargeBinary, nullable=True) # 相似图片检索用的视觉特征，见 similarity_service
 
     # 关联
     tags = relationship("Tag", secondary=image_tag_map, back_populates="images")
@@ -37,4 +48,18 @@ class Tag(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(32), unique=True, index=True)
     
-    images = relationship("Image", secondary=image_tag_map, back_populates="tags")
\ No newline at end of file
+    images = relationship("Image", secondary=image_tag_map, back_populates="tags")
+
+class ImageChange(Base):
+    """
+    图片变更日志，客户端据此增量同步 (GET /api/images/changes?since=)。
+    与对应的修改写在同一个事务里；id 单调递增，即同步游标
+    """
+    __tablename__ = "image_changes"
+    __table_args__ = (Index("ix_image_changes_user_id_id", "user_id", "id"),)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    image_id = Column(Integer, nullable=False) # 不加外键：删除事件要比图片本身保留得久
+    kind = Column(String(16), nullable=False) # created / updated / tagged / analyzed / deleted
+    created_at = Column(DateTime, nullable=False) # UTC，由应用写入
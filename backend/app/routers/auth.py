@@ -1,49 +1,100 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from jose import jwt, JWTError
 
-from app.db.database import get_db
+from app.db.database import get_db, current_user_id
 from app.models.user import User
 from app.schemas.user import UserCreate, UserResponse, Token
 from app.services import auth_service
 from app.core.security import create_access_token
 from app.core.config import settings
+from app.core.ratelimit import LIMITERS, RateLimited
 
 router = APIRouter()
 
 # 定义 OAuth2 Scheme，告诉 Swagger UI 登录接口在哪里
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
+principal_cache = auth_service.principal_cache
 
-# --- 补充缺失的 get_current_user 函数 ---
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+async def resolve_user_from_token(token: str, db: AsyncSession, scope: str = None):
     """
-    解析 Token 并获取当前登录用户对象
+    解析 Token 并获取当前登录用户对象。
+    scope 区分用途：登录 Token 不带 scope；图片 Cookie 的 scope 为 media，只能用于图片访问
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    if not token:
+        raise credentials_exception
     try:
         # 解码 JWT
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         username: str = payload.get("sub")
-        if username is None:
+        user_id = payload.get("id")
+        if username is None or payload.get("scope") != scope:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
+
+    # 先查缓存，sub 也要一致，防止旧 Token 命中别人的 ID
+    if user_id is not None:
+        user = principal_cache.get(user_id)
+        if user is not None and user.username == username:
+            current_user_id.set(user.id)
+            return user
     
-    # 查数据库
-    result = await db.execute(select(User).where(User.username == username))
-    user = result.scalars().first()
+    # 查数据库 (新 Token 都带 id，走主键查询)
+    if user_id is not None:
+        user = await db.get(User, user_id)
+        if user is not None and user.username != username:
+            user = None
+    else:
+        result = await db.execute(select(User).where(User.username == username))
+        user = result.scalars().first()
     
     if user is None:
         raise credentials_exception
-        
+
+    # 从 Session 中摘出来，缓存对象不会被其他请求的 commit/rollback 过期
+    db.expunge(user)
+    principal_cache.set(user.id, user)
+    # 读写分离据此判断该用户是否处于写后粘滞窗口
+    current_user_id.set(user.id)
     return user
 
+# --- 补充缺失的 get_current_user 函数 ---
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    return await resolve_user_from_token(token, db)
+
+def rate_limited_user(endpoint: str, cost_bytes: int = 0):
+    """
+    昂贵接口用的 get_current_user：额外经过按用户的令牌桶与公平队列 (见 app/core/ratelimit.py)，
+    整个处理过程占用一个并发名额。cost_bytes > 0 时按请求体大小计权 (每 cost_bytes 字节算一份)
+    """
+    limiter = LIMITERS[endpoint]
+
+    async def dependency(request: Request, user: User = Depends(get_current_user)):
+        cost = 1.0
+        length = request.headers.get("content-length", "")
+        if cost_bytes > 0 and length.isdigit():
+            cost = max(1.0, int(length) / cost_bytes)
+        try:
+            async with limiter.limit(user.id, cost):
+                yield user
+        except RateLimited as e:
+            # 超出自己的额度是 429；排队超时说明整体过载，返回 503
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE if e.reason == "queue_timeout" else status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Too many {endpoint} requests, please retry later",
+                headers={"Retry-After": str(e.retry_after)},
+            )
+
+    return dependency
+
 # --- 原有的路由 ---
 
 @router.post("/register", response_model=UserResponse)
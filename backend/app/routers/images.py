@@ -1,21 +1,42 @@
-import os
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, BackgroundTasks, Query, status
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, BackgroundTasks, Query, Request, status
+from fastapi.responses import StreamingResponse, ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy import delete, func
 from sqlalchemy.orm import selectinload
 from typing import List, Optional
-from datetime import date
+from datetime import date, datetime, timedelta
 
-from app.db.database import get_db, SessionLocal
-from app.models.image import Image, Tag
+from app.db.database import get_db, get_read_db, ReadSessionLocal
+from app.models.image import Image, Tag, image_tag_map
 from app.models.user import User
-from app.schemas.image import ImageResponse, ImageUpdate, BatchDeleteRequest
-from app.services.image_service import process_upload, delete_image_files, analyze_image_with_ai
+from app.schemas.image import (
+    ImageResponse, ImageListItem, SimilarImageItem, ImageChangesResponse,
+    ImageUpdate, BatchDeleteRequest, ExportRequest, ImageFilter, BulkTagRequest, BulkTagResponse
+)
+from app.services.image_service import process_upload, analyze_image_with_ai
+from app.services.gc_service import schedule_file_deletion
+from app.services.tag_service import (
+    ensure_tags, link_tags, normalize_tag_names, bulk_add_tags, bulk_remove_tags, bulk_merge_tags
+)
+from app.services.change_service import record_changes, fetch_changes, latest_cursor, retained_floor
+from app.services.export_service import stream_zip, archive_name
+from app.services.ai_service import analyze_and_save
 from app.core.config import settings
-from app.routers.auth import get_current_user
+from app.core.metrics import UPLOAD_STAGE_SECONDS, BACKGROUND_QUEUE_DEPTH
+from app.core.ratelimit import LIMITERS
+from app.services.media_service import build_media_response
+from app.services.render_service import rendition_cache, RENDER_FORMATS
+from app.services.similarity_service import similarity_index
+from app.routers.auth import get_current_user, rate_limited_user
+from app.routers.media import get_media_user
 
 router = APIRouter()
 
+# 上传 / AI 分析按用户限流并公平排队，单个用户的批量操作不会拖慢其他人
+upload_user = rate_limited_user("upload", cost_bytes=settings.FAIR_QUEUE_UPLOAD_COST_BYTES)
+analyze_user = rate_limited_user("analyze")
+
 # ==========================================
 # 1. 静态与功能性路由
 # ==========================================
@@ -25,7 +46,7 @@ async def upload_image(
     background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(upload_user)
 ):
     """
     上传图片并自动处理
@@ -34,57 +55,42 @@ async def upload_image(
     metadata = await process_upload(file, current_user.id)
     
     # 2. 存入数据库
-    # 路径处理：存储相对于项目根目录的相对路径，方便前端静态资源访问
-    # 如果 settings.BASE_DIR 没定义，就直接存 metadata 里的路径，视具体配置而定
-    rel_file_path = metadata["file_path"]
-    rel_thumb_path = metadata["thumbnail_path"]
-    
-    # 尝试转为相对路径存储
-    if os.path.isabs(rel_file_path):
-        rel_file_path = os.path.relpath(metadata["file_path"], os.getcwd())
-    if os.path.isabs(rel_thumb_path):
-        rel_thumb_path = os.path.relpath(metadata["thumbnail_path"], os.getcwd())
-
-    new_image = Image(
-        user_id=current_user.id,
-        filename=metadata["filename"],
-        file_path=rel_file_path,
-        thumbnail_path=rel_thumb_path,
-        resolution=metadata["resolution"],
-        capture_time=metadata["capture_time"],
-        location=metadata["location"]
-    )
+    # file_path / thumbnail_path 是存储 key，前端按图片 ID 走 /api/media 访问
+    with UPLOAD_STAGE_SECONDS.labels("db").time():
+        new_image = Image(
+            user_id=current_user.id,
+            filename=metadata["filename"],
+            file_path=metadata["file_path"],
+            thumbnail_path=metadata["thumbnail_path"],
+            resolution=metadata["resolution"],
+            orientation=metadata["orientation"],
+            capture_time=metadata["capture_time"],
+            location=metadata["location"],
+            content_hash=metadata["content_hash"],
+            blurhash=metadata["blurhash"],
+            dominant_color=metadata["dominant_color"],
+            aspect_ratio=metadata["aspect_ratio"],
+            features=metadata["features"]
+        )
     
-    db.add(new_image)
-    await db.commit()
-    
-    # 【关键修复】显式加载 tags，避免 MissingGreenlet 错误
-    await db.refresh(new_image, attribute_names=["tags"])
+        db.add(new_image)
+        await db.flush()
     
-    # 3. 处理自动生成的标签 (EXIF/地理位置)
-    if metadata["auto_tags"]:
-        for tag_name in metadata["auto_tags"]:
-            # 查重或创建
-            result = await db.execute(select(Tag).where(Tag.name == tag_name))
-            tag = result.scalars().first()
-            if not tag:
-                tag = Tag(name=tag_name)
-                db.add(tag)
-                await db.commit()
-                await db.refresh(tag)
-            
-            # 此时访问 new_image.tags 是安全的
-            if tag not in new_image.tags:
-                new_image.tags.append(tag)
-        
+        # 3. 处理自动生成的标签 (EXIF/地理位置)
+        # 集合式写入 + 冲突忽略，并发上传同一地点的照片不会撞 tags.name 唯一约束
+        tag_ids = await ensure_tags(db, metadata["auto_tags"])
+        await link_tags(db, [(new_image.id, tag_id) for tag_id in tag_ids.values()])
+        await record_changes(db, current_user.id, [new_image.id], "created")
         await db.commit()
 
     # 4. 添加后台 AI 分析任务
     # 注意：这里传给 Service 的最好是绝对路径，确保 AI 库能读取到文件
+    BACKGROUND_QUEUE_DEPTH.labels("ai_analysis").inc()
     background_tasks.add_task(
         background_ai_analysis, 
         new_image.id, 
-        metadata["file_path"] 
+        metadata["file_path"],
+        current_user.id
     )
 
     return {"msg": "Upload success", "id": new_image.id, "url": new_image.thumbnail_path}
@@ -96,67 +102,214 @@ async def batch_delete_images(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    stmt = select(Image).where(Image.user_id == current_user.id).where(Image.id.in_(req.ids))
-    result = await db.execute(stmt)
-    images = result.scalars().all()
-    
-    count = 0
-    for img in images:
-        delete_image_files(img.file_path, img.thumbnail_path)
-        await db.delete(img)
-        count += 1
-        
-    await db.commit()
+    count = await _bulk_delete_images(db, current_user.id, req.ids)
     return {"message": f"Successfully deleted {count} images"}
 
+# --- 批量改标签 ---
+@router.post("/tags/bulk", response_model=BulkTagResponse)
+async def bulk_edit_tags(
+    req: BulkTagRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    按 ID 列表或筛选条件批量 add / remove / rename / merge 标签。
+    每批图片只发几条 INSERT ... SELECT / DELETE ... WHERE，全部在一个事务里完成，返回影响的数量
+    """
+    names = normalize_tag_names(req.tags)
+    if not names:
+        raise HTTPException(status_code=400, detail="tags must not be empty")
+    if req.op in ("rename", "merge"):
+        if not normalize_tag_names([req.target]):
+            raise HTTPException(status_code=400, detail="target is required for rename and merge")
+        if req.op == "rename" and len(names) != 1:
+            raise HTTPException(status_code=400, detail="rename takes exactly one tag")
+    elif not _has_filter(req):
+        raise HTTPException(status_code=400, detail="Specify ids, tag or a date range")
+
+    changed, added, removed = [], 0, 0
+    for scope in _filter_scopes(current_user.id, req):
+        if req.op == "add":
+            ids, n = await bulk_add_tags(db, scope, names)
+            added += n
+        elif req.op == "remove":
+            ids, n = await bulk_remove_tags(db, scope, names)
+            removed += n
+        else:
+            ids, n_added, n_removed = await bulk_merge_tags(db, scope, names, req.target)
+            added += n_added
+            removed += n_removed
+        changed.extend(ids)
+
+    await record_changes(db, current_user.id, changed, "tagged")
+    await db.commit()
+    return {"op": req.op, "images": len(changed), "added": added, "removed": removed}
+
+# --- 打包导出 (流式 zip) ---
+@router.post("/export")
+async def export_images(
+    req: ExportRequest,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    按 ID 列表 / 标签 / 日期范围导出 zip，边读边写，不在内存或磁盘上生成整个压缩包。
+    压缩包内按 ID 升序排列，下载中断后可带上最后一个完整文件的 ID 作为 after_id 续传
+    """
+    return await _export_response(db, current_user.id, req)
+
+@router.get("/export")
+async def export_images_get(
+    ids: Optional[List[int]] = Query(None),
+    tag: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    rendition: str = "original",
+    after_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_media_user)
+):
+    """GET 版本，方便浏览器直接下载 (可用图片 Cookie 鉴权，见 POST /api/media/session)"""
+    if rendition not in ("original", "thumbnail"):
+        raise HTTPException(status_code=400, detail="rendition must be original or thumbnail")
+    req = ExportRequest(ids=ids, tag=tag, start_date=start_date, end_date=end_date,
+                        rendition=rendition, after_id=after_id)
+    return await _export_response(db, current_user.id, req)
+
 # --- 图片列表查询 (首页瀑布流) ---
-@router.get("/", response_model=List[ImageResponse])
+@router.get("/", response_model=List[ImageListItem], response_class=ORJSONResponse)
 async def get_images(
     tag: Optional[str] = None,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
     skip: int = 0, 
     limit: int = 20, 
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    列表只查瀑布流用到的列 + 一条标签查询，直接拼 dict 用 orjson 输出，
+    不经过 ORM 实体和 Pydantic 校验；完整字段走详情接口
+    """
+    stmt = build_list_query(current_user.id, tag, start_date, end_date).offset(skip).limit(limit)
+    items = [row._asdict() for row in await db.execute(stmt)]
+    await _attach_tag_names(db, items)
+    return ORJSONResponse(items)
+
+# --- 增量同步 ---
+@router.get("/changes", response_model=ImageChangesResponse, response_class=ORJSONResponse)
+async def get_image_changes(
+    since: Optional[int] = Query(None, ge=0),
+    limit: int = Query(500, ge=1, le=1000),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    stmt = (
-        select(Image)
-        .where(Image.user_id == current_user.id)
-        .options(selectinload(Image.tags))
-    )
-    
-    # 筛选
-    if tag:
-        stmt = stmt.join(Image.tags).where(Tag.name.contains(tag))
-    if start_date:
-        stmt = stmt.where(Image.upload_time >= start_date)
-    if end_date:
-        stmt = stmt.where(Image.upload_time <= end_date)
+    """
+    返回游标 since 之后的变更：upserted 为图片当前的列表字段，deleted 为已删除的 ID。
+    不带 since 时只返回当前游标，客户端首次全量拉取列表之前先调用一次记下它。
+    固定读主库：CHANGE_FEED_SETTLE_SECONDS 只能覆盖主库上事务乱序提交，
+    副本可能先应用了较大的 ID，游标越过后较小 ID 的变更就永远丢了。
+    变更日志只保留 CHANGE_LOG_RETENTION_DAYS 天：since 早于保留下限时返回 reset=true 与新游标，
+    客户端必须丢弃本地数据全量重新拉取，再从该游标继续
+    """
+    if since is None or since < await retained_floor(db):
+        cursor = await latest_cursor(db, current_user.id)
+        return ORJSONResponse(
+            {"cursor": cursor, "has_more": False, "upserted": [], "deleted": [], "reset": since is not None}
+        )
 
-    # 【核心修改】排序逻辑升级
-    # 1. 拍摄时间 (优先展示新拍的)
-    # 2. 上传时间 (没有拍摄时间时，按上传时间)
-    # 3. ID (定海神针，解决分页跳变)
-    stmt = stmt.order_by(
-        Image.capture_time.desc(), 
-        Image.upload_time.desc(),
-        Image.id.desc()
-    ).offset(skip).limit(limit)
-    
-    result = await db.execute(stmt)
-    return result.scalars().all()
+    cursor, has_more, upserted_ids, deleted = await fetch_changes(db, current_user.id, since, limit)
+    items = []
+    if upserted_ids:
+        rows = await db.execute(
+            select(*SYNC_COLUMNS).where(Image.user_id == current_user.id, Image.id.in_(upserted_ids))
+        )
+        by_id = {row.id: row._asdict() for row in rows}
+        items = [by_id[i] for i in upserted_ids if i in by_id]
+        # 之后又被删除的图片 (删除事件在后面的页里) 直接按删除返回
+        deleted.extend(i for i in upserted_ids if i not in by_id)
+        await _attach_tag_names(db, items)
+    return ORJSONResponse({"cursor": cursor, "has_more": has_more, "upserted": items, "deleted": deleted, "reset": False})
 
 # ==========================================
 # 2. 具体资源路由 (/{image_id} 开头)
 # ==========================================
 
+# --- 按需生成指定尺寸的衍生图 ---
+@router.get("/{image_id}/render")
+async def render_image(
+    image_id: int,
+    request: Request,
+    w: Optional[int] = Query(None, ge=1),
+    h: Optional[int] = Query(None, ge=1),
+    fmt: str = "webp",
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_media_user)
+):
+    """
+    首次请求时在图片线程池中生成，之后直接命中磁盘缓存 (LRU，容量见 RENDITION_CACHE_MAX_BYTES)
+    """
+    if fmt not in RENDER_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format, use one of {list(RENDER_FORMATS)}")
+    if w is None and h is None:
+        raise HTTPException(status_code=400, detail="At least one of w/h is required")
+    if (w or 0) > settings.RENDER_MAX_DIM or (h or 0) > settings.RENDER_MAX_DIM:
+        raise HTTPException(status_code=400, detail=f"Max dimension is {settings.RENDER_MAX_DIM}")
+
+    stmt = select(Image.file_path).where(Image.id == image_id, Image.user_id == current_user.id)
+    file_path = (await db.execute(stmt)).scalar()
+    if not file_path:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    # 极少数情况下刚生成的文件会被并发请求淘汰，重试一次
+    for _ in range(2):
+        try:
+            path = await rendition_cache.get(image_id, file_path, w, h, fmt)
+            return await build_media_response(request, path)
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            print(f"Render error: {e}")
+            raise HTTPException(status_code=422, detail="Image cannot be rendered")
+    raise HTTPException(status_code=404, detail="File not found")
+
+# --- 相似图片 ---
+@router.get("/{image_id}/similar", response_model=List[SimilarImageItem], response_class=ORJSONResponse)
+async def get_similar_images(
+    image_id: int,
+    k: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    按颜色 / 纹理特征找该用户最相似的 k 张图片，按距离从小到大排列
+    """
+    stmt = select(Image.features).where(Image.id == image_id, Image.user_id == current_user.id)
+    row = (await db.execute(stmt)).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Image not found")
+    if not row.features:
+        raise HTTPException(status_code=409, detail="Image features not computed yet")
+
+    matches = await similarity_index.find_similar(db, current_user.id, image_id, row.features, k)
+    if not matches:
+        return ORJSONResponse([])
+
+    distances = dict(matches)
+    rows = await db.execute(select(*LIST_COLUMNS).where(Image.id.in_(list(distances))))
+    by_id = {row.id: row._asdict() for row in rows}
+    items = [by_id[i] for i, _ in matches if i in by_id]
+    await _attach_tag_names(db, items)
+    for item in items:
+        item["distance"] = round(distances[item["id"]], 4)
+    return ORJSONResponse(items)
+
 # --- 手动触发 AI 分析 ---
 @router.post("/{image_id}/analyze")
 async def analyze_image_endpoint(
     image_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(analyze_user)
 ):
     stmt = select(Image).where(Image.id == image_id, Image.user_id == current_user.id)
     result = await db.execute(stmt)
@@ -202,6 +355,7 @@ async def remove_tag_from_image(
             
     if tag_to_remove:
         image.tags.remove(tag_to_remove)
+        await record_changes(db, current_user.id, [image.id], "tagged")
         await db.commit()
         return {"message": f"Tag '{tag_name}' removed"}
     else:
@@ -211,7 +365,7 @@ async def remove_tag_from_image(
 @router.get("/{image_id}", response_model=ImageResponse)
 async def get_image_detail(
     image_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     stmt = (
@@ -234,17 +388,11 @@ async def delete_image(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    result = await db.execute(select(Image).where(Image.id == image_id, Image.user_id == current_user.id))
-    image = result.scalars().first()
+    count = await _bulk_delete_images(db, current_user.id, [image_id])
     
-    if not image:
+    if not count:
         raise HTTPException(status_code=404, detail="Image not found")
     
-    delete_image_files(image.file_path, image.thumbnail_path)
-    
-    await db.delete(image)
-    await db.commit()
-    
     return {"message": "Image deleted successfully"}
 
 # --- 更新图片信息 ---
@@ -269,84 +417,192 @@ async def update_image_info(
     # 更新 AI 描述
     if update_data.ai_description is not None:
         image.ai_description = update_data.ai_description
+        await record_changes(db, current_user.id, [image.id], "updated")
 
     # 更新标签 (追加模式)
-    if update_data.custom_tags is not None:
-        for tag_name in update_data.custom_tags:
-            tag_name = tag_name.strip()
-            if not tag_name: continue
-            
-            # 查重或创建
-            tag_res = await db.execute(select(Tag).where(Tag.name == tag_name))
-            tag = tag_res.scalars().first()
-            if not tag:
-                tag = Tag(name=tag_name)
-                db.add(tag)
-                await db.commit()
-                await db.refresh(tag)
-            
-            # 避免重复关联
-            if tag not in image.tags:
-                image.tags.append(tag)
+    if update_data.custom_tags:
+        tag_ids = await ensure_tags(db, update_data.custom_tags)
+        await link_tags(db, [(image.id, tag_id) for tag_id in tag_ids.values()])
+        await record_changes(db, current_user.id, [image.id], "tagged")
         
     await db.commit()
-    await db.refresh(image)
+    # 标签是直接写关联表的，只需重新加载 tags；列属性在 commit 后不过期 (expire_on_commit=False)
+    await db.refresh(image, attribute_names=["tags"])
     return image
 
 # ==========================================
 # 3. 辅助函数
 # ==========================================
 
-async def background_ai_analysis(image_id: int, file_path: str):
+def _has_filter(req: ImageFilter) -> bool:
+    return bool(req.ids or req.tag or req.start_date or req.end_date)
+
+def _apply_image_filters(stmt, user_id: int, req: ImageFilter):
+    stmt = stmt.where(Image.user_id == user_id)
+    if req.ids:
+        stmt = stmt.where(Image.id.in_(req.ids))
+    if req.tag:
+        stmt = stmt.where(Image.tags.any(Tag.name.contains(req.tag)))
+    taken_at = func.coalesce(Image.capture_time, Image.upload_time)
+    if req.start_date:
+        stmt = stmt.where(taken_at >= req.start_date)
+    if req.end_date:
+        # 包含结束当天
+        stmt = stmt.where(taken_at < datetime.combine(req.end_date, datetime.min.time()) + timedelta(days=1))
+    return stmt
+
+def _filter_scopes(user_id: int, req: ImageFilter):
+    """批量操作的范围查询 select(Image.id)；ID 列表很长时按 DELETE_CHUNK_SIZE 分批，避免超长 SQL"""
+    if not req.ids:
+        yield _apply_image_filters(select(Image.id), user_id, req)
+        return
+    ids = list(dict.fromkeys(req.ids))
+    for i in range(0, len(ids), DELETE_CHUNK_SIZE):
+        chunk = req.model_copy(update={"ids": ids[i:i + DELETE_CHUNK_SIZE]})
+        yield _apply_image_filters(select(Image.id), user_id, chunk)
+
+# 导出流式阶段每页查询的图片数
+EXPORT_PAGE_SIZE = 500
+
+def _apply_export_filters(stmt, user_id: int, req: ExportRequest):
+    stmt = _apply_image_filters(stmt, user_id, req)
+    if req.after_id is not None:
+        stmt = stmt.where(Image.id > req.after_id)
+    return stmt
+
+async def _export_response(db: AsyncSession, user_id: int, req: ExportRequest):
+    if not _has_filter(req):
+        raise HTTPException(status_code=400, detail="Specify ids, tag or a date range to export")
+
+    count_stmt = _apply_export_filters(select(func.count(Image.id)), user_id, req)
+    total = (await db.execute(count_stmt)).scalar()
+    if not total:
+        raise HTTPException(status_code=404, detail="No images to export")
+
+    async def entries():
+        # 依赖注入的 Session 在响应开始前就会关闭；流式阶段按 ID 游标分页，每页一个短 Session，
+        # 慢速下载期间不占着连接池里的连接和服务端游标
+        last_id = req.after_id
+        while True:
+            async with ReadSessionLocal() as page_db:
+                stmt = _apply_export_filters(
+                    select(Image.id, Image.filename, Image.file_path, Image.thumbnail_path,
+                           Image.capture_time, Image.upload_time),
+                    user_id, req.model_copy(update={"after_id": last_id})
+                ).order_by(Image.id).limit(EXPORT_PAGE_SIZE)
+                rows = (await page_db.execute(stmt)).all()
+            for row in rows:
+                path = row.file_path if req.rendition == "original" else (row.thumbnail_path or row.file_path)
+                yield archive_name(row.id, row.filename, path), path, row.capture_time or row.upload_time
+            if len(rows) < EXPORT_PAGE_SIZE:
+                return
+            last_id = rows[-1].id
+
+    filename = f"smartimage-export-{datetime.now():%Y%m%d-%H%M%S}.zip"
+    return StreamingResponse(
+        stream_zip(entries()),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Export-Count": str(total),
+        },
+    )
+
+# 列表接口查询的列，与 ImageListItem 字段一一对应 (tags 另查)
+LIST_COLUMNS = (
+    Image.id, Image.filename, Image.file_path, Image.thumbnail_path, Image.capture_time, Image.upload_time,
+    Image.location, Image.resolution, Image.orientation,
+    Image.blurhash, Image.dominant_color, Image.aspect_ratio,
+)
+
+def build_list_query(user_id: int, tag: str = None, start_date=None, end_date=None):
+    """首页列表的查询 (benchmarks/query_plans.py 用它检查执行计划)"""
+    stmt = select(*LIST_COLUMNS).where(Image.user_id == user_id)
+
+    # 筛选 (EXISTS 子查询，多个标签命中时不会返回重复图片)
+    if tag:
+        stmt = stmt.where(Image.tags.any(Tag.name.contains(tag)))
+    if start_date:
+        stmt = stmt.where(Image.upload_time >= start_date)
+    if end_date:
+        stmt = stmt.where(Image.upload_time <= end_date)
+
+    # 【核心修改】排序逻辑升级
+    # 1. 拍摄时间 (优先展示新拍的)
+    # 2. 上传时间 (没有拍摄时间时，按上传时间)
+    # 3. ID (定海神针，解决分页跳变)
+    return stmt.order_by(
+        Image.capture_time.desc(),
+        Image.upload_time.desc(),
+        Image.id.desc()
+    )
+
+# 增量同步额外带上 AI 描述，客户端无需再逐张拉详情
+SYNC_COLUMNS = LIST_COLUMNS + (Image.ai_description,)
+
+async def _attach_tag_names(db: AsyncSession, items: List[dict]):
+    """一条查询取回整页图片的标签名，填到每个 dict 的 tags 字段"""
+    by_id = {}
+    for item in items:
+        item["tags"] = []
+        by_id[item["id"]] = item["tags"]
+    if not by_id:
+        return
+    rows = await db.execute(
+        select(image_tag_map.c.image_id, Tag.name)
+        .join(Tag, Tag.id == image_tag_map.c.tag_id)
+        .where(image_tag_map.c.image_id.in_(list(by_id)))
+        .order_by(image_tag_map.c.image_id, Tag.id)
+    )
+    for image_id, name in rows:
+        by_id[image_id].append(name)
+
+# 单条 IN (...) 的最大 ID 数，避免超长 SQL
+DELETE_CHUNK_SIZE = 1000
+
+async def _bulk_delete_images(db: AsyncSession, user_id: int, ids: List[int]) -> int:
     """
-    后台任务：分析图片并更新数据库
+    集合式删除：每批只发 4 条语句 (查路径 + 删关联 + 删图片 + 写变更日志)，
+    文件在事务提交后交给后台 GC 删除
     """
-    if not settings.SILICONFLOW_API_KEY:
-        print("AI API Key not set, skipping background analysis.")
-        return
+    ids = list(dict.fromkeys(ids))
+    deleted_ids = []
+    paths = []
 
-    async with SessionLocal() as db:
-        try:
-            ai_result = await analyze_image_with_ai(file_path, settings.SILICONFLOW_API_KEY)
-            
-            if ai_result:
-                # 重新查询并加载 tags
-                stmt = (
-                    select(Image)
-                    .options(selectinload(Image.tags))
-                    .where(Image.id == image_id)
-                )
-                result = await db.execute(stmt)
-                img = result.scalars().first()
-                
-                if img:
-                    img.ai_description = ai_result.get("summary")
-                    
-                    new_tag_names = ai_result.get("tags", [])
-                    if new_tag_names:
-                        current_tag_names = {t.name for t in img.tags}
-                        
-                        for tag_name in new_tag_names:
-                            tag_name = tag_name.strip()
-                            if not tag_name or tag_name in current_tag_names:
-                                continue
-                                
-                            tag_res = await db.execute(select(Tag).where(Tag.name == tag_name))
-                            tag = tag_res.scalars().first()
-                            
-                            if not tag:
-                                tag = Tag(name=tag_name)
-                                db.add(tag)
-                                await db.flush() 
-                            
-                            img.tags.append(tag)
-                            current_tag_names.add(tag_name)
-
-                    await db.commit()
-                    print(f"✅ AI Analysis complete for Image ID {image_id}")
-            else:
-                print(f"⚠️ AI Analysis returned no results for Image ID {image_id}.")
-
-        except Exception as e:
-            print(f"❌ AI Analysis background task failed: {e}")
-            await db.rollback()
\ No newline at end of file
+    for i in range(0, len(ids), DELETE_CHUNK_SIZE):
+        chunk = ids[i:i + DELETE_CHUNK_SIZE]
+        rows = (await db.execute(
+            select(Image.id, Image.file_path, Image.thumbnail_path)
+            .where(Image.user_id == user_id, Image.id.in_(chunk))
+        )).all()
+        if not rows:
+            continue
+
+        owned_ids = [row.id for row in rows]
+        await db.execute(delete(image_tag_map).where(image_tag_map.c.image_id.in_(owned_ids)))
+        await db.execute(
+            delete(Image)
+            .where(Image.id.in_(owned_ids))
+            .execution_options(synchronize_session=False)
+        )
+        await record_changes(db, user_id, owned_ids, "deleted")
+        deleted_ids.extend(owned_ids)
+        paths.extend((row.file_path, row.thumbnail_path) for row in rows)
+
+    await db.commit()
+    schedule_file_deletion(paths, deleted_ids)
+    return len(deleted_ids)
+
+async def background_ai_analysis(image_id: int, file_path: str, user_id: int):
+    """
+    后台任务：分析图片并更新数据库。
+    与手动分析接口共用上传者的 analyze 额度与并发名额 (LIMITERS["analyze"])，额度不够时排队等待
+    """
+    try:
+        if settings.SILICONFLOW_API_KEY:
+            async with LIMITERS["analyze"].wait(user_id):
+                await analyze_and_save(image_id, file_path)
+        else:
+            await analyze_and_save(image_id, file_path)
+    finally:
+        BACKGROUND_QUEUE_DEPTH.labels("ai_analysis").dec()
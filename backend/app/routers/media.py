@@ -0,0 +1,95 @@
+from typing import Optional
+from datetime import timedelta
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import RedirectResponse
+from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.core.security import create_access_token
+from app.core.storage import get_storage
+from app.db.database import get_db, get_read_db
+from app.models.image import Image
+from app.routers.auth import resolve_user_from_token, get_current_user
+from app.services.media_service import build_media_response
+
+router = APIRouter()
+
+# <img src> 无法携带 Authorization 头：除了请求头，也接受 POST /session 下发的图片 Cookie。
+# 不接受 ?token= 查询参数，登录 Token 不会出现在访问日志和缓存键里
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
+
+MEDIA_KINDS = ("original", "thumbnail")
+
+# Cookie 同时覆盖 /api/media 与 /api/images/export
+MEDIA_COOKIE_PATH = "/api"
+
+async def get_media_user(
+    request: Request,
+    header_token: Optional[str] = Depends(optional_oauth2_scheme),
+    db: AsyncSession = Depends(get_db)
+):
+    if header_token:
+        return await resolve_user_from_token(header_token, db)
+    return await resolve_user_from_token(request.cookies.get(settings.MEDIA_COOKIE_NAME), db, scope="media")
+
+@router.post("/session")
+async def create_media_session(response: Response, current_user = Depends(get_current_user)):
+    """
+    用登录 Token 换一个只能访问图片的短期 HttpOnly Cookie；前端在过期前 (expires_in 的一半左右) 重新获取
+    """
+    token = create_access_token(
+        data={"sub": current_user.username, "id": current_user.id, "scope": "media"},
+        expires_delta=timedelta(seconds=settings.MEDIA_SESSION_SECONDS)
+    )
+    response.set_cookie(
+        settings.MEDIA_COOKIE_NAME, token,
+        max_age=settings.MEDIA_SESSION_SECONDS, path=MEDIA_COOKIE_PATH,
+        httponly=True, samesite="lax", secure=settings.MEDIA_COOKIE_SECURE
+    )
+    return {"expires_in": settings.MEDIA_SESSION_SECONDS}
+
+@router.delete("/session")
+async def delete_media_session(response: Response):
+    response.delete_cookie(settings.MEDIA_COOKIE_NAME, path=MEDIA_COOKIE_PATH)
+    return {"message": "Media session cleared"}
+
+@router.api_route("/{image_id}/{kind}", methods=["GET", "HEAD"])
+async def get_media(
+    image_id: int,
+    kind: str,
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
+    current_user = Depends(get_media_user)
+):
+    """
+    按图片 ID 提供原图/缩略图：带 ETag、Last-Modified、Range 与长效缓存头
+    """
+    if kind not in MEDIA_KINDS:
+        raise HTTPException(status_code=404, detail="Unknown media kind")
+
+    stmt = (
+        select(Image.file_path, Image.thumbnail_path, Image.content_hash)
+        .where(Image.id == image_id, Image.user_id == current_user.id)
+    )
+    row = (await db.execute(stmt)).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    path = row.file_path if kind == "original" else (row.thumbnail_path or row.file_path)
+    storage = get_storage()
+    # 对象存储：鉴权后重定向到预签名 URL，字节不经过 API 进程
+    url = storage.presigned_url(path)
+    if url:
+        return RedirectResponse(
+            url, status_code=307,
+            # 浏览器缓存的重定向不能比签名活得更久
+            headers={"Cache-Control": f"private, max-age={settings.S3_PRESIGN_EXPIRES // 2}"}
+        )
+    try:
+        # 原图的 ETag 直接用入库时的内容哈希，不必为此重读整个文件
+        content_hash = row.content_hash if path == row.file_path else None
+        return await build_media_response(request, storage.path(path), content_hash)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found")
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
-from typing import List, Optional
-from datetime import datetime
+from typing import List, Optional, Literal
+from datetime import datetime, date
 
 class TagBase(BaseModel):
     name: str
@@ -23,15 +23,80 @@ class ImageResponse(ImageBase):
     capture_time: Optional[datetime]
     location: Optional[str]
     resolution: Optional[str]
+    orientation: Optional[int] = 1
+    blurhash: Optional[str] = None
+    dominant_color: Optional[str] = None
+    aspect_ratio: Optional[float] = None
     ai_description: Optional[str]
     tags: List[TagResponse] = []
 
     class Config:
         from_attributes = True
 
+class ImageListItem(BaseModel):
+    """瀑布流列表项：只含列表页用到的字段，标签只给名称"""
+    id: int
+    filename: str # 查看器标题与下载文件名
+    file_path: str
+    thumbnail_path: Optional[str]
+    capture_time: Optional[datetime]
+    upload_time: datetime
+    location: Optional[str]
+    resolution: Optional[str]
+    orientation: Optional[int] = 1
+    blurhash: Optional[str] = None
+    dominant_color: Optional[str] = None
+    aspect_ratio: Optional[float] = None
+    tags: List[str] = []
+
+class SimilarImageItem(ImageListItem):
+    distance: float # 越小越相似，范围 [0, 1.414]
+
+class ImageChangeItem(ImageListItem):
+    ai_description: Optional[str] = None
+
+class ImageChangesResponse(BaseModel):
+    """增量同步结果：同一图片在本页内的多次变更已合并，只给最终状态"""
+    cursor: int # 下次请求的 since
+    has_more: bool
+    upserted: List[ImageChangeItem] = []
+    deleted: List[int] = []
+    # since 早于变更日志的保留下限：丢弃本地数据，重新全量拉取列表，之后从 cursor 继续增量同步
+    reset: bool = False
+
 class ImageUpdate(BaseModel):
     custom_tags: List[str] = [] # 仅接收标签名列表
     ai_description: Optional[str] = None
 
 class BatchDeleteRequest(BaseModel):
-    ids: List[int]
\ No newline at end of file
+    ids: List[int]
+
+class ImageFilter(BaseModel):
+    """按 ID 列表 / 标签 / 日期范围圈定图片 (导出与批量改标签共用)"""
+    ids: Optional[List[int]] = None
+    tag: Optional[str] = None
+    start_date: Optional[date] = None # 按拍摄时间 (无拍摄时间时用上传时间) 筛选
+    end_date: Optional[date] = None
+
+class ExportRequest(ImageFilter):
+    rendition: Literal["original", "thumbnail"] = "original"
+    after_id: Optional[int] = None # 断点续传：只导出 ID 大于它的图片
+
+class BulkTagRequest(ImageFilter):
+    """
+    批量改标签，作用于筛选出的图片:
+      add    - 给图片加上 tags
+      remove - 去掉 tags
+      rename - 把 tags 中唯一的一个标签改成 target
+      merge  - 把 tags 中的标签都并入 target
+    rename / merge 不带筛选条件时作用于全部图片
+    """
+    op: Literal["add", "remove", "rename", "merge"]
+    tags: List[str]
+    target: Optional[str] = None
+
+class BulkTagResponse(BaseModel):
+    op: str
+    images: int # 标签有变化的图片数
+    added: int # 新增的图片-标签关联数
+    removed: int # 删除的图片-标签关联数
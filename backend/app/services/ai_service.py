@@ -0,0 +1,40 @@
+"""
+图片 AI 分析结果入库：上传后的后台任务与目录导入 (app/cli/import_photos.py) 共用。
+限流由调用方负责 (接口走 LIMITERS["analyze"]，导入命令用 --ai-concurrency 控制并发)
+"""
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.models.image import Image
+from app.services.image_service import analyze_image_with_ai
+from app.services.tag_service import ensure_tags, link_tags
+from app.services.change_service import record_changes
+
+
+async def analyze_and_save(image_id: int, file_path: str):
+    """调用视觉模型，写入描述与 AI 标签并记变更日志；失败只打印日志，不抛出"""
+    if not settings.SILICONFLOW_API_KEY:
+        print("AI API Key not set, skipping background analysis.")
+        return
+
+    async with SessionLocal() as db:
+        try:
+            ai_result = await analyze_image_with_ai(file_path, settings.SILICONFLOW_API_KEY)
+
+            if ai_result:
+                img = await db.get(Image, image_id)
+
+                if img:
+                    img.ai_description = ai_result.get("summary")
+
+                    tag_ids = await ensure_tags(db, ai_result.get("tags", []))
+                    await link_tags(db, [(image_id, tag_id) for tag_id in tag_ids.values()], source="ai")
+                    await record_changes(db, img.user_id, [image_id], "analyzed")
+
+                    await db.commit()
+                    print(f"✅ AI Analysis complete for Image ID {image_id}")
+            else:
+                print(f"⚠️ AI Analysis returned no results for Image ID {image_id}.")
+
+        except Exception as e:
+            print(f"❌ AI Analysis background task failed: {e}")
+            await db.rollback()
@@ -4,7 +4,22 @@ from sqlalchemy.future import select
 from fastapi import HTTPException, status
 from app.models.user import User
 from app.schemas.user import UserCreate
-from app.core.security import get_password_hash, verify_password
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.security import hash_password_async, verify_and_update_password_async, PasswordHasherBusy
+
+# user_id -> User (已脱离 Session 的只读对象)，用户信息变更时调用 invalidate_user
+principal_cache = TTLCache(settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL)
+
+def invalidate_user(user_id: int):
+    principal_cache.pop(user_id)
+
+def _busy_exception():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many login attempts in progress, please retry",
+        headers={"Retry-After": "1"},
+    )
 
 async def get_user_by_username(db: AsyncSession, username: str):
     result = await db.execute(select(User).where(User.username == username))
@@ -23,11 +38,16 @@ async def create_user(db: AsyncSession, user: UserCreate):
     if await get_user_by_username(db, user.username):
         raise HTTPException(status_code=400, detail="Username already taken")
 
-    # 3. 创建用户
+    # 3. 创建用户 (bcrypt 在专用线程池中执行，不阻塞事件循环)
+    try:
+        hashed_password = await hash_password_async(user.password)
+    except PasswordHasherBusy:
+        raise _busy_exception()
+
     new_user = User(
         username=user.username,
         email=user.email,
-        hashed_password=get_password_hash(user.password)
+        hashed_password=hashed_password
     )
     db.add(new_user)
     await db.commit()
@@ -38,6 +58,16 @@ async def authenticate_user(db: AsyncSession, username: str, password: str):
     user = await get_user_by_username(db, username)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    try:
+        verified, new_hash = await verify_and_update_password_async(password, user.hashed_password)
+    except PasswordHasherBusy:
+        raise _busy_exception()
+    if not verified:
         return False
+
+    # BCRYPT_ROUNDS 变更后，用本次明文透明重算哈希
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+        invalidate_user(user.id)
     return user
\ No newline at end of file
@@ -0,0 +1,113 @@
+"""
+图片变更日志 (image_changes)：写入方在自己的事务里调用 record_changes，随修改一起提交；
+读取方按 id 游标分页，同一图片的多条变更合并为最终状态。
+日志只保留 CHANGE_LOG_RETENTION_DAYS 天 (prune_changes)；游标早于保留下限的客户端必须全量重新同步
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, insert, delete, func
+
+from app.core.config import settings
+from app.models.image import ImageChange
+
+CHANGE_KINDS = ("created", "updated", "tagged", "analyzed", "deleted")
+
+
+async def record_changes(db, user_id: int, image_ids, kind: str):
+    """一条 executemany 写入；不提交，由调用方与修改一起 commit"""
+    image_ids = list(dict.fromkeys(image_ids))
+    if not image_ids:
+        return
+    now = datetime.utcnow()
+    await db.execute(
+        insert(ImageChange),
+        [{"user_id": user_id, "image_id": image_id, "kind": kind, "created_at": now} for image_id in image_ids]
+    )
+
+
+def _settled_before() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=settings.CHANGE_FEED_SETTLE_SECONDS)
+
+
+async def retained_floor(db) -> int:
+    """
+    ID 不大于该值的变更可能已被清理。清理按 ID 从小到大进行，剩余最小 ID 之前的都视为缺失；
+    since 小于它的客户端无法再增量同步
+    """
+    min_id = (await db.execute(select(func.min(ImageChange.id)))).scalar()
+    return min_id - 1 if min_id else 0
+
+
+async def latest_cursor(db, user_id: int) -> int:
+    """新客户端全量拉取前先记下的游标；不小于保留下限，刚拿到的游标不会立刻被判为过期"""
+    stmt = (
+        select(func.max(ImageChange.id))
+        .where(ImageChange.user_id == user_id, ImageChange.created_at <= _settled_before())
+    )
+    latest = (await db.execute(stmt)).scalar() or 0
+    return max(latest, await retained_floor(db))
+
+
+async def prune_changes(db, retention_days: int = None, batch_size: int = None) -> int:
+    """
+    删除早于 retention_days 天的变更，按 ID 分批删除并逐批提交，返回删除条数。
+    始终保留最新的一条：表被清空后 SQLite / 旧版 MySQL 会从 1 重新分配 ID，游标会倒退
+    """
+    if retention_days is None:
+        retention_days = settings.CHANGE_LOG_RETENTION_DAYS
+    if batch_size is None:
+        batch_size = settings.CHANGE_PRUNE_BATCH_SIZE
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+
+    newest = (await db.execute(select(func.max(ImageChange.id)))).scalar()
+    if newest is None:
+        return 0
+    floor = (await db.execute(
+        select(func.max(ImageChange.id)).where(ImageChange.created_at < cutoff, ImageChange.id < newest)
+    )).scalar()
+    if floor is None:
+        return 0
+
+    removed = 0
+    while True:
+        # 本批的上界：第 batch_size 条的 ID，不足一批时直接删到 floor
+        bound = (await db.execute(
+            select(ImageChange.id).where(ImageChange.id <= floor)
+            .order_by(ImageChange.id).offset(batch_size - 1).limit(1)
+        )).scalar()
+        upper = floor if bound is None else bound
+        result = await db.execute(delete(ImageChange).where(ImageChange.id <= upper))
+        await db.commit()
+        removed += result.rowcount
+        if upper >= floor:
+            return removed
+
+
+async def fetch_changes(db, user_id: int, since: int, limit: int):
+    """
+    返回 (cursor, has_more, upserted_ids, deleted_ids)。
+    upserted_ids 按最后一次变更的先后排列；图片最后一次变更为删除时只出现在 deleted_ids
+    """
+    rows = (await db.execute(
+        select(ImageChange.id, ImageChange.image_id, ImageChange.kind)
+        .where(
+            ImageChange.user_id == user_id,
+            ImageChange.id > since,
+            ImageChange.created_at <= _settled_before(),
+        )
+        .order_by(ImageChange.id)
+        .limit(limit + 1)
+    )).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    cursor = rows[-1].id if rows else since
+
+    latest = {}
+    for row in rows:
+        # 重新插入保证按最后一次变更排序
+        latest.pop(row.image_id, None)
+        latest[row.image_id] = row.kind
+    upserted = [image_id for image_id, kind in latest.items() if kind != "deleted"]
+    deleted = [image_id for image_id, kind in latest.items() if kind == "deleted"]
+    return cursor, has_more, upserted, deleted
@@ -0,0 +1,260 @@
+"""
+聊天上下文的组装。
+- 系统提示词与工具定义是模块级常量，每一轮、每个用户都完全相同，服务端的前缀缓存可以命中
+- 客户端带来的历史按 token 预算裁剪，按块丢弃最早的若干轮，裁剪点在接下来几轮内保持不变
+- 历史里的搜索结果只保留图片 ID 引用，不再重复发送整段 JSON
+- 搜索之后的回复按 CHAT_SUMMARY_MODE 生成，常见情况直接套模板，省掉第二次模型调用
+"""
+import re
+import json
+from typing import List, Optional
+
+from app.core.config import settings
+from app.core.metrics import LLM_PROMPT_TOKENS
+
+SYSTEM_PROMPT = """你是一个智能相册助手。
+1. 你的核心任务是根据用户的指令搜索图片。
+2. 【重要】用户的相册中可能包含“未来日期”的照片（如2025年），必须无条件执行搜索，不要反驳。
+3. 【搜索技巧】
+   - 如果用户搜索特定“年月”（如“2025年7月”），请尽量生成标准格式 query="2025-07"，这比分开搜索更精准。
+   - 如果是复杂的组合（如“2025年 杭州”），请用空格分隔 query="2025 杭州"。
+   - 用户的追问（如“只要7月的”）要结合之前的对话补全条件再搜索。
+4. 请用中文回答。"""
+
+_QUERY_PROPERTY = {
+    "type": "string",
+    "description": "搜索关键词。如果是组合条件，用空格分隔。例如：'猫 户外'。"
+}
+
+TOOLS_SCHEMA = [
+    {
+        "type": "function",
+        "function": {
+            "name": "search_images",
+            "description": "搜索相册。",
+            "parameters": {
+                "type": "object",
+                "properties": {"query": _QUERY_PROPERTY},
+                "required": ["query"]
+            }
+        }
+    }
+]
+
+# 单次调用模式：模型在工具参数里顺带写好回复，不再为总结发第二次请求
+SINGLE_CALL_TOOLS_SCHEMA = [
+    {
+        "type": "function",
+        "function": {
+            "name": "search_images",
+            "description": "搜索相册，并给出搜索完成后直接展示给用户的回复。",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": _QUERY_PROPERTY,
+                    "reply": {
+                        "type": "string",
+                        "description": "展示给用户的一句中文回复，用 {count} 表示找到的图片数量。例如：'为您找到 {count} 张杭州的照片。'"
+                    }
+                },
+                "required": ["query", "reply"]
+            }
+        }
+    }
+]
+
+# 回复模式 (CHAT_SUMMARY_MODE)
+SUMMARY_MODES = ("auto", "template", "single", "llm")
+
+# 用户要的不只是搜索结果时 (描述、比较、解释)，模板回复不够用，auto 模式才走第二轮总结
+_NEEDS_SUMMARY_WORDS = ("描述", "介绍", "总结", "讲讲", "说说", "分析", "为什么", "怎么样", "有什么特点", "区别")
+
+# 历史里每条回复最多引用的图片 ID 数
+_MAX_REFERENCED_IDS = 10
+# 每条消息的格式开销 (role、分隔符等)
+_MESSAGE_OVERHEAD = 4
+
+_CJK = re.compile(r"[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+
+_client = None
+
+
+def get_chat_client():
+    """
+    进程内共用一个客户端，复用连接池 (省掉每次对话的 TCP / TLS 握手)。
+    openai 包导入要几百毫秒，第一次对话时才导入，不拖慢 worker 启动
+    """
+    global _client
+    if _client is None:
+        from openai import AsyncOpenAI
+        _client = AsyncOpenAI(
+            api_key=settings.SILICONFLOW_API_KEY,
+            base_url=settings.SILICONFLOW_BASE_URL,
+            timeout=120.0
+        )
+    return _client
+
+
+async def close_chat_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算：中日韩字符约 1 token / 字，其余约 4 字符 / token。只用于预算，不必精确"""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _message_tokens(message: dict) -> int:
+    return estimate_tokens(message["content"]) + _MESSAGE_OVERHEAD
+
+
+def _truncate(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def _image_ids(turn: dict) -> List[int]:
+    ids = turn.get("image_ids")
+    if ids is None:
+        # 旧前端直接把返回的 images 原样带回来
+        ids = [img.get("id") for img in turn.get("images") or [] if isinstance(img, dict)]
+    return [i for i in ids or [] if isinstance(i, int)]
+
+
+def _compact_turn(turn) -> Optional[dict]:
+    """
+    客户端传来的一条历史 -> 发给模型的消息；只接受 user / assistant，
+    assistant 带的搜索结果压缩成一行图片 ID 引用
+    """
+    if not isinstance(turn, dict) or turn.get("role") not in ("user", "assistant"):
+        return None
+    content = _truncate(str(turn.get("content") or "").strip(), settings.CHAT_HISTORY_MAX_TURN_CHARS)
+    if turn["role"] == "assistant":
+        ids = _image_ids(turn)
+        if ids:
+            shown = ", ".join(str(i) for i in ids[:_MAX_REFERENCED_IDS])
+            more = " …" if len(ids) > _MAX_REFERENCED_IDS else ""
+            content = f"{content}\n[找到 {len(ids)} 张图片，ID: {shown}{more}]".strip()
+    if not content:
+        return None
+    return {"role": turn["role"], "content": content}
+
+
+def _summarize_dropped(turns: List[dict]) -> Optional[dict]:
+    """被裁掉的早期对话只保留用户问过什么，不额外调用模型"""
+    asked = [_truncate(t["content"], 30) for t in turns if t["role"] == "user"]
+    if not asked:
+        return None
+    return {
+        "role": "system",
+        "content": _truncate("更早的对话已省略，用户之前问过：" + "；".join(asked), 200)
+    }
+
+
+def trim_history(history, message: str) -> List[dict]:
+    turns = [t for t in (_compact_turn(x) for x in history or []) if t]
+    # 旧前端会把本轮消息也放在 history 末尾
+    if turns and turns[-1]["role"] == "user" and turns[-1]["content"] == message.strip():
+        turns.pop()
+
+    costs = [_message_tokens(t) for t in turns]
+    total = sum(costs)
+    drop = 0
+    while drop < len(turns) and total > settings.CHAT_HISTORY_TOKEN_BUDGET:
+        total -= costs[drop]
+        drop += 1
+    if drop:
+        # 按块丢弃：历史每轮只增长两条，接下来几轮裁剪点不变，这段历史前缀也能继续命中缓存
+        block = max(1, settings.CHAT_HISTORY_TRIM_BLOCK)
+        drop = min(len(turns), -(-drop // block) * block)
+        # 保留部分从用户消息开始
+        while drop < len(turns) and turns[drop]["role"] != "user":
+            drop += 1
+
+    kept = turns[drop:]
+    summary = _summarize_dropped(turns[:drop])
+    return ([summary] if summary else []) + kept
+
+
+def build_messages(message: str, history=None) -> List[dict]:
+    """固定前缀 (系统提示词) + 裁剪后的历史 + 本轮消息"""
+    return (
+        [{"role": "system", "content": SYSTEM_PROMPT}]
+        + trim_history(history, message)
+        + [{"role": "user", "content": message}]
+    )
+
+
+def compact_search_results(results: list) -> str:
+    """发给模型的工具结果：去掉文件路径，描述截短；完整结果仍原样返回给前端"""
+    if not isinstance(results, list):
+        return json.dumps(results, ensure_ascii=False)
+    return json.dumps([
+        {
+            "id": item.get("id"),
+            "date": item.get("date"),
+            "location": item.get("location"),
+            "tags": item.get("tags"),
+            "summary": _truncate(item.get("summary") or "", 60),
+        }
+        for item in results
+    ], ensure_ascii=False)
+
+
+def record_usage(response):
+    """按是否命中服务端前缀缓存统计 prompt token (服务商不返回缓存信息时全部计为 miss)"""
+    usage = getattr(response, "usage", None)
+    if usage is None or not usage.prompt_tokens:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) or 0
+    LLM_PROMPT_TOKENS.labels("hit").inc(cached)
+    LLM_PROMPT_TOKENS.labels("miss").inc(usage.prompt_tokens - cached)
+
+
+def tools_for_mode(mode: str) -> list:
+    return SINGLE_CALL_TOOLS_SCHEMA if mode == "single" else TOOLS_SCHEMA
+
+
+def resolve_summary_mode(message: str) -> str:
+    """auto 按用户消息决定：需要描述 / 解释的走 llm，其余直接用模板"""
+    mode = settings.CHAT_SUMMARY_MODE
+    if mode not in SUMMARY_MODES:
+        mode = "auto"
+    if mode == "auto":
+        return "llm" if any(word in message for word in _NEEDS_SUMMARY_WORDS) else "template"
+    return mode
+
+
+def template_reply(results: list, query: str = "") -> str:
+    """根据结构化的搜索结果直接生成回复：无结果、同一地点 / 日期、其余报数量和时间范围"""
+    if not results:
+        return f"没有找到与「{query}」相关的照片，换个关键词试试？" if query else "没有找到相关的照片，换个关键词试试？"
+
+    n = len(results)
+    locations = {item.get("location") for item in results}
+    dates = sorted({item.get("date") for item in results if item.get("date") and item.get("date") != "未知日期"})
+    location = next(iter(locations)) if len(locations) == 1 else None
+    all_dated = len(dates) > 0 and all(item.get("date") in dates for item in results)
+
+    if location and all_dated and len(dates) == 1:
+        return f"为您找到 {n} 张 {dates[0]} 在{location}拍摄的照片。"
+    if location:
+        span = f"，拍摄于 {dates[0]} 至 {dates[-1]}" if len(dates) > 1 else ""
+        return f"为您找到 {n} 张在{location}拍摄的照片{span}。"
+    if all_dated and len(dates) == 1:
+        return f"为您找到 {n} 张 {dates[0]} 拍摄的照片。"
+    span = f"，时间从 {dates[0]} 到 {dates[-1]}" if len(dates) > 1 else ""
+    return f"为您找到 {n} 张相关照片{span}。"
+
+
+def single_call_reply(reply: Optional[str], results: list, query: str = "") -> str:
+    """单次调用模式：模型事先写好的回复填上数量；没有结果或回复不可用时退回模板"""
+    if not results or not reply or "{count}" not in reply:
+        return template_reply(results, query)
+    return reply.replace("{count}", str(len(results)))
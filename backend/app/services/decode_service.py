@@ -0,0 +1,153 @@
+"""
+HEIC / HEIF 与相机 RAW 原图的读取。
+- pillow-heif / rawpy 是可选依赖，第一次遇到对应格式时才导入，没装时报错说明要装什么
+- 生成缩略图、AI 输入、按需衍生图时优先用文件里内嵌的预览：
+  HEIC 取不小于目标尺寸的内嵌缩略图，RAW 取相机写入的 JPEG 预览；
+  预览不存在或太小时才完整解码 (RAW 用半尺寸去马赛克)
+"""
+import io
+import os
+
+from PIL import Image as PILImage, ImageOps
+
+from app.core.metrics import IMAGE_DECODES
+
+HEIF_EXTENSIONS = ("heic", "heif")
+RAW_EXTENSIONS = ("dng", "cr2", "cr3", "nef", "arw", "raf", "orf", "rw2")
+
+# LibRaw 的 flip -> EXIF Orientation
+_FLIP_TO_ORIENTATION = {0: 1, 3: 3, 5: 8, 6: 6}
+
+# 预览需要的旋转 (RAW 只会出现 3 / 6 / 8)
+_ORIENTATION_TRANSPOSE = {
+    3: PILImage.Transpose.ROTATE_180,
+    6: PILImage.Transpose.ROTATE_270,
+    8: PILImage.Transpose.ROTATE_90,
+}
+
+_heif_registered = False
+
+
+def image_kind(path: str):
+    """按扩展名区分：heif / raw / None (Pillow 原生支持的格式)"""
+    ext = os.path.splitext(path)[1].lstrip(".").lower()
+    if ext in HEIF_EXTENSIONS:
+        return "heif"
+    if ext in RAW_EXTENSIONS:
+        return "raw"
+    return None
+
+
+def register_heif_opener():
+    """注册后 PILImage.open 即可打开 HEIC；进程池里的子进程各自注册一次"""
+    global _heif_registered
+    if _heif_registered:
+        return
+    try:
+        import pillow_heif
+    except ImportError:
+        raise RuntimeError("HEIC / HEIF images require pillow-heif (pip install pillow-heif)")
+    pillow_heif.register_heif_opener()
+    _heif_registered = True
+
+
+def _import_rawpy():
+    try:
+        import rawpy
+    except ImportError:
+        raise RuntimeError("RAW images require rawpy (pip install rawpy)")
+    return rawpy
+
+
+def _extract_preview(rawpy, raw):
+    """相机写入的预览图；没有或格式不支持时返回 None"""
+    try:
+        thumb = raw.extract_thumb()
+    except (rawpy.LibRawNoThumbnailError, rawpy.LibRawUnsupportedThumbnailError):
+        return None
+    if thumb.format == rawpy.ThumbFormat.JPEG:
+        return PILImage.open(io.BytesIO(thumb.data))
+    return PILImage.fromarray(thumb.data)
+
+
+def _raw_exif(source, rawpy, raw) -> dict:
+    """
+    DNG / CR2 / NEF / ARW 等基于 TIFF 的格式直接读文件头的 IFD；
+    CR3 / RAF 等读不了的，退而读内嵌 JPEG 预览里的 EXIF 段。
+    返回数字 tag 的字典 (Exif / GPS 子 IFD 已合并)
+    """
+    try:
+        with PILImage.open(source) as img:
+            if img.format == "TIFF":
+                # 子 IFD 要从文件里读，必须在文件关闭前合并
+                return img.getexif()._get_merged_dict()
+    except Exception:
+        pass
+    finally:
+        if hasattr(source, "seek"):
+            source.seek(0)
+
+    preview = _extract_preview(rawpy, raw)
+    if preview is None or not preview.info.get("exif"):
+        return {}
+    exif = PILImage.Exif()
+    exif.load(preview.info["exif"])
+    return exif._get_merged_dict()
+
+
+def probe_raw(source) -> dict:
+    """
+    RAW 的文件头探测：只解析文件头和预览，不解码传感器数据。
+    宽高 (摆正前) 与方向以 LibRaw 为准，exif 为 _raw_exif 的结果
+    """
+    rawpy = _import_rawpy()
+    with rawpy.imread(source) as raw:
+        sizes = raw.sizes
+        if hasattr(source, "seek"):
+            source.seek(0)
+        exif = _raw_exif(source, rawpy, raw)
+    return {
+        "format": "RAW",
+        "width": sizes.width,
+        "height": sizes.height,
+        "orientation": _FLIP_TO_ORIENTATION.get(sizes.flip, 1),
+        "exif": exif,
+    }
+
+
+def _open_raw(path: str, size) -> PILImage.Image:
+    rawpy = _import_rawpy()
+    with rawpy.imread(path) as raw:
+        preview = _extract_preview(rawpy, raw)
+        # 预览够大 (不小于目标尺寸，或本身就是全尺寸) 就不做去马赛克
+        needed = min(max(size), max(raw.sizes.width, raw.sizes.height))
+        if preview is not None and max(preview.size) >= needed:
+            IMAGE_DECODES.labels("raw", "preview").inc()
+            with preview:
+                preview.draft("RGB", size)
+                img = preview.convert("RGB")
+            # 预览按传感器方向存储，方向以 RAW 本身的为准，忽略预览自带的 Orientation
+            method = _ORIENTATION_TRANSPOSE.get(_FLIP_TO_ORIENTATION.get(raw.sizes.flip, 1))
+            return img.transpose(method) if method is not None else img
+
+        # 没有可用的预览：半尺寸去马赛克 (跳过插值，比完整解码快数倍)，postprocess 已按 flip 摆正
+        IMAGE_DECODES.labels("raw", "full").inc()
+        return PILImage.fromarray(raw.postprocess(half_size=True, use_camera_wb=True))
+
+
+def open_upright(path: str, size) -> PILImage.Image:
+    """
+    打开原图并按方向摆正，返回已载入像素的图像，尺寸尽量小但不小于 size：
+    JPEG 按 DCT 降采样解码，HEIC 选用内嵌缩略图，RAW 用内嵌 JPEG 预览
+    """
+    kind = image_kind(path)
+    if kind == "raw":
+        return _open_raw(path, size)
+    if kind == "heif":
+        register_heif_opener()
+
+    with PILImage.open(path) as original_img:
+        thumbnail_used = original_img.draft("RGB", size) is not None
+        if kind == "heif":
+            IMAGE_DECODES.labels("heif", "preview" if thumbnail_used else "full").inc()
+        return ImageOps.exif_transpose(original_img)
@@ -0,0 +1,100 @@
+import os
+import re
+import zipfile
+from datetime import datetime
+
+from app.core.storage import get_storage
+from app.core.workers import run_in_io_pool
+
+# 每次读取的块大小；内存占用与相册大小无关，只和这个值有关
+READ_CHUNK_SIZE = 1024 * 1024
+
+# 已经是压缩格式的文件用 STORED，再 deflate 只会白白消耗 CPU
+_STORED_EXTS = {
+    ".jpg", ".jpeg", ".png", ".webp", ".heic", ".heif", ".gif", ".mp4", ".mov",
+    ".dng", ".cr2", ".cr3", ".nef", ".arw", ".raf", ".orf", ".rw2",
+}
+
+_UNSAFE_CHARS = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+
+class _ZipSink:
+    """
+    zipfile 的只写输出端：不可 seek，zipfile 会自动改用 data descriptor 写法。
+    写入的字节先暂存，由生成器及时取走
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def archive_name(image_id: int, filename: str, path: str) -> str:
+    """压缩包内文件名：ID 前缀保证唯一且有序，扩展名以实际文件为准"""
+    stem = os.path.splitext(os.path.basename(filename or ""))[0]
+    stem = _UNSAFE_CHARS.sub("_", stem).strip(" .") or "image"
+    ext = os.path.splitext(path)[1].lower() or ".jpg"
+    return f"{image_id}_{stem}{ext}"
+
+
+def _zip_date(value) -> tuple:
+    # ZIP 的 DOS 时间最早 1980 年
+    if not isinstance(value, datetime) or value.year < 1980:
+        value = datetime(1980, 1, 1)
+    return value.timetuple()[:6]
+
+
+async def stream_zip(entries):
+    """
+    异步生成 zip 字节流。
+    entries 为异步可迭代对象，产出 (arcname, 存储 key, datetime)；文件不存在时跳过。
+    读取走存储抽象 (本地文件或对象存储)，阻塞调用都放在 IO 线程池
+    """
+    storage = get_storage()
+    sink = _ZipSink()
+    zf = zipfile.ZipFile(sink, mode="w", allowZip64=True)
+
+    async for arcname, path, timestamp in entries:
+        try:
+            size = await run_in_io_pool(storage.size, path)
+        except OSError:
+            print(f"Export skipped missing file: {path}")
+            continue
+
+        info = zipfile.ZipInfo(arcname, date_time=_zip_date(timestamp))
+        info.file_size = size  # 超过 4GB 时 zipfile 据此自动启用 zip64
+        if os.path.splitext(path)[1].lower() in _STORED_EXTS:
+            info.compress_type = zipfile.ZIP_STORED
+        else:
+            info.compress_type = zipfile.ZIP_DEFLATED
+
+        chunks = storage.iter_chunks(path, READ_CHUNK_SIZE)
+        try:
+            with zf.open(info, mode="w") as dest:
+                while True:
+                    chunk = await run_in_io_pool(next, chunks, None)
+                    if chunk is None:
+                        break
+                    dest.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+        finally:
+            chunks.close()
+        data = sink.drain()
+        if data:
+            yield data
+
+    zf.close()  # 写中央目录
+    yield sink.drain()
@@ -0,0 +1,157 @@
+import os
+import time
+import asyncio
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.core.storage import get_storage
+from app.core.workers import run_in_io_pool
+from app.core.metrics import BACKGROUND_QUEUE_DEPTH
+from app.db.database import SessionLocal
+from app.models.image import Image
+from app.services.image_service import delete_image_files
+from app.services.change_service import prune_changes
+from app.services.render_service import rendition_cache
+
+# 持有后台删除任务的引用，防止被垃圾回收提前取消
+_pending_tasks = set()
+
+
+def _remove_image_files(paths):
+    for file_path, thumbnail_path in paths:
+        delete_image_files(file_path, thumbnail_path)
+
+
+def _remove_keys(keys):
+    get_storage().delete(keys)
+
+
+async def _collect(paths, image_ids):
+    try:
+        await run_in_io_pool(_remove_image_files, paths)
+        for image_id in image_ids:
+            await rendition_cache.invalidate(image_id)
+    except Exception as e:
+        print(f"Error collecting deleted files: {e}")
+
+
+def schedule_file_deletion(paths, image_ids=()):
+    """
+    数据库事务提交后调用：在 IO 线程池中删除原图/缩略图及衍生图缓存，不阻塞请求。
+    paths 为 (file_path, thumbnail_path) 列表；进程意外退出遗留的文件由 sweep_orphans 兜底
+    """
+    if not paths and not image_ids:
+        return
+    task = asyncio.get_running_loop().create_task(_collect(list(paths), list(image_ids)))
+    _pending_tasks.add(task)
+    BACKGROUND_QUEUE_DEPTH.labels("file_gc").inc()
+    task.add_done_callback(_on_collected)
+
+
+def _on_collected(task):
+    _pending_tasks.discard(task)
+    BACKGROUND_QUEUE_DEPTH.labels("file_gc").dec()
+
+
+def pending_deletions() -> int:
+    return len(_pending_tasks)
+
+
+def _find_orphans(known_paths, known_ids, grace_seconds):
+    """
+    在 IO 线程中执行：找出数据库中没有记录、且超过宽限期的文件 / 衍生图目录。
+    同时返回数据库记录中在存储里找到了的 key 数，供调用方判断对账是否可信
+    """
+    cutoff = time.time() - grace_seconds
+    orphan_files = []
+    matched = 0
+    # 分片目录 / 对象存储前缀下的全部文件，key 已是规范形式
+    for key, mtime in get_storage().iter_files():
+        if key in known_paths:
+            matched += 1
+        elif mtime < cutoff:
+            orphan_files.append(key)
+
+    orphan_dirs = []
+    if os.path.isdir(settings.RENDITION_CACHE_DIR):
+        with os.scandir(settings.RENDITION_CACHE_DIR) as it:
+            for entry in it:
+                if entry.is_dir() and entry.name.isdigit() and int(entry.name) not in known_ids:
+                    orphan_dirs.append(int(entry.name))
+    return orphan_files, orphan_dirs, matched
+
+
+async def sweep_orphans(grace_seconds: int = None, dry_run: bool = None) -> dict:
+    """对账存储中的原图 / 缩略图与数据库，删除无主文件 (dry_run 时只统计)"""
+    if grace_seconds is None:
+        grace_seconds = settings.ORPHAN_GRACE_SECONDS
+    if dry_run is None:
+        dry_run = settings.ORPHAN_SWEEP_DRY_RUN
+    storage = get_storage()
+
+    known_paths = set()
+    known_ids = set()
+    async with SessionLocal() as db:
+        result = await db.stream(select(Image.id, Image.file_path, Image.thumbnail_path))
+        async for row in result:
+            known_ids.add(row.id)
+            # 数据库里存的是存储 key，转成与 iter_files 一致的形式再比较
+            if row.file_path:
+                known_paths.add(storage.normalize(row.file_path))
+            if row.thumbnail_path:
+                known_paths.add(storage.normalize(row.thumbnail_path))
+
+    orphan_files, orphan_dirs, matched = await run_in_io_pool(_find_orphans, known_paths, known_ids, grace_seconds)
+    stats = {"files": len(orphan_files), "rendition_dirs": len(orphan_dirs),
+             "matched": matched, "known": len(known_paths), "dry_run": dry_run, "aborted": False}
+
+    # 记录几乎都对不上文件，多半是存储目录 / 工作目录配置错了，此时删除会清空整个图库
+    if known_paths and matched < len(known_paths) * settings.ORPHAN_MIN_MATCH_RATIO:
+        print(f"⚠️ Orphan sweep aborted: only {matched}/{len(known_paths)} stored keys found in storage "
+              f"({len(orphan_files)} files would have been removed). Check UPLOAD_DIR / THUMBNAIL_DIR / STORAGE_BACKEND")
+        stats["aborted"] = True
+        return stats
+
+    if dry_run:
+        for key in orphan_files:
+            print(f"[dry-run] orphan file: {key}")
+        print(f"[dry-run] Orphan sweep would remove {len(orphan_files)} files, {len(orphan_dirs)} rendition dirs")
+        return stats
+
+    if orphan_files:
+        await run_in_io_pool(_remove_keys, orphan_files)
+    for image_id in orphan_dirs:
+        await rendition_cache.invalidate(image_id)
+
+    if orphan_files or orphan_dirs:
+        print(f"🧹 Orphan sweep removed {len(orphan_files)} files, {len(orphan_dirs)} rendition dirs")
+    return stats
+
+
+async def orphan_sweep_loop():
+    """lifespan 中启动的周期任务"""
+    interval = settings.ORPHAN_SWEEP_INTERVAL
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await sweep_orphans()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Orphan sweep failed: {e}")
+
+
+async def change_prune_loop():
+    """lifespan 中启动的周期任务：清理超过保留期的变更日志"""
+    interval = settings.CHANGE_PRUNE_INTERVAL
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with SessionLocal() as db:
+                removed = await prune_changes(db)
+            if removed:
+                print(f"🧹 Pruned {removed} image changes older than {settings.CHANGE_LOG_RETENTION_DAYS} days")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Change log prune failed: {e}")
@@ -1,44 +1,100 @@
 import os
-import uuid
+import asyncio
+import hashlib
+import shutil
+import subprocess
+from contextlib import nullcontext
 from datetime import datetime
 from PIL import Image as PILImage, ImageOps
-from PIL.ExifTags import TAGS, GPSTAGS
-import reverse_geocoder as rg
 from app.core.config import settings
+from app.core.storage import get_storage, new_file_name
+from app.core.workers import run_in_io_pool, run_in_image_pool
+from app.services.placeholder_service import compute_placeholder
+from app.services.similarity_service import compute_features
+from app.services.decode_service import (
+    HEIF_EXTENSIONS, RAW_EXTENSIONS, image_kind, register_heif_opener, probe_raw, open_upright
+)
+from app.core.metrics import UPLOAD_STAGE_SECONDS, UPLOADS_TOTAL, EXTERNAL_API_ERRORS, track_external_call
 
 import base64
-import httpx
 import json
 import io
 
-# 确保目录存在
-os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
-os.makedirs(settings.THUMBNAIL_DIR, exist_ok=True)
+# httpx / reverse_geocoder (连带 scipy) 导入较慢，只在第一次用到时导入，
+# 不拖慢 worker 启动；上传目录由 lifespan 中的 storage.prepare() 创建
 
 
-
-def _get_exif_data(image: PILImage.Image):
-    """提取原始 EXIF 数据"""
+def _decode_exif_tags(info):
+    """把数字 tag 转成可读名称 (GPSInfo 子字典同样处理)"""
+    from PIL.ExifTags import TAGS, GPSTAGS
     exif_data = {}
-    if not hasattr(image, '_getexif'):
-        return exif_data
-        
+    for tag, value in info.items():
+        decoded = TAGS.get(tag, tag)
+        if decoded == "GPSInfo" and isinstance(value, dict):
+            gps_data = {}
+            for t in value:
+                sub_decoded = GPSTAGS.get(t, t)
+                gps_data[sub_decoded] = value[t]
+            exif_data[decoded] = gps_data
+        else:
+            exif_data[decoded] = value
+    return exif_data
+
+def _read_header_exif(image: PILImage.Image):
+    """
+    只从文件头里已解析出的 EXIF 段读取数据。
+    注意不能调用 PNG 的 _getexif/getexif：找不到 eXIf 块时它会 load() 整张图。
+    """
+    raw = image.info.get("exif")
+    if not raw:
+        return {}
     try:
-        info = image._getexif()
-        if info:
-            for tag, value in info.items():
-                decoded = TAGS.get(tag, tag)
-                if decoded == "GPSInfo":
-                    gps_data = {}
-                    for t in value:
-                        sub_decoded = GPSTAGS.get(t, t)
-                        gps_data[sub_decoded] = value[t]
-                    exif_data[decoded] = gps_data
-                else:
-                    exif_data[decoded] = value
+        exif = PILImage.Exif()
+        exif.load(raw)
+        return _decode_exif_tags(exif._get_merged_dict())
     except Exception as e:
         print(f"EXIF extract error: {e}")
-    return exif_data
+        return {}
+
+def probe_image_metadata(source, kind=None):
+    """
+    轻量元数据探测：只读文件头，不解码像素。
+    source 可以是文件路径、bytes 或文件对象；kind 为 image_kind() 的结果 (heif / raw)。
+    返回 format / width / height (已按 Orientation 换算为显示尺寸) / orientation / exif
+    无法识别为图片时抛出 PIL.UnidentifiedImageError
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    if kind == "raw":
+        # RAW 的尺寸与方向以 LibRaw 为准
+        raw = probe_raw(source)
+        exif = _decode_exif_tags(raw["exif"])
+        width, height, fmt = raw["width"], raw["height"], raw["format"]
+        exif["Orientation"] = raw["orientation"]
+    else:
+        if kind == "heif":
+            register_heif_opener()
+        # PILImage.open 是惰性的：只解析到像素数据之前的头部，size/info 已可用
+        with PILImage.open(source) as img:
+            exif = _read_header_exif(img)
+            width, height = img.size
+            fmt = img.format
+
+    orientation = exif.get("Orientation", 1)
+    if not isinstance(orientation, int) or not 1 <= orientation <= 8:
+        orientation = 1
+    # 5-8 表示需要旋转 90/270 度，显示尺寸宽高互换
+    if orientation in (5, 6, 7, 8):
+        width, height = height, width
+
+    return {
+        "format": fmt,
+        "width": width,
+        "height": height,
+        "orientation": orientation,
+        "exif": exif,
+    }
 
 def _convert_to_degrees(value):
     """将 EXIF 中的 (度, 分, 秒) 转为浮点数"""
@@ -82,9 +138,9 @@ def _parse_gps(exif_data):
         print(f"Error parsing GPS: {e}")
     return None
 
-async def _geocoding_amap(lat, lon):
+async def _geocoding_amap(lat, lon, client=None):
     """
-    使用高德地图 API 进行逆地理编码
+    使用高德地图 API 进行逆地理编码 (批量调用时传入 client 复用连接)
     """
     # 【修改】从 settings 中读取 Key
     amap_key = settings.AMAP_KEY
@@ -93,7 +149,7 @@ async def _geocoding_amap(lat, lon):
         print("⚠️ 未配置高德 Key (settings.AMAP_KEY)，跳过在线解析")
         return None, []
 
-    url = "https://restapi.amap.com/v3/geocode/regeo"
+    url = f"{settings.AMAP_BASE_URL}/v3/geocode/regeo"
     params = {
         "key": amap_key,  # 使用变量
         "location": f"{lon},{lat}",
@@ -103,10 +159,13 @@ async def _geocoding_amap(lat, lon):
         "poitype": "风景名胜|商务住宅|政府机构及社会团体|地名地址信息"
     }
 
-    async with httpx.AsyncClient(timeout=5.0) as client:
+    import httpx
+    # 批量调用时复用外部传入的连接，不在这里关闭
+    async with (httpx.AsyncClient(timeout=5.0) if client is None else nullcontext(client)) as client:
         try:
-            resp = await client.get(url, params=params)
-            data = resp.json()
+            with track_external_call("amap"):
+                resp = await client.get(url, params=params)
+                data = resp.json()
             
             if data.get("status") == "1" and data.get("regeocode"):
                 # ... (原本的处理逻辑保持不变，不需要改动) ...
@@ -157,6 +216,7 @@ async def _geocoding_amap(lat, lon):
 
                 return full_address, list(tags)
             else:
+                EXTERNAL_API_ERRORS.labels("amap").inc()
                 print(f"AMap API error info: {data.get('info')}")
                 
         except Exception as e:
@@ -178,28 +238,62 @@ async def _get_address_and_tags(coords):
 
     # 2. 兜底方案：离线库 (只精确到城市/区)
     try:
-        results = rg.search([coords]) 
+        results = await run_in_io_pool(_offline_search, [coords])
         if results:
-            res = results[0]
-            parts = []
-            tags = set()
-            
-            if res.get('admin1'): 
-                parts.append(res['admin1'])
-                tags.add(res['admin1'])
-            if res.get('admin2'): 
-                parts.append(res['admin2'])
-                tags.add(res['admin2'])
-            if res.get('name'): 
-                parts.append(res['name'])
-                tags.add(res['name'])
-            
-            return " ".join(parts), list(tags)
+            return _format_offline_result(results[0])
     except Exception as e:
         print(f"Offline geocoding error: {e}")
 
     return f"{coords[0]:.4f}, {coords[1]:.4f}", []
 
+def _offline_search(coords_list):
+    """
+    离线逆地理编码 (阻塞，在 IO 线程池中调用)。
+    第一次调用时才导入 reverse_geocoder 并加载内置数据集；mode=1 在当前进程内查询，不另起进程池
+    """
+    import reverse_geocoder as rg
+    return rg.search(coords_list, mode=1)
+
+def _format_offline_result(res):
+    parts = []
+    tags = set()
+    for key in ("admin1", "admin2", "name"):
+        if res.get(key):
+            parts.append(res[key])
+            tags.add(res[key])
+    return " ".join(parts), list(tags)
+
+async def geocode_batch(coords_list, concurrency: int = 4):
+    """
+    批量逆地理编码 (目录导入用)：高德限并发请求并复用连接，
+    高德失败的坐标合并成一次离线查询。返回与输入一一对应的 (address, tags)
+    """
+    results = [(None, [])] * len(coords_list)
+    pending = [i for i, coords in enumerate(coords_list) if coords]
+
+    if settings.AMAP_KEY and pending:
+        import httpx
+        semaphore = asyncio.Semaphore(concurrency)
+        async with httpx.AsyncClient(timeout=5.0) as client:
+            async def _one(i):
+                async with semaphore:
+                    results[i] = await _geocoding_amap(*coords_list[i], client=client)
+            await asyncio.gather(*(_one(i) for i in pending))
+        pending = [i for i in pending if not results[i][0]]
+
+    if pending:
+        try:
+            offline = await run_in_io_pool(_offline_search, [coords_list[i] for i in pending])
+            for i, res in zip(pending, offline):
+                results[i] = _format_offline_result(res)
+        except Exception as e:
+            print(f"Offline geocoding error: {e}")
+        for i in pending:
+            if not results[i][0]:
+                lat, lon = coords_list[i]
+                results[i] = (f"{lat:.4f}, {lon:.4f}", [])
+    return results
+
 def _parse_datetime(exif_data):
     """解析拍摄时间"""
     date_str = exif_data.get("DateTimeOriginal")
@@ -236,87 +330,287 @@ def _generate_auto_tags(exif_data, capture_time, location_tags):
 
     return tags
 
+# jpegtran 变换参数，与 EXIF Orientation 2-8 一一对应 (rotate 为顺时针角度)
+_JPEGTRAN_OPS = {
+    2: ["-flip", "horizontal"],
+    3: ["-rotate", "180"],
+    4: ["-flip", "vertical"],
+    5: ["-transpose"],
+    6: ["-rotate", "90"],
+    7: ["-transverse"],
+    8: ["-rotate", "270"],
+}
+
+def _reset_jpeg_orientation(data: bytes) -> bytes:
+    """
+    在 JPEG 的 APP1/EXIF 段中把 Orientation 原地改成 1，其余字节不动
+    (jpegtran -copy all 会原样保留旧的 Orientation，不改就会被二次旋转)
+    """
+    buf = bytearray(data)
+    pos = 2  # 跳过 SOI
+    while pos + 4 <= len(buf) and buf[pos] == 0xFF:
+        marker = buf[pos + 1]
+        seg_len = int.from_bytes(buf[pos + 2:pos + 4], "big")
+        if marker == 0xDA:  # SOS 之后是图像数据
+            break
+        if marker == 0xE1 and buf[pos + 4:pos + 10] == b"Exif\x00\x00":
+            tiff = pos + 10
+            order = "little" if buf[tiff:tiff + 2] == b"II" else "big"
+            ifd0 = tiff + int.from_bytes(buf[tiff + 4:tiff + 8], order)
+            count = int.from_bytes(buf[ifd0:ifd0 + 2], order)
+            for i in range(count):
+                entry = ifd0 + 2 + i * 12
+                if int.from_bytes(buf[entry:entry + 2], order) == 0x0112:
+                    buf[entry + 8:entry + 10] = (1).to_bytes(2, order)
+                    return bytes(buf)
+            break
+        pos += 2 + seg_len
+    return bytes(buf)
+
+def _lossless_rotate_jpeg(file_path: str, orientation: int) -> bool:
+    """
+    用 jpegtran 做无损 (DCT 域) 旋转，保留全部元数据。
+    没有 jpegtran、或尺寸不是 MCU 整数倍 (-perfect 失败) 时返回 False，调用方保留原图
+    """
+    jpegtran = shutil.which("jpegtran")
+    if not jpegtran or orientation not in _JPEGTRAN_OPS:
+        return False
+
+    tmp_path = f"{file_path}.rot"
+    try:
+        cmd = [jpegtran, "-copy", "all", "-perfect", *_JPEGTRAN_OPS[orientation], "-outfile", tmp_path, file_path]
+        if subprocess.run(cmd, capture_output=True, timeout=30).returncode != 0:
+            return False
+        with open(tmp_path, "rb") as f:
+            rotated = _reset_jpeg_orientation(f.read())
+        with open(tmp_path, "wb") as f:
+            f.write(rotated)
+        os.replace(tmp_path, file_path)
+        return True
+    except Exception as e:
+        print(f"Lossless rotate failed: {e}")
+        return False
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+# reencode 模式只重写 Pillow 能原样写回的格式；HEIC / RAW 总是保留原始字节
+_REENCODE_FORMATS = ("JPEG", "PNG", "WEBP")
+
+def _reencode_original(img: PILImage.Image, file_path: str, fmt: str):
+    """旧行为：把已摆正的图整张重新编码覆盖原图 (仅 ORIGINAL_MODE=reencode)"""
+    save_kwargs = {"exif": img.getexif()}
+    if fmt in ("JPEG", "WEBP"):
+        save_kwargs["quality"] = 95
+    img.save(file_path, format=fmt, **save_kwargs)
+
+def _write_renditions(file_path: str, thumb_path: str, probe: dict, metadata: dict):
+    # 原图默认保持上传的字节不变，只记录 Orientation；
+    # lossless 模式下 JPEG 尽量做无损旋转
+    if (settings.ORIGINAL_MODE == "lossless" and probe["format"] == "JPEG"
+            and probe["orientation"] != 1):
+        if _lossless_rotate_jpeg(file_path, probe["orientation"]):
+            metadata["orientation"] = 1
+
+    # 只有生成缩略图等衍生图时才真正解码像素，旋转只作用于衍生图
+    if settings.ORIGINAL_MODE == "reencode" and probe["format"] in _REENCODE_FORMATS:
+        with PILImage.open(file_path) as original_img:
+            img = ImageOps.exif_transpose(original_img)
+            _reencode_original(img, file_path, probe["format"])
+        metadata["orientation"] = 1
+    else:
+        # JPEG 直接按缩略图尺寸做 DCT 降采样解码，HEIC / RAW 用内嵌预览，不做完整解码
+        img = open_upright(file_path, (400, 400))
+
+    img.thumbnail((400, 400))
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    img.save(thumb_path, "JPEG", quality=80)
+
+    # 占位图与相似检索特征直接基于已缩小的缩略图计算
+    metadata.update(compute_placeholder(img))
+    metadata["features"] = compute_features(img)
+
+def _aspect_ratio(probe: dict):
+    return round(probe["width"] / probe["height"], 4) if probe["height"] else None
+
+# 支持的原图扩展名 (上传与目录导入共用)；HEIC / RAW 需要安装对应的可选依赖
+IMAGE_EXTENSIONS = ("jpg", "jpeg", "png", "webp") + HEIF_EXTENSIONS + RAW_EXTENSIONS
+
+def _storage_ext(filename: str) -> str:
+    """保留原扩展名 (后续按扩展名选解码方式)，未知格式沿用旧行为存为 jpg"""
+    ext = filename.split(".")[-1].lower()
+    if ext not in IMAGE_EXTENSIONS:
+        ext = "jpg"
+    return ext
+
+def _thumbnail_name(unique_name: str) -> str:
+    """缩略图总是 JPEG；HEIC / RAW 的缩略图改用 .jpg 扩展名，浏览器与对象存储的 Content-Type 才对得上"""
+    if image_kind(unique_name):
+        return os.path.splitext(unique_name)[0] + ".jpg"
+    return unique_name
+
+def _sha256(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+def _write_file(path: str, content: bytes):
+    with open(path, "wb") as f:
+        f.write(content)
+
+def _commit_files(storage, pairs):
+    """把 staging 文件写入最终存储 (local 为空操作)；生成失败而不存在的文件跳过"""
+    for staging_path, key in pairs:
+        if os.path.exists(staging_path):
+            storage.commit(staging_path, key)
+
 async def process_upload(file, user_id: int):
     """处理上传的主逻辑"""
-    ext = file.filename.split(".")[-1].lower()
-    if ext not in ["jpg", "jpeg", "png", "webp"]:
-        ext = "jpg"
-        
-    unique_name = f"{uuid.uuid4()}.{ext}"
-    file_path = os.path.join(settings.UPLOAD_DIR, unique_name)
-    thumb_path = os.path.join(settings.THUMBNAIL_DIR, unique_name)
+    storage = get_storage()
+    unique_name = new_file_name(_storage_ext(file.filename))
+    file_key = storage.key_for("uploads", unique_name)
+    thumb_key = storage.key_for("thumbnails", _thumbnail_name(unique_name))
+    # 先写到本地可写路径，处理完再提交到存储
+    file_path = storage.staging_path(file_key)
+    thumb_path = storage.staging_path(thumb_key)
     
     content = await file.read()
     
     metadata = {
         "filename": file.filename,
-        "file_path": file_path,
-        "thumbnail_path": thumb_path,
+        "file_path": file_key,
+        "thumbnail_path": thumb_key,
         "resolution": "0x0",
         "capture_time": None,
         "location": None,
+        "orientation": 1,
+        "content_hash": None,
+        "blurhash": None,
+        "dominant_color": None,
+        "aspect_ratio": None,
+        "features": None,
         "auto_tags": []
     }
 
+    # 哈希、写盘、解码都放到线程池，不占事件循环 (hashlib / 文件 IO / Pillow 都会释放 GIL)
+    metadata["content_hash"] = await run_in_image_pool(_sha256, content)
+
     try:
-        with open(file_path, "wb") as f:
-            f.write(content)
+        with UPLOAD_STAGE_SECONDS.labels("write").time():
+            await run_in_io_pool(_write_file, file_path, content)
 
-        with PILImage.open(file_path) as original_img:
-            exif = _get_exif_data(original_img)
+        # 1. 只读文件头拿 EXIF / 尺寸，不解码像素
+        with UPLOAD_STAGE_SECONDS.labels("decode").time():
+            probe = await run_in_image_pool(probe_image_metadata, content, image_kind(unique_name))
+            exif = probe["exif"]
+            metadata["orientation"] = probe["orientation"]
+            metadata["resolution"] = f"{probe['width']}x{probe['height']}"
+            metadata["aspect_ratio"] = _aspect_ratio(probe)
             metadata["capture_time"] = _parse_datetime(exif)
             coords = _parse_gps(exif)
-            
-            # 这里调用改为异步 await
+        
+        # 这里调用改为异步 await
+        with UPLOAD_STAGE_SECONDS.labels("geocode").time():
             address_str, loc_tags = await _get_address_and_tags(coords)
-            metadata["location"] = address_str
-            metadata["auto_tags"] = _generate_auto_tags(exif, metadata["capture_time"], loc_tags)
-            
-            img = ImageOps.exif_transpose(original_img)
-            metadata["resolution"] = f"{img.width}x{img.height}"
+        metadata["location"] = address_str
+        metadata["auto_tags"] = _generate_auto_tags(exif, metadata["capture_time"], loc_tags)
 
-            img.save(file_path, quality=95)
-            
-            img.thumbnail((400, 400))
-            if img.mode in ("RGBA", "P"):
-                img = img.convert("RGB")
-            img.save(thumb_path, "JPEG", quality=80)
+        with UPLOAD_STAGE_SECONDS.labels("renditions").time():
+            await run_in_image_pool(_write_renditions, file_path, thumb_path, probe, metadata)
+        UPLOADS_TOTAL.labels("ok").inc()
             
     except Exception as e:
+        UPLOADS_TOTAL.labels("error").inc()
         print(f"Error processing image: {e}")
         # 出错也尽量保留基本信息
-        metadata["thumbnail_path"] = file_path 
+        metadata["thumbnail_path"] = file_key
 
+    with UPLOAD_STAGE_SECONDS.labels("store").time():
+        await run_in_io_pool(_commit_files, storage, [(file_path, file_key), (thumb_path, thumb_key)])
     return metadata
 
-def delete_image_files(file_path: str, thumbnail_path: str):
+def scan_image_file(path: str) -> dict:
+    """
+    目录导入第一步 (在进程池中执行)：计算内容哈希并只读文件头，不解码像素。
+    地点相关标签要等批量逆地理编码后再追加
+    """
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+
+    probe = probe_image_metadata(path, image_kind(path))
+    exif = probe["exif"]
+    capture_time = _parse_datetime(exif)
+    return {
+        "path": path,
+        "content_hash": sha.hexdigest(),
+        "format": probe["format"],
+        "orientation": probe["orientation"],
+        "resolution": f"{probe['width']}x{probe['height']}",
+        "aspect_ratio": _aspect_ratio(probe),
+        "capture_time": capture_time,
+        "coords": _parse_gps(exif),
+        "auto_tags": _generate_auto_tags(exif, capture_time, []),
+    }
+
+def store_image_file(scan: dict) -> dict:
+    """
+    目录导入第二步 (在进程池中执行)：复制原图到存储并生成缩略图，与上传时的处理一致
+    """
+    storage = get_storage()
+    unique_name = new_file_name(_storage_ext(scan["path"]))
+    file_key = storage.key_for("uploads", unique_name)
+    thumb_key = storage.key_for("thumbnails", _thumbnail_name(unique_name))
+    file_path = storage.staging_path(file_key)
+    thumb_path = storage.staging_path(thumb_key)
+    shutil.copyfile(scan["path"], file_path)
+
+    stored = {
+        "file_path": file_key,
+        "thumbnail_path": thumb_key,
+        "orientation": scan["orientation"],
+        "blurhash": None,
+        "dominant_color": None,
+        "features": None,
+    }
     try:
-        if file_path and os.path.exists(file_path):
-            os.remove(file_path)
-        if thumbnail_path and os.path.exists(thumbnail_path) and thumbnail_path != file_path:
-            os.remove(thumbnail_path)
+        _write_renditions(file_path, thumb_path, scan, stored)
     except Exception as e:
-        print(f"Error deleting files: {e}")
+        print(f"Error processing image {scan['path']}: {e}")
+        stored["thumbnail_path"] = file_key
+    _commit_files(storage, [(file_path, file_key), (thumb_path, thumb_key)])
+    return stored
+
+def delete_image_files(file_path: str, thumbnail_path: str):
+    keys = [file_path]
+    if thumbnail_path and thumbnail_path != file_path:
+        keys.append(thumbnail_path)
+    get_storage().delete(keys)
+
+def _encode_for_vision(file_key: str) -> str:
+    with get_storage().local_copy(file_key) as local_path:
+        # 原图可能只记录了 Orientation 而未旋转，送给模型前先摆正；HEIC / RAW 优先用内嵌预览
+        img = open_upright(local_path, (1024, 1024))
+    if img.mode not in ("RGB", "L"): img = img.convert("RGB")
+    img.thumbnail((1024, 1024))
+    buffered = io.BytesIO()
+    img.save(buffered, format="JPEG", quality=85)
+    encoded_string = base64.b64encode(buffered.getvalue()).decode('utf-8')
+    return f"data:image/jpeg;base64,{encoded_string}"
 
 async def analyze_image_with_ai(file_path: str, api_key: str):
     """
     AI 分析 (复用之前的逻辑)
     """
-    if not api_key or not os.path.exists(file_path):
+    if not api_key or not file_path:
         return None
 
     # ... (AI 分析部分代码保持不变，为了篇幅省略，直接复用您现有的即可) ...
     # 为了保证代码完整运行，这里简写一下，您之前的 analyze_image_with_ai 代码是完美的，可以保留
     
-    base64_image = ""
     try:
-        with PILImage.open(file_path) as img:
-            if img.mode in ("RGBA", "P"): img = img.convert("RGB")
-            img.thumbnail((1024, 1024))
-            buffered = io.BytesIO()
-            img.save(buffered, format="JPEG", quality=85)
-            encoded_string = base64.b64encode(buffered.getvalue()).decode('utf-8')
-            base64_image = f"data:image/jpeg;base64,{encoded_string}"
+        # 对象存储需要先下载，解码与下载都放到图片线程池
+        base64_image = await run_in_image_pool(_encode_for_vision, file_path)
     except:
         return None
 
@@ -337,12 +631,16 @@ async def analyze_image_with_ai(file_path: str, api_key: str):
         "max_tokens": 512
     }
     
+    import httpx
     async with httpx.AsyncClient(timeout=60.0) as client:
         try:
-            resp = await client.post("https://api.siliconflow.cn/v1/chat/completions", 
-                                   headers={"Authorization": f"Bearer {api_key}"}, 
-                                   json=payload)
-            if resp.status_code == 200:
+            with track_external_call("siliconflow_vision"):
+                resp = await client.post(f"{settings.SILICONFLOW_BASE_URL}/chat/completions", 
+                                       headers={"Authorization": f"Bearer {api_key}"}, 
+                                       json=payload)
+            if resp.status_code != 200:
+                EXTERNAL_API_ERRORS.labels("siliconflow_vision").inc()
+            else:
                 content = resp.json()['choices'][0]['message']['content']
                 if content.startswith("```json"): content = content[7:-3]
                 data = json.loads(content)
@@ -0,0 +1,172 @@
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from mimetypes import guess_type
+
+import anyio
+from starlette.responses import Response
+
+# 每次 send 的块大小 (无 zero-copy 扩展时使用)
+CHUNK_SIZE = 256 * 1024
+
+# 一年，配合 immutable 让浏览器/CDN 不再回源
+IMMUTABLE_MAX_AGE = 31536000
+
+# uuid4 或十六进制哈希命名的文件只写一次、永不覆盖，可视为内容寻址
+_CONTENT_ADDRESSED_RE = re.compile(r"^(?:[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}|[0-9a-f]{32,64})(?:\.\w+)?$")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def is_content_addressed(path: str) -> bool:
+    return bool(_CONTENT_ADDRESSED_RE.match(os.path.basename(path)))
+
+
+def file_etag(st: os.stat_result, content_hash: str = None) -> str:
+    """
+    强 ETag，不读文件内容：原图用入库时算好的内容哈希 (原图写入存储后不再修改)；
+    缩略图 / 衍生图用 mtime + 大小
+    """
+    if content_hash:
+        return f'"{content_hash[:32]}-{st.st_size:x}"'
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def parse_range(header: str, size: int):
+    """
+    解析单段 Range 头，返回闭区间 (start, end)。
+    不支持/无法解析的写法返回 None (按 200 整体返回)；越界抛 RangeNotSatisfiable
+    """
+    if not header or not header.startswith("bytes="):
+        return None
+    spec = header[6:].strip()
+    if "," in spec:
+        # 多段 range 需要 multipart/byteranges，直接退回整文件
+        return None
+    start_s, _, end_s = spec.partition("-")
+    try:
+        if start_s == "":
+            # bytes=-500 表示最后 500 字节
+            length = int(end_s)
+            if length <= 0:
+                raise RangeNotSatisfiable()
+            return max(size - length, 0), size - 1
+        start = int(start_s)
+        end = int(end_s) if end_s else size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+def _not_modified(request, etag: str, st: os.stat_result) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [t.strip() for t in if_none_match.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(st.st_mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+class MediaFileResponse(Response):
+    """
+    支持 Range 的文件响应。
+    服务器声明了 ASGI http.response.zerocopysend 扩展时走 sendfile 零拷贝，否则分块读取
+    """
+
+    def __init__(self, path: str, offset: int, length: int, status_code: int, headers: dict, media_type: str):
+        self.path = path
+        self.offset = offset
+        self.length = length
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        self.init_headers(headers)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+
+        if scope["method"].upper() == "HEAD" or self.length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        if "http.response.zerocopysend" in scope.get("extensions", {}):
+            with open(self.path, "rb") as f:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f.fileno(),
+                    "offset": self.offset,
+                    "count": self.length,
+                    "more_body": False,
+                })
+            return
+
+        async with await anyio.open_file(self.path, mode="rb") as f:
+            await f.seek(self.offset)
+            remaining = self.length
+            while remaining > 0:
+                chunk = await f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # 文件在发送过程中被截断，结束响应避免客户端挂起
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+async def build_media_response(request, path: str, content_hash: str = None) -> Response:
+    """
+    按请求头生成 200 / 206 / 304 / 416 响应。
+    content_hash 为 images.content_hash，仅当 path 是原图时传入。
+    path 不存在时抛 FileNotFoundError，由路由转成 404
+    """
+    st = await anyio.to_thread.run_sync(os.stat, path)
+    size = st.st_size
+    etag = file_etag(st, content_hash)
+
+    if is_content_addressed(path):
+        cache_control = f"private, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    else:
+        cache_control = "private, no-cache"
+
+    headers = {
+        "etag": etag,
+        "last-modified": formatdate(st.st_mtime, usegmt=True),
+        "cache-control": cache_control,
+        "accept-ranges": "bytes",
+    }
+    media_type = guess_type(path)[0] or "application/octet-stream"
+
+    if _not_modified(request, etag, st):
+        return Response(status_code=304, headers=headers)
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # If-Range 与当前 ETag 不一致说明文件已变，忽略 Range 整体返回
+    if range_header and (if_range is None or if_range == etag):
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            headers["content-range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+
+    if byte_range is None:
+        headers["content-length"] = str(size)
+        return MediaFileResponse(path, 0, size, 200, headers, media_type)
+
+    start, end = byte_range
+    length = end - start + 1
+    headers["content-range"] = f"bytes {start}-{end}/{size}"
+    headers["content-length"] = str(length)
+    return MediaFileResponse(path, start, length, 206, headers, media_type)
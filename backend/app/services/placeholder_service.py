@@ -0,0 +1,111 @@
+"""
+列表占位图：BlurHash + 主色调，前端在缩略图下载前先画出模糊预览。
+输入是已经缩小过的缩略图，再降到 32px 后用 NumPy 向量化计算，单张耗时在毫秒级
+"""
+import numpy as np
+from PIL import Image as PILImage
+
+from app.core.storage import get_storage
+from app.services.decode_service import open_upright
+
+# 4x3 个分量，编码后固定 28 个字符
+BLURHASH_COMPONENTS = (4, 3)
+# 计算用的边长，BlurHash 只保留低频分量，更大的输入没有意义
+_SAMPLE_SIZE = 32
+
+_BASE83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+def _encode83(value: int, length: int) -> str:
+    chars = []
+    for i in range(1, length + 1):
+        digit = (value // 83 ** (length - i)) % 83
+        chars.append(_BASE83[digit])
+    return "".join(chars)
+
+
+def _srgb_to_linear(values: np.ndarray) -> np.ndarray:
+    v = values / 255.0
+    return np.where(v <= 0.04045, v / 12.92, ((v + 0.055) / 1.055) ** 2.4)
+
+
+def _linear_to_srgb(value: float) -> int:
+    v = min(max(value, 0.0), 1.0)
+    if v <= 0.0031308:
+        return int(v * 12.92 * 255 + 0.5)
+    return int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def _sample(img: PILImage.Image) -> np.ndarray:
+    img = img.convert("RGB")
+    img.thumbnail((_SAMPLE_SIZE, _SAMPLE_SIZE), PILImage.BILINEAR)
+    return np.asarray(img, dtype=np.float64)
+
+
+def blurhash_encode(pixels: np.ndarray, components=BLURHASH_COMPONENTS) -> str:
+    """pixels 为 (高, 宽, 3) 的 sRGB 数组，算法与 blurhash 官方实现一致"""
+    nx, ny = components
+    height, width = pixels.shape[:2]
+    linear = _srgb_to_linear(pixels)
+
+    # 余弦基函数：cos_x[i, x] = cos(pi * i * x / w)，一次矩阵乘法算出全部分量
+    cos_x = np.cos(np.pi * np.outer(np.arange(nx), np.arange(width)) / width)
+    cos_y = np.cos(np.pi * np.outer(np.arange(ny), np.arange(height)) / height)
+    factors = np.einsum("jy,ix,yxc->jic", cos_y, cos_x, linear) / (width * height)
+    factors[1:, :] *= 2
+    factors[0, 1:] *= 2
+    factors = factors.reshape(-1, 3)
+
+    dc, ac = factors[0], factors[1:]
+    result = _encode83((nx - 1) + (ny - 1) * 9, 1)
+
+    if len(ac):
+        quantised_max = int(max(0, min(82, np.floor(np.abs(ac).max() * 166 - 0.5))))
+        maximum = (quantised_max + 1) / 166
+    else:
+        quantised_max, maximum = 0, 1.0
+    result += _encode83(quantised_max, 1)
+
+    r, g, b = (_linear_to_srgb(c) for c in dc)
+    result += _encode83((r << 16) + (g << 8) + b, 4)
+
+    scaled = ac / maximum
+    quant = np.clip(np.floor(np.sign(scaled) * np.abs(scaled) ** 0.5 * 9 + 9.5), 0, 18).astype(int)
+    for qr, qg, qb in quant:
+        result += _encode83(qr * 19 * 19 + qg * 19 + qb, 2)
+    return result
+
+
+def dominant_color(pixels: np.ndarray) -> str:
+    """每通道量化到 5 bit 后取出现最多的颜色桶，返回桶内像素均值 (#rrggbb)"""
+    flat = pixels.reshape(-1, 3)
+    q = flat.astype(np.uint16) >> 3
+    buckets = (q[:, 0] << 10) | (q[:, 1] << 5) | q[:, 2]
+    top = np.bincount(buckets).argmax()
+    r, g, b = flat[buckets == top].mean(axis=0).round().astype(int)
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+def compute_placeholder(img: PILImage.Image) -> dict:
+    """img 为已摆正、已缩小的图 (通常就是刚生成的缩略图)"""
+    pixels = _sample(img)
+    return {
+        "blurhash": blurhash_encode(pixels),
+        "dominant_color": dominant_color(pixels),
+    }
+
+
+def placeholder_for_file(file_path: str, thumbnail_path: str = None) -> dict:
+    """回填用：优先读缩略图，缩略图缺失时按 draft 模式解码原图"""
+    storage = get_storage()
+    use_thumb = thumbnail_path and thumbnail_path != file_path and storage.exists(thumbnail_path)
+    with storage.local_copy(thumbnail_path if use_thumb else file_path) as source:
+        if use_thumb:
+            with PILImage.open(source) as src:
+                img = src.copy()
+        else:
+            img = open_upright(source, (_SAMPLE_SIZE * 4, _SAMPLE_SIZE * 4))
+    width, height = img.size
+    result = compute_placeholder(img)
+    result["aspect_ratio"] = round(width / height, 4) if height else None
+    return result
@@ -0,0 +1,199 @@
+import os
+import shutil
+import asyncio
+import hashlib
+import tempfile
+from collections import OrderedDict
+from PIL import Image as PILImage
+
+from app.core.config import settings
+from app.core.storage import get_storage
+from app.core.workers import run_in_image_pool, run_in_io_pool
+from app.core.metrics import RENDITION_CACHE
+from app.services.decode_service import open_upright
+
+# fmt 参数 -> (Pillow 格式, 扩展名, 保存参数)
+RENDER_FORMATS = {
+    "jpeg": ("JPEG", "jpg", {"quality": 82, "optimize": True}),
+    "webp": ("WEBP", "webp", {"quality": 80, "method": 4}),
+    "png": ("PNG", "png", {"optimize": True}),
+}
+
+
+def _render(source_path: str, dest_path: str, width, height, fmt: str) -> int:
+    """在线程池中执行：(对象存储先下载) 解码 -> 摆正 -> 缩放 -> 编码，返回生成文件大小"""
+    pil_format, _, save_kwargs = RENDER_FORMATS[fmt]
+    box = (width or settings.RENDER_MAX_DIM, height or settings.RENDER_MAX_DIM)
+
+    with get_storage().local_copy(source_path) as local_path:
+        # JPEG 按目标尺寸做 DCT 降采样解码，HEIC / RAW 用够大的内嵌预览；旋转前后长宽可能互换，取较大边
+        side = max(box)
+        img = open_upright(local_path, (side, side))
+    img.thumbnail(box, PILImage.LANCZOS)
+    if pil_format == "JPEG" and img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    elif img.mode == "P":
+        img = img.convert("RGBA")
+
+    # 先写临时文件再原子替换，读者永远看不到半个文件；
+    # single-flight 只在进程内生效，多个 worker 可能同时渲染同一变体，临时文件名必须各不相同
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dest_path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            img.save(f, pil_format, **save_kwargs)
+        # mkstemp 建的是 0600，与其他缓存文件保持一致
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return os.path.getsize(dest_path)
+
+
+class RenditionCache:
+    """
+    按需衍生图的磁盘缓存
+    - 文件布局: {root}/{image_id}/{sha256}.{ext}，删除图片时可整目录失效
+    - 总大小受 max_bytes 限制，超出按 LRU 淘汰
+    - 同一变体的并发请求只渲染一次 (single-flight)
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # 相对路径 -> 字节数
+        self._total_bytes = 0
+        self._inflight = {}
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def _scan(self):
+        """启动后首次使用时扫描已有文件，按访问时间重建 LRU 顺序"""
+        found = []
+        if os.path.isdir(self.root):
+            for dirpath, _, filenames in os.walk(self.root):
+                for name in filenames:
+                    if name.endswith(".tmp"):
+                        continue
+                    full = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(full)
+                    except FileNotFoundError:
+                        continue
+                    found.append((st.st_atime, os.path.relpath(full, self.root), st.st_size))
+        found.sort()
+        return found
+
+    async def _ensure_loaded(self):
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded:
+                return
+            for _, rel, size in await run_in_image_pool(self._scan):
+                self._entries[rel] = size
+                self._total_bytes += size
+            self._loaded = True
+        await self._evict()
+
+    @staticmethod
+    def variant_key(source_path: str, width, height, fmt: str) -> str:
+        raw = f"{source_path}|{width or 0}x{height or 0}|{fmt}"
+        return hashlib.sha256(raw.encode()).hexdigest()[:40]
+
+    async def get(self, image_id: int, source_path: str, width, height, fmt: str) -> str:
+        """返回衍生图的绝对路径，不存在时渲染并写入缓存"""
+        await self._ensure_loaded()
+        ext = RENDER_FORMATS[fmt][1]
+        rel = os.path.join(str(image_id), f"{self.variant_key(source_path, width, height, fmt)}.{ext}")
+        full = os.path.join(self.root, rel)
+
+        if rel in self._entries and os.path.exists(full):
+            self.hits += 1
+            self._entries.move_to_end(rel)
+            return full
+
+        inflight = self._inflight.get(rel)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        # 渲染作为独立任务执行：发起的请求断开 (被取消) 时渲染照常完成，合并过来的请求也不受影响
+        task = asyncio.ensure_future(self._fill(rel, full, source_path, width, height, fmt))
+        task.add_done_callback(_consume_exception)
+        self._inflight[rel] = task
+        return await asyncio.shield(task)
+
+    async def _fill(self, rel: str, full: str, source_path: str, width, height, fmt: str) -> str:
+        try:
+            os.makedirs(os.path.dirname(full), exist_ok=True)
+            size = await run_in_image_pool(_render, source_path, full, width, height, fmt)
+            self._total_bytes -= self._entries.pop(rel, 0)
+            self._entries[rel] = size
+            self._total_bytes += size
+        finally:
+            self._inflight.pop(rel, None)
+
+        await self._evict()
+        return full
+
+    async def _evict(self):
+        victims = []
+        while self._total_bytes > self.max_bytes and self._entries:
+            rel, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            victims.append(os.path.join(self.root, rel))
+        if victims:
+            await run_in_io_pool(_remove_files, victims)
+
+    async def invalidate(self, image_id: int):
+        """删除某张图片的所有衍生图"""
+        prefix = f"{image_id}{os.sep}"
+        for rel in [r for r in self._entries if r.startswith(prefix)]:
+            self._total_bytes -= self._entries.pop(rel)
+        await run_in_io_pool(shutil.rmtree, os.path.join(self.root, str(image_id)), True)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "inflight": len(self._inflight),
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
+
+
+def _consume_exception(task):
+    """所有等待者都已离开时，避免 "Task exception was never retrieved" 警告"""
+    if not task.cancelled():
+        task.exception()
+
+
+def _remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error evicting rendition {path}: {e}")
+
+
+rendition_cache = RenditionCache(settings.RENDITION_CACHE_DIR, settings.RENDITION_CACHE_MAX_BYTES)
+
+for _field in ("entries", "bytes", "max_bytes", "hits", "misses", "coalesced", "evictions", "inflight", "hit_rate"):
+    RENDITION_CACHE.set_function(lambda f=_field: rendition_cache.stats()[f], _field)
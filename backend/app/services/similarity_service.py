@@ -0,0 +1,179 @@
+"""
+"相似图片"：上传时计算一个定长的视觉特征 (颜色直方图 + 边缘方向直方图)，
+查询时对该用户全部特征做一次向量化距离扫描，不依赖外部服务。
+
+特征为 FEATURE_DIM 字节的 uint8 向量，存在 images.features 列。
+两部分各自 L1 归一化后开方 (Hellinger)，再按权重拼接，整体 L2 范数为 1，
+因此可以直接用欧氏距离比较
+"""
+import asyncio
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image as PILImage
+from sqlalchemy import select, func
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.storage import get_storage
+from app.services.decode_service import open_upright
+from app.models.image import Image, ImageChange
+
+# HSV 量化：色相 8 × 饱和度 3 × 明度 3
+_HSV_BINS = (8, 3, 3)
+COLOR_DIM = _HSV_BINS[0] * _HSV_BINS[1] * _HSV_BINS[2]
+# 边缘：2×2 宫格，每格 8 个方向
+_EDGE_GRID = 2
+_EDGE_BINS = 8
+EDGE_DIM = _EDGE_GRID * _EDGE_GRID * _EDGE_BINS
+FEATURE_DIM = COLOR_DIM + EDGE_DIM
+
+# 颜色与纹理的权重 (平方和为 1)
+_COLOR_WEIGHT = np.sqrt(0.6)
+_EDGE_WEIGHT = np.sqrt(0.4)
+
+_SAMPLE_SIZE = 64
+
+
+def _color_histogram(img: PILImage.Image) -> np.ndarray:
+    hsv = np.asarray(img.convert("HSV"), dtype=np.uint16).reshape(-1, 3)
+    h = hsv[:, 0] * _HSV_BINS[0] >> 8
+    s = hsv[:, 1] * _HSV_BINS[1] >> 8
+    v = hsv[:, 2] * _HSV_BINS[2] >> 8
+    index = (h * _HSV_BINS[1] + s) * _HSV_BINS[2] + v
+    return np.bincount(index, minlength=COLOR_DIM).astype(np.float64)
+
+
+def _edge_histogram(img: PILImage.Image) -> np.ndarray:
+    gray = np.asarray(img.convert("L"), dtype=np.float64)
+    gy, gx = np.gradient(gray)
+    magnitude = np.hypot(gx, gy)
+    # 无符号方向 [0, pi)
+    angle = np.mod(np.arctan2(gy, gx), np.pi)
+    bins = np.minimum((angle / np.pi * _EDGE_BINS).astype(np.int64), _EDGE_BINS - 1)
+
+    height, width = gray.shape
+    rows = np.arange(height)[:, None] * _EDGE_GRID // height
+    cols = np.arange(width)[None, :] * _EDGE_GRID // width
+    index = (rows * _EDGE_GRID + cols) * _EDGE_BINS + bins
+    return np.bincount(index.ravel(), weights=magnitude.ravel(), minlength=EDGE_DIM)
+
+
+def _hellinger(hist: np.ndarray) -> np.ndarray:
+    total = hist.sum()
+    return np.sqrt(hist / total) if total > 0 else hist
+
+
+def compute_features(img: PILImage.Image) -> bytes:
+    """img 为已摆正的图 (通常就是缩略图)，返回 FEATURE_DIM 字节"""
+    sample = img.convert("RGB").resize((_SAMPLE_SIZE, _SAMPLE_SIZE), PILImage.BILINEAR)
+    vector = np.concatenate([
+        _hellinger(_color_histogram(sample)) * _COLOR_WEIGHT,
+        _hellinger(_edge_histogram(sample)) * _EDGE_WEIGHT,
+    ])
+    return np.round(vector * 255).astype(np.uint8).tobytes()
+
+
+def features_for_file(file_path: str, thumbnail_path: str = None) -> dict:
+    """回填用：与 placeholder_for_file 相同的取图策略"""
+    storage = get_storage()
+    use_thumb = thumbnail_path and thumbnail_path != file_path and storage.exists(thumbnail_path)
+    with storage.local_copy(thumbnail_path if use_thumb else file_path) as source:
+        if use_thumb:
+            with PILImage.open(source) as src:
+                img = src.copy()
+        else:
+            img = open_upright(source, (_SAMPLE_SIZE * 4, _SAMPLE_SIZE * 4))
+    return {"features": compute_features(img)}
+
+
+class _UserIndex:
+    __slots__ = ("fingerprint", "ids", "matrix", "norms")
+
+    def __init__(self, fingerprint, ids: np.ndarray, matrix: np.ndarray):
+        self.fingerprint = fingerprint
+        self.ids = ids
+        self.matrix = matrix
+        self.norms = np.einsum("ij,ij->i", matrix, matrix)
+
+    def search(self, query: np.ndarray, k: int, exclude_id: int):
+        # ||a - b||^2 = ||a||^2 + ||b||^2 - 2 a·b，主要开销是一次矩阵-向量乘法
+        distances = self.norms + query @ query - 2 * (self.matrix @ query)
+        distances[self.ids == exclude_id] = np.inf
+        k = min(k, len(self.ids) - 1)
+        if k <= 0:
+            return []
+        top = np.argpartition(distances, k - 1)[:k]
+        top = top[np.argsort(distances[top])]
+        return [(int(self.ids[i]), float(np.sqrt(max(distances[i], 0.0)))) for i in top]
+
+
+class SimilarityIndex:
+    """
+    每个用户一份内存中的特征矩阵 (float32，10 万张约 40MB)，LRU 只保留最近使用的几个用户。
+    指纹取该用户变更日志 (image_changes) 的 (条数, 最大 ID)：上传、删除、回填都会写变更日志，
+    多个 worker / 命令行进程的修改也能感知；条数用来发现晚提交的小 ID 事务。
+    只走 (user_id, id) 索引，不扫 images 表
+    """
+
+    # 每用户加载锁的上限；只淘汰没人持有的锁，持有中的锁不会被替换
+    MAX_LOCKS = 1024
+
+    def __init__(self, max_users: int, ttl: float):
+        self._cache = TTLCache(max_users, ttl)
+        self._locks = OrderedDict()
+
+    async def _fingerprint(self, db, user_id: int):
+        row = (await db.execute(
+            select(func.count(ImageChange.id), func.max(ImageChange.id))
+            .where(ImageChange.user_id == user_id)
+        )).one()
+        return tuple(row)
+
+    def _lock(self, user_id: int) -> asyncio.Lock:
+        lock = self._locks.get(user_id)
+        if lock is not None:
+            self._locks.move_to_end(user_id)
+            return lock
+        if len(self._locks) >= self.MAX_LOCKS:
+            for key in [key for key, held in self._locks.items() if not held.locked()][:len(self._locks) - self.MAX_LOCKS + 1]:
+                del self._locks[key]
+        lock = self._locks[user_id] = asyncio.Lock()
+        return lock
+
+    async def _load(self, db, user_id: int, fingerprint) -> _UserIndex:
+        ids, blobs = [], []
+        result = await db.stream(
+            select(Image.id, Image.features)
+            .where(Image.user_id == user_id, Image.features.is_not(None))
+            .execution_options(yield_per=5000)
+        )
+        async for image_id, features in result:
+            if features and len(features) == FEATURE_DIM:
+                ids.append(image_id)
+                blobs.append(features)
+        matrix = np.frombuffer(b"".join(blobs), dtype=np.uint8).reshape(-1, FEATURE_DIM)
+        return _UserIndex(fingerprint, np.asarray(ids, dtype=np.int64), matrix.astype(np.float32) / 255)
+
+    async def get(self, db, user_id: int) -> _UserIndex:
+        fingerprint = await self._fingerprint(db, user_id)
+        index = self._cache.get(user_id)
+        if index is not None and index.fingerprint == fingerprint:
+            return index
+
+        # 同一用户并发请求只加载一次
+        async with self._lock(user_id):
+            index = self._cache.get(user_id)
+            if index is None or index.fingerprint != fingerprint:
+                index = await self._load(db, user_id, fingerprint)
+                self._cache.set(user_id, index)
+        return index
+
+    async def find_similar(self, db, user_id: int, image_id: int, features: bytes, k: int):
+        """返回 [(image_id, 距离)]，距离越小越相似，范围 [0, sqrt(2)]"""
+        index = await self.get(db, user_id)
+        query = np.frombuffer(features, dtype=np.uint8).astype(np.float32) / 255
+        return index.search(query, k, image_id)
+
+
+similarity_index = SimilarityIndex(settings.SIMILARITY_CACHE_USERS, settings.SIMILARITY_CACHE_TTL)
@@ -0,0 +1,176 @@
+"""
+标签的集合式读写。
+并发上传 / AI 分析时 "先查再插" 会撞 tags.name 唯一约束，
+这里统一用 "INSERT 忽略冲突 + 回查" 的方式拿到标签 ID。
+批量改标签以 "圈定图片的子查询" 为范围，用 INSERT ... SELECT / DELETE ... WHERE 一次改完
+"""
+from sqlalchemy import select, delete, func, literal, true
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from app.models.image import Tag, image_tag_map
+
+# 单条 IN (...) 的最大参数个数
+_CHUNK_SIZE = 500
+
+_TAG_NAME_MAX = Tag.__table__.c.name.type.length
+
+
+def insert_ignore(db, table):
+    """按方言生成 "主键/唯一键冲突时跳过" 的 INSERT"""
+    dialect = db.bind.dialect.name
+    if dialect == "mysql":
+        return mysql.insert(table).prefix_with("IGNORE")
+    if dialect == "postgresql":
+        return postgresql.insert(table).on_conflict_do_nothing()
+    return sqlite.insert(table).on_conflict_do_nothing()
+
+
+def normalize_tag_names(names) -> list:
+    """去空白、去重 (保持顺序)，超长的截断到列宽"""
+    result = []
+    for name in names:
+        name = str(name or "").strip()[:_TAG_NAME_MAX]
+        if name and name not in result:
+            result.append(name)
+    return result
+
+
+async def _select_ids(db, names) -> dict:
+    found = {}
+    for i in range(0, len(names), _CHUNK_SIZE):
+        rows = await db.execute(select(Tag.id, Tag.name).where(Tag.name.in_(names[i:i + _CHUNK_SIZE])))
+        found.update({row.name: row.id for row in rows})
+    return found
+
+
+async def ensure_tags(db, names) -> dict:
+    """
+    确保标签都存在，返回 {标签名: ID}。不提交事务，由调用方统一 commit
+    """
+    names = normalize_tag_names(names)
+    if not names:
+        return {}
+
+    ids = await _select_ids(db, names)
+    missing = [n for n in names if n not in ids]
+    if missing:
+        await db.execute(insert_ignore(db, Tag.__table__), [{"name": n} for n in missing])
+        created = await _select_ids(db, missing)
+        # MySQL 默认排序规则大小写不敏感，"Apple" 可能命中已有的 "apple"
+        folded = {name.lower(): tag_id for name, tag_id in created.items()}
+        for name in missing:
+            tag_id = created.get(name) or folded.get(name.lower())
+            if tag_id is not None:
+                ids[name] = tag_id
+    return ids
+
+
+async def link_tags(db, pairs, source: str = None):
+    """
+    批量写入 (image_id, tag_id) 关联，已存在的关联直接跳过。不提交事务
+    """
+    rows = []
+    for image_id, tag_id in dict.fromkeys(pairs):
+        row = {"image_id": image_id, "tag_id": tag_id}
+        if source:
+            row["source"] = source
+        rows.append(row)
+    if rows:
+        await db.execute(insert_ignore(db, image_tag_map), rows)
+    return len(rows)
+
+
+async def _tagged_images(db, scope, tag_ids) -> list:
+    """范围内带有这些标签之一的图片 ID"""
+    rows = await db.execute(
+        select(image_tag_map.c.image_id).distinct()
+        .where(image_tag_map.c.tag_id.in_(tag_ids), image_tag_map.c.image_id.in_(scope))
+    )
+    return rows.scalars().all()
+
+
+async def _unlink(db, image_ids, tag_ids) -> int:
+    """
+    按已查出的图片 ID 删除关联；范围子查询可能按标签筛选 (引用 image_tag_map 本身)，
+    MySQL 不允许 DELETE 的子查询读同一张表
+    """
+    removed = 0
+    for i in range(0, len(image_ids), _CHUNK_SIZE):
+        result = await db.execute(
+            delete(image_tag_map)
+            .where(image_tag_map.c.tag_id.in_(tag_ids), image_tag_map.c.image_id.in_(image_ids[i:i + _CHUNK_SIZE]))
+        )
+        removed += result.rowcount
+    return removed
+
+
+async def bulk_add_tags(db, scope, names):
+    """
+    scope 为 select(Image.id) 形式的范围查询。给范围内的图片加上标签，返回 (有变化的图片 ID, 新增关联数)。
+    不提交事务
+    """
+    tag_ids = list((await ensure_tags(db, names)).values())
+    if not tag_ids:
+        return [], 0
+
+    scoped = scope.subquery()
+    # 还缺至少一个标签的图片，即这次会有变化的图片
+    linked = (
+        select(func.count())
+        .where(image_tag_map.c.image_id == scoped.c.id, image_tag_map.c.tag_id.in_(tag_ids))
+        .scalar_subquery()
+    )
+    changed = (await db.execute(select(scoped.c.id).where(linked < len(tag_ids)))).scalars().all()
+    if not changed:
+        return [], 0
+
+    result = await db.execute(
+        insert_ignore(db, image_tag_map).from_select(
+            ["image_id", "tag_id", "source"],
+            select(scoped.c.id, Tag.id, literal("manual"))
+            .select_from(scoped).join(Tag, true())
+            .where(Tag.id.in_(tag_ids))
+        )
+    )
+    return changed, result.rowcount
+
+
+async def bulk_remove_tags(db, scope, names):
+    """去掉范围内图片的这些标签，返回 (有变化的图片 ID, 删除关联数)。标签本身保留。不提交事务"""
+    tag_ids = list((await _select_ids(db, normalize_tag_names(names))).values())
+    if not tag_ids:
+        return [], 0
+
+    changed = await _tagged_images(db, scope, tag_ids)
+    if not changed:
+        return [], 0
+    return changed, await _unlink(db, changed, tag_ids)
+
+
+async def bulk_merge_tags(db, scope, names, target: str):
+    """
+    把范围内图片上的 names 标签并入 target (rename 即只有一个源标签)，
+    返回 (有变化的图片 ID, 新增关联数, 删除关联数)。不提交事务
+    """
+    target_ids = await ensure_tags(db, [target])
+    if not target_ids:
+        return [], 0, 0
+    target_id = next(iter(target_ids.values()))
+    source_ids = [i for i in (await _select_ids(db, normalize_tag_names(names))).values() if i != target_id]
+    if not source_ids:
+        return [], 0, 0
+
+    changed = await _tagged_images(db, scope, source_ids)
+    if not changed:
+        return [], 0, 0
+
+    # 先挂上目标标签 (已有的跳过)，再摘掉源标签
+    result = await db.execute(
+        insert_ignore(db, image_tag_map).from_select(
+            ["image_id", "tag_id", "source"],
+            select(image_tag_map.c.image_id, literal(target_id), literal("manual")).distinct()
+            .where(image_tag_map.c.tag_id.in_(source_ids), image_tag_map.c.image_id.in_(scope))
+        )
+    )
+    added = result.rowcount
+    return changed, added, await _unlink(db, changed, source_ids)
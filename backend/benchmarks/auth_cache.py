@@ -0,0 +1,67 @@
+"""
+/api/images/ 吞吐对比：关闭 vs 开启已认证用户缓存
+
+用法 (在 backend 目录下):
+    DATABASE_URL=sqlite+aiosqlite:///./bench.db SECRET_KEY=bench python -m benchmarks.auth_cache -n 2000 -c 20
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from app.main import app
+from app.services.auth_service import principal_cache
+
+
+async def _login(client: httpx.AsyncClient) -> str:
+    user = {"username": "bench_auth", "email": "bench_auth@example.com", "password": "bench-password"}
+    await client.post("/api/auth/register", json=user)
+    resp = await client.post("/api/auth/login", data={"username": user["username"], "password": user["password"]})
+    resp.raise_for_status()
+    return resp.json()["access_token"]
+
+
+async def _run(client: httpx.AsyncClient, token: str, total: int, concurrency: int) -> float:
+    headers = {"Authorization": f"Bearer {token}"}
+    remaining = total
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            resp = await client.get("/api/images/", headers=headers)
+            resp.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return total / (time.perf_counter() - start)
+
+
+async def main(total: int, concurrency: int):
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            token = await _login(client)
+            ttl = principal_cache.ttl
+
+            principal_cache.ttl = 0
+            principal_cache.clear()
+            await _run(client, token, min(total, 200), concurrency)  # 预热
+            without_cache = await _run(client, token, total, concurrency)
+
+            principal_cache.ttl = ttl or 60
+            with_cache = await _run(client, token, total, concurrency)
+            principal_cache.ttl = ttl
+
+    print(f"GET /api/images/  n={total} c={concurrency}")
+    print(f"  without principal cache: {without_cache:8.1f} req/s")
+    print(f"  with principal cache:    {with_cache:8.1f} req/s  ({with_cache / without_cache:.2f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--requests", type=int, default=2000)
+    parser.add_argument("-c", "--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
@@ -0,0 +1,27 @@
+"""
+对比两次压测结果：python -m benchmarks.compare before.json after.json
+"""
+import sys
+import json
+
+METRICS = ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+
+
+def compare(before: dict, after: dict):
+    print(f"before: {before['meta']['commit']}  after: {after['meta']['commit']}")
+    print(f"{'scenario':<14} {'metric':<15} {'before':>10} {'after':>10} {'change':>8}")
+    for name, new in after["results"].items():
+        old = before["results"].get(name)
+        if not old:
+            continue
+        for metric in METRICS:
+            a, b = old.get(metric, 0), new.get(metric, 0)
+            change = f"{(b - a) / a * 100:+.1f}%" if a else "n/a"
+            print(f"{name:<14} {metric:<15} {a:>10.2f} {b:>10.2f} {change:>8}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("usage: python -m benchmarks.compare before.json after.json")
+    with open(sys.argv[1], encoding="utf-8") as f1, open(sys.argv[2], encoding="utf-8") as f2:
+        compare(json.load(f1), json.load(f2))
@@ -0,0 +1,137 @@
+"""
+合成照片库：带 EXIF (拍摄时间 / 设备 / GPS) 的 JPEG，用固定随机种子保证每次生成的数据一致；
+另有同内容的 HEIC 与最小 DNG，供 benchmarks.decode 对比各格式的入库耗时
+"""
+import io
+import os
+import random
+import struct
+from datetime import datetime, timedelta
+
+from PIL import Image, ImageDraw
+
+# 坐标落在几个城市附近，配合假高德服务生成可搜索的地点标签
+CITIES = [
+    ("杭州", 30.2741, 120.1551),
+    ("上海", 31.2304, 121.4737),
+    ("北京", 39.9042, 116.4074),
+    ("成都", 30.5728, 104.0668),
+    ("厦门", 24.4798, 118.0894),
+]
+MAKES = ["Apple", "Canon", "SONY", "NIKON CORPORATION", "Xiaomi"]
+
+
+def _to_dms(value: float):
+    value = abs(value)
+    d = int(value)
+    m = int((value - d) * 60)
+    s = round(((value - d) * 60 - m) * 60, 2)
+    return (float(d), float(m), float(s))
+
+
+def make_photo(rng: random.Random, width: int, height: int, with_gps: bool = True) -> bytes:
+    """生成一张有一定纹理的 JPEG (纯色图压缩率过高，不能代表真实照片)"""
+    img = Image.new("RGB", (width, height), tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(img)
+    for _ in range(40):
+        x0, y0 = rng.randrange(width), rng.randrange(height)
+        x1, y1 = x0 + rng.randrange(width // 2 + 1), y0 + rng.randrange(height // 2 + 1)
+        draw.rectangle((x0, y0, x1, y1), fill=tuple(rng.randrange(256) for _ in range(3)))
+    noise = Image.effect_noise((width, height), 40).convert("RGB")
+    img = Image.blend(img, noise, 0.25)
+
+    exif = Image.Exif()
+    exif[0x010F] = rng.choice(MAKES)  # Make
+    exif[0x0112] = rng.choice([1, 1, 1, 6])  # Orientation，少量竖拍
+    taken = datetime(2023, 1, 1) + timedelta(minutes=rng.randrange(2 * 365 * 24 * 60))
+    exif[0x8769] = {0x9003: taken.strftime("%Y:%m:%d %H:%M:%S")}  # DateTimeOriginal
+    if with_gps:
+        _, lat, lon = rng.choice(CITIES)
+        lat += rng.uniform(-0.05, 0.05)
+        lon += rng.uniform(-0.05, 0.05)
+        exif[0x8825] = {1: "N", 2: _to_dms(lat), 3: "E", 4: _to_dms(lon)}
+
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=88, exif=exif.tobytes())
+    return buf.getvalue()
+
+
+def build_library(directory: str, count: int, width: int = 1600, height: int = 1200, seed: int = 42):
+    """在 directory 下生成 count 张照片，已存在的同名文件直接复用；返回文件路径列表"""
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for i in range(count):
+        # 每张图的内容只由 (seed, i) 决定，复用缓存与否结果一致
+        photo_rng = random.Random(rng.random())
+        path = os.path.join(directory, f"bench_{seed}_{width}x{height}_{i:06d}.jpg")
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(make_photo(photo_rng, width, height, with_gps=i % 10 != 0))
+        paths.append(path)
+    return paths
+
+
+def make_heic(rng: random.Random, width: int, height: int) -> bytes:
+    """同样内容的 HEIC (需要 pip install pillow-heif)；pillow-heif 不写内嵌缩略图，读取时只能完整解码"""
+    from app.services.decode_service import register_heif_opener
+    register_heif_opener()
+    img = Image.open(io.BytesIO(make_photo(rng, width, height)))
+    buf = io.BytesIO()
+    img.save(buf, "HEIF", quality=80, exif=img.info.get("exif", b""))
+    return buf.getvalue()
+
+
+def _tiff_ifd(entries) -> bytes:
+    """entries: (tag, type, count, int 或不超过 4 字节的 bytes)，按 tag 排序写成一个 IFD"""
+    out = struct.pack("<H", len(entries))
+    for tag, typ, count, value in sorted(entries, key=lambda e: e[0]):
+        out += struct.pack("<HHI", tag, typ, count)
+        if isinstance(value, bytes):
+            out += value.ljust(4, b"\0")
+        elif typ == 3 and count == 1:
+            out += struct.pack("<HH", value, 0)
+        else:
+            out += struct.pack("<I", value)
+    return out + struct.pack("<I", 0)
+
+
+def make_dng(rng: random.Random, width: int, height: int, preview_side: int = None) -> bytes:
+    """
+    最小的 DNG：IFD0 是 JPEG 预览 (默认全尺寸，与多数相机一致)，SubIFD 是 16 位 RGGB 原始数据。
+    preview_side 设小于目标尺寸即可测没有可用预览时的去马赛克路径
+    """
+    preview_side = preview_side or max(width, height)
+    pw, ph = preview_side, preview_side * height // width
+    preview = Image.open(io.BytesIO(make_photo(rng, width, height))).resize((pw, ph))
+    buf = io.BytesIO()
+    preview.save(buf, "JPEG", quality=85)
+    jpeg = buf.getvalue()
+    cfa = bytes(rng.getrandbits(8) for _ in range(256)) * (width * height * 2 // 256 + 1)
+    cfa = cfa[:width * height * 2]
+    make = rng.choice(MAKES).encode() + b"\0"
+
+    out = bytearray(b"II*\0\0\0\0\0")
+    offsets = {}
+
+    def add(name, data):
+        out.extend(b"\0" * (len(out) % 2))
+        offsets[name] = len(out)
+        out.extend(data)
+
+    add("jpeg", jpeg)
+    add("cfa", cfa)
+    add("make", make)
+    add("raw_ifd", _tiff_ifd([
+        (254, 4, 1, 0), (256, 4, 1, width), (257, 4, 1, height), (258, 3, 1, 16), (259, 3, 1, 1),
+        (262, 3, 1, 32803), (273, 4, 1, offsets["cfa"]), (277, 3, 1, 1), (278, 4, 1, height),
+        (279, 4, 1, len(cfa)), (33421, 3, 2, struct.pack("<HH", 2, 2)), (33422, 1, 4, b"\0\1\1\2"),
+    ]))
+    add("ifd0", _tiff_ifd([
+        (254, 4, 1, 1), (256, 4, 1, pw), (257, 4, 1, ph), (258, 3, 1, 8), (259, 3, 1, 7), (262, 3, 1, 6),
+        (271, 2, len(make), offsets["make"]), (273, 4, 1, offsets["jpeg"]), (274, 3, 1, 1),
+        (277, 3, 1, 3), (278, 4, 1, ph), (279, 4, 1, len(jpeg)), (330, 4, 1, offsets["raw_ifd"]),
+        (50706, 1, 4, bytes([1, 4, 0, 0])), (50708, 2, len(make), offsets["make"]),
+    ]))
+    out[4:8] = struct.pack("<I", offsets["ifd0"])
+    return bytes(out)
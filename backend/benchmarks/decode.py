@@ -0,0 +1,60 @@
+"""
+各格式单张图片的入库耗时：文件头探测 + 生成缩略图 / 占位图 / 相似特征 (与上传时的 decode + renditions 阶段相同)
+  - jpeg:         基准，DCT 降采样解码
+  - heic:         pillow-heif 完整解码 (合成文件没有内嵌缩略图)
+  - dng_preview:  使用内嵌的全尺寸 JPEG 预览
+  - dng_demosaic: 预览太小，退回半尺寸去马赛克
+
+用法 (在 backend 目录下，需要 pip install pillow-heif rawpy):
+    python -m benchmarks.decode --width 4000 --height 3000 --runs 5
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+from benchmarks.dataset import make_photo, make_heic, make_dng
+from app.services.decode_service import image_kind
+from app.services.image_service import probe_image_metadata, _write_renditions
+
+
+def _ingest(path: str, thumb_path: str):
+    probe = probe_image_metadata(path, image_kind(path))
+    _write_renditions(path, thumb_path, probe, {})
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix="smartimage-decode-")
+    samples = {
+        "jpeg": ("jpg", make_photo(rng, args.width, args.height)),
+        "heic": ("heic", make_heic(rng, args.width, args.height)),
+        "dng_preview": ("dng", make_dng(rng, args.width, args.height)),
+        "dng_demosaic": ("dng", make_dng(rng, args.width, args.height, preview_side=256)),
+    }
+
+    print(f"{args.width}x{args.height}, {args.runs} runs")
+    print(f"{'format':<14} {'size_kb':>8} {'p50_ms':>8} {'max_ms':>8}")
+    for name, (ext, payload) in samples.items():
+        path = os.path.join(workdir, f"{name}.{ext}")
+        with open(path, "wb") as f:
+            f.write(payload)
+        thumb_path = os.path.join(workdir, f"{name}_thumb.jpg")
+
+        timings = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            _ingest(path, thumb_path)
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f"{name:<14} {len(payload) / 1024:>8.0f} {statistics.median(timings):>8.1f} {max(timings):>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    main(parser.parse_args())
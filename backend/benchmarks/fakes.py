@@ -0,0 +1,174 @@
+"""
+进程内的假外部服务：高德逆地理编码 + SiliconFlow (OpenAI 兼容) chat completions。
+每个服务跑在独立线程的 uvicorn 上，延迟可配置，压测不依赖外网、结果可复现
+"""
+import json
+import time
+import socket
+import asyncio
+import random
+import threading
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from benchmarks.dataset import CITIES
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ServerThread:
+    """在后台线程里跑一个 uvicorn 实例"""
+
+    def __init__(self, app, port: int = None):
+        self.port = port or _free_port()
+        config = uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning", lifespan="on")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, timeout: float = 30.0):
+        self.thread.start()
+        deadline = time.time() + timeout
+        while not self.server.started:
+            if not self.thread.is_alive() or time.time() > deadline:
+                raise RuntimeError(f"Server on port {self.port} failed to start")
+            time.sleep(0.02)
+        return self
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+async def _delay(latency_ms: float, jitter: float, rng: random.Random):
+    if latency_ms > 0:
+        await asyncio.sleep(latency_ms * rng.uniform(1 - jitter, 1 + jitter) / 1000)
+
+
+def amap_app(latency_ms: float = 50, jitter: float = 0.2, error_rate: float = 0.0, seed: int = 1):
+    rng = random.Random(seed)
+    stats = {"requests": 0}
+
+    async def regeo(request: Request):
+        stats["requests"] += 1
+        await _delay(latency_ms, jitter, rng)
+        if rng.random() < error_rate:
+            return JSONResponse({"status": "0", "info": "FAKE_ERROR"})
+
+        lon, lat = (float(v) for v in request.query_params["location"].split("|")[0].split(","))
+        city = min(CITIES, key=lambda c: (c[1] - lat) ** 2 + (c[2] - lon) ** 2)[0]
+        return JSONResponse({
+            "status": "1",
+            "info": "OK",
+            "regeocode": {
+                "formatted_address": f"{city}市 测试区 测试街道",
+                "addressComponent": {
+                    "province": f"{city}省" if city not in ("上海", "北京") else f"{city}市",
+                    "city": f"{city}市",
+                    "district": "测试区",
+                    "township": "测试街道",
+                    "streetNumber": {"street": "测试路"},
+                },
+                "pois": [{"name": f"{city}测试景点"}],
+            },
+        })
+
+    app = Starlette(routes=[Route("/v3/geocode/regeo", regeo)])
+    app.state.stats = stats
+    return app
+
+
+def siliconflow_app(latency_ms: float = 300, jitter: float = 0.2, error_rate: float = 0.0, seed: int = 2):
+    """
+    - 带 image_url 的请求 (图片分析)：返回 JSON 格式的描述与标签
+    - 带 tools 的请求：返回 search_images 工具调用，query 取用户消息最后一个词 (单次调用模式另带 reply)
+    - 其余 (工具结果总结)：返回一句简短文本
+    """
+    rng = random.Random(seed)
+    stats = {"requests": 0}
+
+    def _completion(message: dict, finish_reason: str = "stop"):
+        return {
+            "id": f"fake-{stats['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "fake",
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120},
+        }
+
+    async def completions(request: Request):
+        stats["requests"] += 1
+        body = await request.json()
+        await _delay(latency_ms, jitter, rng)
+        if rng.random() < error_rate:
+            return JSONResponse({"error": {"message": "fake upstream error"}}, status_code=500)
+
+        messages = body.get("messages", [])
+        last_user = next((m for m in reversed(messages) if m.get("role") == "user"), {})
+        content = last_user.get("content")
+
+        if isinstance(content, list):
+            analysis = {
+                "summary": "一张用于压测的合成照片，包含彩色几何色块。",
+                "scene_tags": ["户外", "城市"],
+                "object_tags": ["色块"],
+                "style_tags": ["抽象"],
+            }
+            return JSONResponse(_completion({"role": "assistant", "content": json.dumps(analysis, ensure_ascii=False)}))
+
+        if body.get("tools") and not any(m.get("role") == "tool" for m in messages):
+            query = (content or "").split()[-1] if content else ""
+            arguments = {"query": query}
+            # 单次调用模式的工具定义要求模型顺带给出回复
+            if "reply" in body["tools"][0]["function"]["parameters"]["properties"]:
+                arguments["reply"] = f"为您找到 {{count}} 张{query}的照片。"
+            tool_call = {
+                "id": f"call_{stats['requests']}",
+                "type": "function",
+                "function": {"name": "search_images", "arguments": json.dumps(arguments, ensure_ascii=False)},
+            }
+            return JSONResponse(_completion({"role": "assistant", "content": None, "tool_calls": [tool_call]}, "tool_calls"))
+
+        return JSONResponse(_completion({"role": "assistant", "content": "为您找到了这些照片。"}))
+
+    app = Starlette(routes=[Route("/v1/chat/completions", completions, methods=["POST"])])
+    app.state.stats = stats
+    return app
+
+
+class ObjectStoreThread:
+    """S3 兼容的对象存储替身 (moto_server)，启动后自动建好 bucket"""
+
+    def __init__(self, bucket: str = "smartimage-bench", port: int = None):
+        from moto.server import ThreadedMotoServer
+        self.bucket = bucket
+        self.port = port or _free_port()
+        self.server = ThreadedMotoServer(ip_address="127.0.0.1", port=self.port, verbose=False)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        import boto3
+        self.server.start()
+        boto3.client(
+            "s3", endpoint_url=self.url, region_name="us-east-1",
+            aws_access_key_id="bench", aws_secret_access_key="bench",
+        ).create_bucket(Bucket=self.bucket)
+        return self
+
+    def stop(self):
+        self.server.stop()
@@ -0,0 +1,134 @@
+"""
+GET /api/images/ 列表页：旧实现 (ORM 实体 + selectinload + ImageResponse 校验 + json)
+与当前实现 (列投影 + 一条标签查询 + orjson) 的延迟与单次请求内存峰值 (tracemalloc) 对比
+
+用法 (在 backend 目录下):
+    DATABASE_URL=sqlite+aiosqlite:///./bench.db SECRET_KEY=bench python -m benchmarks.list_page --images 2000 --limit 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import tracemalloc
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from sqlalchemy import insert, select, func
+from sqlalchemy.orm import selectinload
+
+from app.main import app
+from app.db.database import SessionLocal
+from app.models.image import Image, Tag, image_tag_map
+from app.models.user import User
+from app.routers.images import get_images
+from app.schemas.image import ImageResponse
+from app.services.tag_service import insert_ignore
+
+_legacy_adapter = TypeAdapter(List[ImageResponse])
+
+
+async def legacy_page(db, user, limit: int):
+    """改造前 get_images 的处理路径，作为对照组"""
+    stmt = (
+        select(Image)
+        .where(Image.user_id == user.id)
+        .options(selectinload(Image.tags))
+        .order_by(Image.capture_time.desc(), Image.upload_time.desc(), Image.id.desc())
+        .limit(limit)
+    )
+    images = (await db.execute(stmt)).scalars().all()
+    return JSONResponse(jsonable_encoder(_legacy_adapter.validate_python(images)))
+
+
+async def current_page(db, user, limit: int):
+    return await get_images(tag=None, start_date=None, end_date=None, skip=0, limit=limit, db=db, current_user=user)
+
+
+async def _seed(count: int, tags_per_image: int) -> User:
+    async with SessionLocal() as db:
+        user = (await db.execute(select(User).where(User.username == "bench_list"))).scalars().first()
+        if not user:
+            user = User(username="bench_list", email="bench_list@example.com", hashed_password="x")
+            db.add(user)
+            await db.commit()
+
+        existing = (await db.execute(select(func.count(Image.id)).where(Image.user_id == user.id))).scalar()
+        if existing < count:
+            await db.execute(insert_ignore(db, Tag.__table__), [{"name": f"bench-tag-{i}"} for i in range(50)])
+            tag_ids = list((await db.execute(select(Tag.id).where(Tag.name.like("bench-tag-%")))).scalars())
+            rows = [{
+                "user_id": user.id,
+                "filename": f"bench_{i}.jpg",
+                "file_path": f"static/uploads/bench_{i}.jpg",
+                "thumbnail_path": f"static/thumbnails/bench_{i}.jpg",
+                "location": "浙江省 杭州市 西湖区 测试街道 测试景点",
+                "resolution": "4032x3024",
+                "ai_description": "一段较长的 AI 描述，列表页并不展示。" * 8,
+            } for i in range(existing, count)]
+            last_id = (await db.execute(select(func.max(Image.id)))).scalar() or 0
+            await db.execute(insert(Image), rows)
+            image_ids = list((await db.execute(
+                select(Image.id).where(Image.user_id == user.id, Image.id > last_id)
+            )).scalars())
+            await db.execute(insert(image_tag_map), [
+                {"image_id": image_id, "tag_id": tag_ids[(image_id + k) % len(tag_ids)]}
+                for image_id in image_ids for k in range(tags_per_image)
+            ])
+            await db.commit()
+        return user
+
+
+async def _measure(fn, user, limit: int, rounds: int):
+    latencies = []
+    async with SessionLocal() as db:
+        await fn(db, user, limit)  # 预热
+        for _ in range(rounds):
+            start = time.perf_counter()
+            await fn(db, user, limit)
+            latencies.append((time.perf_counter() - start) * 1000)
+            db.expunge_all()
+
+        # 分配量单独测，tracemalloc 本身会拖慢延迟
+        peaks = []
+        tracemalloc.start()
+        for _ in range(min(rounds, 50)):
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+            await fn(db, user, limit)
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append((peak - base) / 1024)
+            db.expunge_all()
+        tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+        "peak_kib": statistics.mean(peaks),
+    }
+
+
+async def main(images: int, tags_per_image: int, limit: int, rounds: int):
+    async with app.router.lifespan_context(app):
+        user = await _seed(images, tags_per_image)
+        legacy = await _measure(legacy_page, user, limit, rounds)
+        current = await _measure(current_page, user, limit, rounds)
+
+    print(f"GET /api/images/  images={images} tags/image={tags_per_image} limit={limit} rounds={rounds}")
+    print(f"{'':<10} {'p50 ms':>8} {'p95 ms':>8} {'peak KiB/request':>18}")
+    for name, r in (("legacy", legacy), ("current", current)):
+        print(f"{name:<10} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['peak_kib']:>18.1f}")
+    print(f"speedup p50 {legacy['p50_ms'] / current['p50_ms']:.2f}x, "
+          f"peak memory {legacy['peak_kib'] / current['peak_kib']:.2f}x less")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=2000, help="images to seed for the benchmark user")
+    parser.add_argument("--tags", type=int, default=8, help="tags per seeded image")
+    parser.add_argument("--limit", type=int, default=50, help="page size")
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.images, args.tags, args.limit, args.rounds))
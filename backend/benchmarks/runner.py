@@ -0,0 +1,244 @@
+"""
+端到端压测：真实 uvicorn + 本地假外部服务，逐场景统计吞吐与 p50/p95/p99
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import platform
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+
+import httpx
+
+from benchmarks.dataset import build_library, CITIES
+from benchmarks.fakes import ServerThread, ObjectStoreThread, amap_app, siliconflow_app
+
+SCENARIOS = ("upload", "list", "search", "chat", "delete")
+
+
+def percentile(sorted_values, q: float) -> float:
+    """最近秩法 (nearest-rank)"""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+def summarize(latencies, errors: int, duration: float) -> dict:
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "errors": errors,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(values) / duration, 2) if duration > 0 else 0.0,
+        "mean_ms": round(sum(values) / len(values), 2) if values else 0.0,
+        "p50_ms": round(percentile(values, 50), 2),
+        "p95_ms": round(percentile(values, 95), 2),
+        "p99_ms": round(percentile(values, 99), 2),
+        "max_ms": round(values[-1], 2) if values else 0.0,
+    }
+
+
+async def run_jobs(jobs, concurrency: int) -> dict:
+    """jobs 为返回协程的无参函数列表；单个请求失败计入 errors，不中断压测"""
+    latencies = []
+    errors = 0
+    queue = list(reversed(jobs))
+
+    async def worker():
+        nonlocal errors
+        while queue:
+            job = queue.pop()
+            start = time.perf_counter()
+            try:
+                resp = await job()
+                resp.raise_for_status()
+                latencies.append((time.perf_counter() - start) * 1000)
+            except Exception:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(max(1, concurrency))])
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def configure_environment(args, workdir: str, amap_url: str, llm_url: str, object_store=None):
+    """必须在 import app 之前调用：Settings 在导入时读取环境变量"""
+    os.makedirs(os.path.join(workdir, "static"), exist_ok=True)
+    os.environ.update({
+        "DATABASE_URL": args.database_url or f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}",
+        "SECRET_KEY": "benchmark-secret",
+        "AMAP_KEY": "fake",
+        "AMAP_BASE_URL": amap_url,
+        "SILICONFLOW_API_KEY": "fake",
+        "SILICONFLOW_BASE_URL": f"{llm_url}/v1",
+        "UPLOAD_DIR": os.path.join(workdir, "static", "uploads"),
+        "THUMBNAIL_DIR": os.path.join(workdir, "static", "thumbnails"),
+        "RENDITION_CACHE_DIR": os.path.join(workdir, "static", "renditions"),
+        "ORPHAN_SWEEP_INTERVAL": "0",
+        "DB_ECHO": "false",
+        # 每次压测都是新库，启动时直接建表
+        "DB_AUTO_MIGRATE": "true",
+        # 压测时降低 bcrypt cost，避免登录本身成为瓶颈
+        "BCRYPT_ROUNDS": "4",
+        # 单个用户压吞吐，按用户限流会直接把请求挡掉 (公平性见 benchmarks/fair_queue.py)
+        "RATE_LIMIT_ENABLED": "false",
+        "CHAT_SUMMARY_MODE": args.chat_summary_mode,
+    })
+    if object_store is not None:
+        os.environ.update({
+            "STORAGE_BACKEND": "s3",
+            "S3_BUCKET": object_store.bucket,
+            "S3_ENDPOINT_URL": object_store.url,
+            "S3_ACCESS_KEY": "bench",
+            "S3_SECRET_KEY": "bench",
+            "STORAGE_STAGING_DIR": os.path.join(workdir, "staging"),
+        })
+    for key in ("UPLOAD_DIR", "THUMBNAIL_DIR"):
+        os.makedirs(os.environ[key], exist_ok=True)
+    # app 中的相对路径 (StaticFiles、数据库里存的 file_path) 都相对于工作目录
+    os.chdir(workdir)
+
+
+async def run_scenarios(args, base_url: str, photos) -> dict:
+    results = {}
+    rng = random.Random(args.seed)
+    user = {
+        "username": f"bench_{int(time.time() * 1000)}",
+        "email": f"bench_{int(time.time() * 1000)}@example.com",
+        "password": "bench-password",
+    }
+
+    limits = httpx.Limits(max_connections=max(args.concurrency, 10) * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=limits) as client:
+        (await client.post("/api/auth/register", json=user)).raise_for_status()
+        resp = await client.post("/api/auth/login", data={"username": user["username"], "password": user["password"]})
+        resp.raise_for_status()
+        client.headers["Authorization"] = f"Bearer {resp.json()['access_token']}"
+
+        uploaded_ids = []
+
+        if "upload" in args.scenarios:
+            def make_upload(path):
+                async def job():
+                    with open(path, "rb") as f:
+                        content = f.read()
+                    resp = await client.post("/api/images/upload", files={"file": (os.path.basename(path), content, "image/jpeg")})
+                    if resp.status_code == 200:
+                        uploaded_ids.append(resp.json()["id"])
+                    return resp
+                return job
+            results["upload"] = await run_jobs([make_upload(p) for p in photos], args.concurrency)
+
+        if "list" in args.scenarios:
+            pages = max(1, len(photos) // 20)
+            jobs = [
+                (lambda skip=rng.randrange(pages) * 20: client.get("/api/images/", params={"skip": skip, "limit": 20}))
+                for _ in range(args.requests)
+            ]
+            results["list"] = await run_jobs(jobs, args.concurrency)
+
+        if "search" in args.scenarios:
+            jobs = [
+                (lambda tag=rng.choice(CITIES)[0]: client.get("/api/images/", params={"tag": tag, "limit": 20}))
+                for _ in range(args.requests)
+            ]
+            results["search"] = await run_jobs(jobs, args.concurrency)
+
+        if "chat" in args.scenarios:
+            jobs = [
+                (lambda city=rng.choice(CITIES)[0]: client.post("/api/chat/completions", json={"message": f"帮我找 {city}", "history": []}))
+                for _ in range(max(1, args.requests // 10))
+            ]
+            results["chat"] = await run_jobs(jobs, args.concurrency)
+
+        if "delete" in args.scenarios and uploaded_ids:
+            half = len(uploaded_ids) // 2
+            single, batch = uploaded_ids[:half], uploaded_ids[half:]
+            results["delete"] = await run_jobs(
+                [(lambda i=i: client.delete(f"/api/images/{i}")) for i in single], args.concurrency
+            )
+            if batch:
+                summary = await run_jobs([lambda: client.post("/api/images/batch-delete", json={"ids": batch})], 1)
+                summary["images"] = len(batch)
+                results["batch_delete"] = summary
+
+    return results
+
+
+def main(args):
+    commit = _git_commit()  # chdir 到工作目录之前取
+    workdir = args.workdir or tempfile.mkdtemp(prefix="smartimage-bench-")
+    photos = build_library(
+        args.dataset_dir or os.path.join(tempfile.gettempdir(), "smartimage-bench-dataset"),
+        args.images, args.width, args.height, args.seed
+    )
+
+    amap_fake = amap_app(args.amap_latency, error_rate=args.error_rate)
+    llm_fake = siliconflow_app(args.llm_latency, error_rate=args.error_rate)
+    amap = ServerThread(amap_fake).start()
+    llm = ServerThread(llm_fake).start()
+    object_store = ObjectStoreThread().start() if args.storage == "s3" else None
+    configure_environment(args, workdir, amap.url, llm.url, object_store)
+
+    from app.main import app  # 环境变量就绪后再导入
+    api = ServerThread(app).start()
+
+    try:
+        results = asyncio.run(run_scenarios(args, api.url, photos))
+    finally:
+        api.stop()
+        amap.stop()
+        llm.stop()
+        if object_store is not None:
+            object_store.stop()
+
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": os.environ["DATABASE_URL"].split("://")[0],
+            "storage": args.storage,
+            "config": {
+                "images": args.images,
+                "size": f"{args.width}x{args.height}",
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "amap_latency_ms": args.amap_latency,
+                "llm_latency_ms": args.llm_latency,
+                "chat_summary_mode": args.chat_summary_mode,
+                "error_rate": args.error_rate,
+                "seed": args.seed,
+            },
+            "external_calls": {
+                "amap": amap_fake.state.stats["requests"],
+                "siliconflow": llm_fake.state.stats["requests"],
+            },
+        },
+        "results": results,
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+    print("\nscenario        count  err    rps     p50     p95     p99 (ms)", file=sys.stderr)
+    for name, r in results.items():
+        print(f"{name:<14} {r['count']:>6} {r['errors']:>4} {r['throughput_rps']:>7.1f} "
+              f"{r['p50_ms']:>7.1f} {r['p95_ms']:>7.1f} {r['p99_ms']:>7.1f}", file=sys.stderr)
+    return report
@@ -0,0 +1,47 @@
+"""
+相似图片检索的扫描耗时 (只测内存中的距离计算 + top-k，不含数据库)
+
+用法 (在 backend 目录下):
+    DATABASE_URL=sqlite+aiosqlite:///./bench.db SECRET_KEY=bench python -m benchmarks.similarity --images 100000 -k 20
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from app.services.similarity_service import FEATURE_DIM, _UserIndex
+
+
+def main(images: int, k: int, rounds: int, seed: int):
+    rng = np.random.default_rng(seed)
+    # 随机直方图，按与真实特征相同的方式归一化
+    raw = rng.random((images, FEATURE_DIM), dtype=np.float32)
+    matrix = np.sqrt(raw / raw.sum(axis=1, keepdims=True))
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+
+    start = time.perf_counter()
+    index = _UserIndex(None, np.arange(1, images + 1, dtype=np.int64), matrix)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    timings = []
+    for i in range(rounds):
+        query = matrix[i % images]
+        start = time.perf_counter()
+        index.search(query, k, i % images + 1)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    print(f"similar search  images={images} dim={FEATURE_DIM} k={k} matrix={matrix.nbytes / 1024 / 1024:.1f}MB")
+    print(f"  build norms: {build_ms:.1f} ms")
+    print(f"  search p50: {statistics.median(timings):.2f} ms  p95: {timings[int(len(timings) * 0.95) - 1]:.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=100000)
+    parser.add_argument("-k", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    main(args.images, args.k, args.rounds, args.seed)
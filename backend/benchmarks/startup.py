@@ -0,0 +1,143 @@
+"""
+API worker 冷启动：每次都在全新的解释器里测
+  - import: 导入 app.main 的耗时
+  - first_request: 启动 uvicorn 到 GET / 第一次返回 200 的耗时 (导入 + lifespan + 首个请求)
+
+用法 (在 backend 目录下):
+    python -m benchmarks.startup --runs 5 --output startup.json
+    python -m benchmarks.startup --top 15      # 额外列出累计导入最慢的模块 (python -X importtime)
+    python -m benchmarks.compare before.json after.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+
+import httpx
+
+from benchmarks.fakes import _free_port
+from benchmarks.runner import summarize, _git_commit
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_IMPORT_SNIPPET = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+
+
+def _environment(workdir: str) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": BACKEND_DIR,
+        "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(workdir, 'startup.db')}",
+        "SECRET_KEY": "benchmark-secret",
+        "UPLOAD_DIR": os.path.join(workdir, "static", "uploads"),
+        "THUMBNAIL_DIR": os.path.join(workdir, "static", "thumbnails"),
+        "RENDITION_CACHE_DIR": os.path.join(workdir, "static", "renditions"),
+        "ORPHAN_SWEEP_INTERVAL": "0",
+    })
+    return env
+
+
+def measure_import(env: dict, workdir: str) -> float:
+    out = subprocess.check_output([sys.executable, "-c", _IMPORT_SNIPPET], env=env, cwd=workdir)
+    return float(out.decode().strip().splitlines()[-1]) * 1000
+
+
+def measure_first_request(env: dict, workdir: str, timeout: float = 60.0) -> float:
+    port = _free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {proc.returncode}")
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/", timeout=1.0).status_code == 200:
+                    return (time.perf_counter() - start) * 1000
+            except httpx.TransportError:
+                pass
+            time.sleep(0.01)
+        raise TimeoutError("server did not answer in time")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def slowest_imports(env: dict, workdir: str, top: int):
+    """python -X importtime 的累计耗时，只看直接被 app.* 导入的第三方模块与 app 自身的模块"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        env=env, cwd=workdir, capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        # 缩进层级 <= 2 的是顶层依赖，更深的只是它们的子模块
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth <= 2:
+            rows.append((int(cumulative) / 1000, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main(args):
+    commit = _git_commit()
+    workdir = args.workdir or tempfile.mkdtemp(prefix="smartimage-startup-")
+    os.makedirs(os.path.join(workdir, "static"), exist_ok=True)
+    env = _environment(workdir)
+    # 表结构提前建好，lifespan 只做版本校验，与线上 worker 启动一致
+    subprocess.check_call([sys.executable, "-m", "app.cli.migrate"], env=env, cwd=workdir, stdout=subprocess.DEVNULL)
+
+    imports, first_requests = [], []
+    for _ in range(args.runs):
+        imports.append(measure_import(env, workdir))
+        first_requests.append(measure_first_request(env, workdir))
+
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {"runs": args.runs},
+        },
+        "results": {
+            "import": summarize(imports, 0, sum(imports) / 1000),
+            "first_request": summarize(first_requests, 0, sum(first_requests) / 1000),
+        },
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+    print(f"\n{'phase':<14} {'runs':>5} {'p50':>8} {'max':>8} (ms)", file=sys.stderr)
+    for name, r in report["results"].items():
+        print(f"{name:<14} {r['count']:>5} {r['p50_ms']:>8.1f} {r['max_ms']:>8.1f}", file=sys.stderr)
+
+    if args.top:
+        print(f"\nslowest imports (cumulative ms):", file=sys.stderr)
+        for ms, name in slowest_imports(env, workdir, args.top):
+            print(f"  {ms:8.1f}  {name}", file=sys.stderr)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=0, help="also list the N slowest imports")
+    parser.add_argument("--workdir", default=None)
+    parser.add_argument("--output", default=None)
+    main(parser.parse_args())
@@ -0,0 +1,80 @@
+"""
+测试环境：临时目录里的 SQLite (aiosqlite) 与本地存储，不访问 MySQL / 高德 / SiliconFlow。
+settings 在导入 app 时读取，环境变量必须在任何 app 模块导入之前设置。
+
+用法 (在 backend 目录下):
+    pip install -r requirements-dev.txt
+    python -m pytest -q
+"""
+import io
+import os
+import tempfile
+import uuid
+
+import pytest
+
+_WORKDIR = tempfile.mkdtemp(prefix="smartimage-test-")
+_STATIC = os.path.join(_WORKDIR, "static")
+os.environ.update({
+    "BASE_DIR": _WORKDIR,
+    "UPLOAD_DIR": os.path.join(_STATIC, "uploads"),
+    "THUMBNAIL_DIR": os.path.join(_STATIC, "thumbnails"),
+    "RENDITION_CACHE_DIR": os.path.join(_STATIC, "renditions"),
+    "STORAGE_STAGING_DIR": os.path.join(_WORKDIR, "staging"),
+    "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(_WORKDIR, 'test.db')}",
+    "DATABASE_REPLICA_URL": "",
+    "DB_AUTO_MIGRATE": "true",
+    "SECRET_KEY": "test-secret-key",
+    "STORAGE_BACKEND": "local",
+    "SILICONFLOW_API_KEY": "",
+    "AMAP_KEY": "",
+    "RATE_LIMIT_ENABLED": "false",
+    "RATE_LIMIT_DB": os.path.join(_WORKDIR, "ratelimit.db"),
+    "ORPHAN_SWEEP_INTERVAL": "0",
+    "CHANGE_PRUNE_INTERVAL": "0",
+    "CHANGE_FEED_SETTLE_SECONDS": "0",
+    "EVENT_LOOP_LAG_INTERVAL": "0",
+    "METRICS_TOKEN": "",
+})
+
+from fastapi.testclient import TestClient  # noqa: E402
+from PIL import Image as PILImage  # noqa: E402
+
+from app.main import app  # noqa: E402
+
+
+def make_jpeg(color=(200, 120, 40), size=(64, 48)) -> bytes:
+    buf = io.BytesIO()
+    PILImage.new("RGB", size, color).save(buf, "JPEG", quality=90)
+    return buf.getvalue()
+
+
+@pytest.fixture
+def client():
+    """每个测试一个新用户 (数据库在整个会话内共用，按用户隔离)，已带上登录 Token"""
+    with TestClient(app) as c:
+        username = f"u{uuid.uuid4().hex[:12]}"
+        user = c.post("/api/auth/register", json={"username": username, "email": f"{username}@example.com", "password": "pw"})
+        token = c.post("/api/auth/login", data={"username": username, "password": "pw"}).json()["access_token"]
+        c.headers["Authorization"] = f"Bearer {token}"
+        c.user_id = user.json()["id"]
+        yield c
+
+
+@pytest.fixture
+def upload(client):
+    """upload(n, color=...) 上传 n 张图片，返回 ID 列表"""
+    def _upload(n=1, color=(200, 120, 40)):
+        ids = []
+        for i in range(n):
+            r = client.post("/api/images/upload", files={"file": (f"p{i}.jpg", make_jpeg(color), "image/jpeg")})
+            assert r.status_code == 200, r.text
+            ids.append(r.json()["id"])
+        return ids
+    return _upload
+
+
+@pytest.fixture
+def run(client):
+    """在应用所在的事件循环里执行协程函数 (与请求共用同一个引擎 / 连接)"""
+    return client.portal.call
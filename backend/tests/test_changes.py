@@ -0,0 +1,106 @@
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from app.core.config import settings
+from app.db.database import SessionLocal
+from app.models.image import ImageChange
+from app.services.change_service import prune_changes
+
+
+def changes(client, since=None, **params):
+    if since is not None:
+        params["since"] = since
+    r = client.get("/api/images/changes", params=params)
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def test_feed_merges_changes_per_image(client, upload):
+    cursor = changes(client)["cursor"]
+    a, b = upload(2)
+    client.put(f"/api/images/{a}", json={"ai_description": "edited"})
+    client.delete(f"/api/images/{b}")
+
+    feed = changes(client, cursor)
+    assert feed["reset"] is False and feed["has_more"] is False
+    # a 的最终状态带上编辑后的描述；b 最后一次变更是删除，只出现在 deleted
+    assert [item["id"] for item in feed["upserted"]] == [a]
+    assert feed["upserted"][0]["ai_description"] == "edited"
+    assert feed["deleted"] == [b]
+
+    assert changes(client, feed["cursor"])["upserted"] == []
+
+
+def test_feed_pages_with_cursor(client, upload):
+    cursor = changes(client)["cursor"]
+    ids = upload(3)
+
+    first = changes(client, cursor, limit=2)
+    assert first["has_more"] is True
+    second = changes(client, first["cursor"], limit=2)
+    assert second["has_more"] is False
+    assert [i["id"] for i in first["upserted"] + second["upserted"]] == ids
+
+
+def test_feed_hides_unsettled_changes(client, upload, monkeypatch):
+    cursor = changes(client)["cursor"]
+    monkeypatch.setattr(settings, "CHANGE_FEED_SETTLE_SECONDS", 3600)
+    upload(1)
+    # 刚写入的变更可能还有更小 ID 的事务没提交，暂不返回
+    assert changes(client, cursor)["upserted"] == []
+
+
+def test_feed_is_per_user(client, upload):
+    cursor = changes(client)["cursor"]
+    mine = upload(1)
+
+    other = f"u{uuid.uuid4().hex[:12]}"
+    client.post("/api/auth/register", json={"username": other, "email": f"{other}@example.com", "password": "pw"})
+    token = client.post("/api/auth/login", data={"username": other, "password": "pw"}).json()["access_token"]
+    my_auth = client.headers["Authorization"]
+    client.headers["Authorization"] = f"Bearer {token}"
+    upload(1)
+
+    client.headers["Authorization"] = my_auth
+    assert [i["id"] for i in changes(client, cursor)["upserted"]] == mine
+
+
+def test_prune_signals_reset_to_stale_clients(client, upload, run):
+    stale = changes(client)["cursor"]
+    upload(3)
+
+    async def age_and_prune():
+        async with SessionLocal() as db:
+            await db.execute(
+                update(ImageChange)
+                .where(ImageChange.user_id == client.user_id)
+                .values(created_at=datetime.utcnow() - timedelta(days=settings.CHANGE_LOG_RETENTION_DAYS + 1))
+            )
+            await db.commit()
+            return await prune_changes(db, batch_size=1)
+
+    assert run(age_and_prune) >= 2
+
+    feed = changes(client, stale)
+    assert feed["reset"] is True
+    assert feed["upserted"] == [] and feed["deleted"] == []
+    # 全量重新拉取后从新游标继续，不会再收到 reset
+    assert changes(client, feed["cursor"])["reset"] is False
+    # 新客户端拿到的游标不低于保留下限
+    assert changes(client, changes(client)["cursor"])["reset"] is False
+
+
+def test_prune_keeps_newest_row(client, upload, run):
+    upload(1)
+
+    async def age_all_and_prune():
+        async with SessionLocal() as db:
+            await db.execute(update(ImageChange).values(created_at=datetime(2000, 1, 1)))
+            await db.commit()
+            await prune_changes(db, retention_days=1)
+            return (await db.execute(ImageChange.__table__.select())).all()
+
+    # 表清空后 SQLite 会从 1 重新分配 ID，游标会倒退，所以总留一条
+    assert len(run(age_all_and_prune)) == 1
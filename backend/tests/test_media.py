@@ -0,0 +1,87 @@
+import uuid
+
+import pytest
+
+from app.services.media_service import RangeNotSatisfiable, parse_range
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-9", (0, 9)),
+    ("bytes=10-", (10, 99)),
+    ("bytes=-10", (90, 99)),
+    ("bytes=-500", (0, 99)),
+    ("bytes=90-500", (90, 99)),
+    ("bytes=0-1,5-6", None),   # 多段：整体返回
+    ("bytes=a-b", None),
+    ("items=0-9", None),
+    ("", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 100) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=100-", "bytes=50-10", "bytes=-0"])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, 100)
+
+
+def test_original_supports_etag_and_ranges(client, upload):
+    image_id = upload(1)[0]
+    url = f"/api/media/{image_id}/original"
+
+    full = client.get(url)
+    assert full.status_code == 200
+    etag = full.headers["etag"]
+    size = len(full.content)
+
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    part = client.get(url, headers={"Range": "bytes=0-9"})
+    assert part.status_code == 206
+    assert part.content == full.content[:10]
+    assert part.headers["content-range"] == f"bytes 0-9/{size}"
+
+    # If-Range 与当前 ETag 一致才按 Range 返回，否则整体返回
+    assert client.get(url, headers={"Range": "bytes=0-9", "If-Range": etag}).status_code == 206
+    assert client.get(url, headers={"Range": "bytes=0-9", "If-Range": '"stale"'}).status_code == 200
+
+    r = client.get(url, headers={"Range": f"bytes={size}-"})
+    assert r.status_code == 416
+    assert r.headers["content-range"] == f"bytes */{size}"
+
+
+def test_media_cookie_session(client, upload):
+    image_id = upload(1)[0]
+    url = f"/api/media/{image_id}/thumbnail"
+    login_auth = client.headers.pop("Authorization")
+
+    # 登录 Token 不能放在查询参数里
+    assert client.get(url, params={"token": login_auth.split()[1]}).status_code == 401
+
+    client.headers["Authorization"] = login_auth
+    session = client.post("/api/media/session")
+    assert session.status_code == 200
+    media_token = session.cookies["media_session"]
+    client.headers.pop("Authorization")
+
+    assert client.get(url).status_code == 200
+    # 图片 Cookie 的 Token 只能访问图片，不能当登录 Token 用
+    assert client.get("/api/images/", headers={"Authorization": f"Bearer {media_token}"}).status_code == 401
+
+    client.delete("/api/media/session")
+    client.cookies.clear()
+    assert client.get(url).status_code == 401
+
+
+def test_media_is_scoped_to_owner(client, upload):
+    image_id = upload(1)[0]
+    other = f"u{uuid.uuid4().hex[:12]}"
+    client.post("/api/auth/register", json={"username": other, "email": f"{other}@example.com", "password": "pw"})
+    token = client.post("/api/auth/login", data={"username": other, "password": "pw"}).json()["access_token"]
+    r = client.get(f"/api/media/{image_id}/original", headers={"Authorization": f"Bearer {token}"})
+    assert r.status_code == 404
+
+
+def test_legacy_static_is_off_by_default(client):
+    assert client.get("/static/uploads/anything.jpg").status_code == 404
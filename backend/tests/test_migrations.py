@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import app.models.image  # noqa: F401  注册模型到 Base.metadata
+import app.models.user  # noqa: F401
+from app.db.database import Base
+from app.db.migrations import (
+    LATEST_VERSION, MIGRATIONS, _set_version, current_version, upgrade, verify_schema,
+)
+
+EXPECTED_INDEXES = {
+    "images": {"ix_images_content_hash", "ix_images_user_id_capture_time"},
+    "image_changes": {"ix_image_changes_user_id_id"},
+    "image_tag_map": {"ix_image_tag_map_tag_id_image_id"},
+}
+
+
+@pytest.fixture
+def engine_url(tmp_path):
+    return f"sqlite+aiosqlite:///{tmp_path / 'migrate.db'}"
+
+
+def run_with_engine(url, fn):
+    async def main():
+        engine = create_async_engine(url)
+        try:
+            return await fn(engine)
+        finally:
+            await engine.dispose()
+    return asyncio.run(main())
+
+
+async def inspect_schema(engine):
+    def collect(conn):
+        inspector = sa.inspect(conn)
+        return {
+            "version": current_version(conn),
+            "tables": set(inspector.get_table_names()),
+            "indexes": {
+                table: {ix["name"] for ix in inspector.get_indexes(table)}
+                for table in EXPECTED_INDEXES
+            },
+            "image_columns": {c["name"] for c in inspector.get_columns("images")},
+        }
+    async with engine.connect() as conn:
+        return await conn.run_sync(collect)
+
+
+def assert_latest_schema(schema):
+    assert schema["version"] == LATEST_VERSION
+    assert {"users", "images", "tags", "image_tag_map", "image_changes", "schema_version"} <= schema["tables"]
+    assert {"orientation", "content_hash", "blurhash", "dominant_color", "aspect_ratio", "features"} <= schema["image_columns"]
+    for table, names in EXPECTED_INDEXES.items():
+        assert names <= schema["indexes"][table], table
+
+
+def test_migration_versions_are_contiguous():
+    assert sorted(v for v, _, _ in MIGRATIONS) == list(range(1, LATEST_VERSION + 1))
+
+
+def test_fresh_database_upgrades_once(engine_url):
+    async def scenario(engine):
+        first = await upgrade(engine)
+        second = await upgrade(engine)
+        return first, second, await verify_schema(engine), await inspect_schema(engine)
+
+    first, second, verified, schema = run_with_engine(engine_url, scenario)
+    assert first == LATEST_VERSION
+    assert second == 0
+    assert verified == LATEST_VERSION
+    assert_latest_schema(schema)
+
+
+def test_verify_schema_rejects_unmigrated_database(engine_url):
+    async def scenario(engine):
+        with pytest.raises(RuntimeError, match="app.cli.migrate"):
+            await verify_schema(engine)
+        # 只迁到一半同样拒绝启动
+        async with engine.begin() as conn:
+            await conn.run_sync(MIGRATIONS[0][2])
+            await conn.run_sync(lambda c: _set_version(c, 1))
+        with pytest.raises(RuntimeError, match=f"needs {LATEST_VERSION}"):
+            await verify_schema(engine)
+
+    run_with_engine(engine_url, scenario)
+
+
+def test_create_all_database_upgrades_in_place(engine_url):
+    """create_all 时代建出的库：表、列、索引已存在，每一步都要跳过而不是报错"""
+    async def scenario(engine):
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.execute(sa.text(
+                "INSERT INTO users (id, username, email, hashed_password) VALUES (1, 'u', 'u@x', 'h')"
+            ))
+        applied = await upgrade(engine)
+        again = await upgrade(engine)
+        async with engine.connect() as conn:
+            users = (await conn.execute(sa.text("SELECT count(*) FROM users"))).scalar()
+        return applied, again, users, await inspect_schema(engine)
+
+    applied, again, users, schema = run_with_engine(engine_url, scenario)
+    assert applied == LATEST_VERSION
+    assert again == 0
+    assert users == 1
+    assert_latest_schema(schema)
+
+
+def test_each_migration_can_be_replayed(engine_url):
+    """MySQL 的 DDL 会隐式提交，中途失败后会从上一个版本重跑：每一步重复执行都不能出错"""
+    async def scenario(engine):
+        await upgrade(engine)
+        async with engine.begin() as conn:
+            for _, _, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+                await conn.run_sync(fn)
+        return await inspect_schema(engine)
+
+    assert_latest_schema(run_with_engine(engine_url, scenario))
@@ -0,0 +1,144 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.core.ratelimit import LIMITERS, EndpointLimiter, FairQueue, RateLimited, TokenBucketStore
+
+
+def test_fair_queue_interleaves_users():
+    async def scenario():
+        queue = FairQueue("test-order", concurrency=1, max_pending_per_user=10, timeout=5)
+        order = []
+        gate = asyncio.Event()
+
+        async def job(user, tag):
+            async with queue.slot(user):
+                order.append(tag)
+                await gate.wait()
+
+        first = asyncio.create_task(job("a", "a0"))
+        await asyncio.sleep(0)
+        # a 先排了三个，b 后到，但 b 不应排在 a 的全部请求之后
+        tasks = [asyncio.create_task(job("a", f"a{i}")) for i in (1, 2, 3)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(job("b", "b0")))
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(first, *tasks)
+        return order
+
+    order = asyncio.run(scenario())
+    assert order[0] == "a0"
+    assert order.index("b0") < order.index("a3")
+    assert sorted(order) == ["a0", "a1", "a2", "a3", "b0"]
+
+
+def test_fair_queue_limits_pending_per_user():
+    async def scenario():
+        queue = FairQueue("test-full", concurrency=1, max_pending_per_user=1, timeout=5)
+        await queue.acquire("a")
+        waiter = asyncio.create_task(queue.acquire("a"))
+        await asyncio.sleep(0)
+        with pytest.raises(RateLimited) as exc:
+            await queue.acquire("a")
+        # 其他用户不受影响
+        other = asyncio.create_task(queue.acquire("b"))
+        await asyncio.sleep(0)
+        queue.release()
+        queue.release()
+        await asyncio.gather(waiter, other)
+        return exc.value
+
+    err = asyncio.run(scenario())
+    assert err.reason == "queue_full" and err.retry_after >= 1
+
+
+def test_fair_queue_timeout_releases_nothing():
+    async def scenario():
+        queue = FairQueue("test-timeout", concurrency=1, max_pending_per_user=5, timeout=0.05)
+        await queue.acquire("a")
+        with pytest.raises(RateLimited) as exc:
+            await queue.acquire("b")
+        queue.release()
+        return exc.value, queue.active, queue.waiting()
+
+    err, active, waiting = asyncio.run(scenario())
+    assert err.reason == "queue_timeout"
+    assert (active, waiting) == (0, 0)
+
+
+def test_token_bucket_refills_and_refund_is_capped(tmp_path):
+    store = TokenBucketStore(str(tmp_path / "buckets.db"))
+    assert store.take("k", per_minute=60, burst=2) == 0
+    assert store.take("k", per_minute=60, burst=2) == 0
+    wait = store.take("k", per_minute=60, burst=2)
+    assert 0 < wait <= 1
+
+    store.refund("k", burst=2, cost=5)
+    assert store.take("k", per_minute=60, burst=2) == 0
+    assert store.take("k", per_minute=60, burst=2) == 0
+    assert store.take("k", per_minute=60, burst=2) > 0
+    store.close()
+
+
+def test_queue_full_does_not_spend_tokens(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+
+    async def scenario():
+        limiter = EndpointLimiter("test-refund", per_minute=1, burst=2, concurrency=1)
+        limiter.queue.max_pending_per_user = 1
+        user = f"refund-{time.time_ns()}"
+        gate = asyncio.Event()
+
+        async def hold():
+            async with limiter.limit(user):
+                await gate.wait()
+
+        tasks = [asyncio.create_task(hold()), asyncio.create_task(hold())]
+        await asyncio.sleep(0.2)
+        for _ in range(3):
+            with pytest.raises(RateLimited) as exc:
+                async with limiter.limit(user):
+                    pass
+            assert exc.value.reason == "queue_full"
+        gate.set()
+        await asyncio.gather(*tasks)
+        # 两个请求用掉了全部额度，被拒绝的三个没有再扣
+        with pytest.raises(RateLimited) as exc:
+            async with limiter.limit(user):
+                pass
+        return exc.value.reason
+
+    assert asyncio.run(scenario()) == "rate"
+
+
+def test_background_wait_queues_instead_of_rejecting(monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+
+    async def scenario():
+        limiter = EndpointLimiter("test-wait", per_minute=600, burst=1, concurrency=1)
+        user = f"wait-{time.time_ns()}"
+        start = time.perf_counter()
+        for _ in range(3):
+            async with limiter.wait(user):
+                pass
+        return time.perf_counter() - start
+
+    # 第一个用掉 burst，后两个各等约 0.1 秒
+    assert asyncio.run(scenario()) >= 0.15
+
+
+def test_rate_limited_request_gets_retry_after(client, upload, monkeypatch):
+    monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+    limiter = LIMITERS["analyze"]
+    monkeypatch.setattr(limiter, "per_minute", 1)
+    monkeypatch.setattr(limiter, "burst", 1)
+    image_id = upload(1)[0]
+
+    # 第一次通过限流 (没配置 API Key，接口本身返回 500)
+    assert client.post(f"/api/images/{image_id}/analyze").status_code == 500
+    r = client.post(f"/api/images/{image_id}/analyze")
+    assert r.status_code == 429
+    assert 1 <= int(r.headers["retry-after"]) <= 60
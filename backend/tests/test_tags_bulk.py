@@ -0,0 +1,124 @@
+import uuid
+
+import pytest
+
+
+@pytest.fixture
+def names():
+    """标签表全局共用，每个测试用带随机后缀的标签名"""
+    suffix = uuid.uuid4().hex[:8]
+    return lambda *base: [f"{b}-{suffix}" for b in base]
+
+
+def tags_of(client, image_id):
+    return {t["name"] for t in client.get(f"/api/images/{image_id}").json()["tags"]}
+
+
+def add_tags(client, image_id, tags):
+    assert client.put(f"/api/images/{image_id}", json={"custom_tags": tags}).status_code == 200
+
+
+def bulk(client, **body):
+    return client.post("/api/images/tags/bulk", json=body)
+
+
+def test_add_and_remove_by_ids(client, upload, names):
+    a, b, c = upload(3)
+    beach, sunset = names("beach", "sunset")
+    add_tags(client, a, [beach])
+
+    r = bulk(client, op="add", ids=[a, b], tags=[beach, sunset])
+    assert r.status_code == 200
+    # a 只缺 sunset，b 两个都缺
+    assert r.json() == {"op": "add", "images": 2, "added": 3, "removed": 0}
+    assert {beach, sunset} <= tags_of(client, a)
+    assert {beach, sunset} <= tags_of(client, b)
+    assert not {beach, sunset} & tags_of(client, c)
+
+    r = bulk(client, op="remove", ids=[a, b, c], tags=[sunset])
+    assert r.json() == {"op": "remove", "images": 2, "added": 0, "removed": 2}
+    assert sunset not in tags_of(client, a) | tags_of(client, b)
+
+
+def test_rename_collides_with_existing_target(client, upload, names):
+    a, b = upload(2)
+    cat, kitty = names("cat", "kitty")
+    add_tags(client, a, [cat])
+    add_tags(client, b, [cat, kitty])
+
+    # 不带筛选条件：作用于当前用户的全部图片；b 已有 kitty，不能撞主键
+    r = bulk(client, op="rename", tags=[cat], target=kitty)
+    assert r.status_code == 200, r.text
+    assert r.json() == {"op": "rename", "images": 2, "added": 1, "removed": 2}
+    assert kitty in tags_of(client, a) and cat not in tags_of(client, a)
+    assert kitty in tags_of(client, b) and cat not in tags_of(client, b)
+
+
+def test_merge_only_touches_scope(client, upload, names):
+    a, b, c = upload(3)
+    dog, puppy, pet = names("dog", "puppy", "pet")
+    add_tags(client, a, [dog, puppy])
+    add_tags(client, b, [puppy, pet])
+    add_tags(client, c, [dog])
+
+    r = bulk(client, op="merge", ids=[a, b], tags=[dog, puppy, pet], target=pet)
+    assert r.status_code == 200
+    # 目标标签本身不算源标签：a 摘 dog+puppy 加 pet，b 摘 puppy
+    assert r.json() == {"op": "merge", "images": 2, "added": 1, "removed": 3}
+    assert pet in tags_of(client, a) and not {dog, puppy} & tags_of(client, a)
+    assert pet in tags_of(client, b) and puppy not in tags_of(client, b)
+    assert dog in tags_of(client, c)
+
+
+def test_rename_by_tag_filter(client, upload, names):
+    a, b = upload(2)
+    old, new, keep = names("old", "new", "keep")
+    add_tags(client, a, [old, keep])
+    add_tags(client, b, [old])
+
+    # 范围子查询按标签筛选，同时删的又是 image_tag_map 本身
+    r = bulk(client, op="rename", tag=keep, tags=[old], target=new)
+    assert r.json()["images"] == 1
+    assert new in tags_of(client, a) and old not in tags_of(client, a)
+    assert old in tags_of(client, b)
+
+
+def test_unscoped_rename_leaves_other_users_alone(client, upload, names):
+    mine = upload(1)[0]
+    shared, renamed = names("shared", "renamed")
+    add_tags(client, mine, [shared])
+
+    other = f"u{uuid.uuid4().hex[:12]}"
+    client.post("/api/auth/register", json={"username": other, "email": f"{other}@example.com", "password": "pw"})
+    other_token = client.post("/api/auth/login", data={"username": other, "password": "pw"}).json()["access_token"]
+    my_auth = client.headers["Authorization"]
+    client.headers["Authorization"] = f"Bearer {other_token}"
+    theirs = upload(1)[0]
+    add_tags(client, theirs, [shared])
+
+    client.headers["Authorization"] = my_auth
+    assert bulk(client, op="rename", tags=[shared], target=renamed).json()["images"] == 1
+
+    client.headers["Authorization"] = f"Bearer {other_token}"
+    assert shared in tags_of(client, theirs)
+
+
+def test_bulk_records_changes(client, upload, names):
+    a, b = upload(2)
+    cursor = client.get("/api/images/changes").json()["cursor"]
+    (tag,) = names("feed")
+
+    bulk(client, op="add", ids=[a], tags=[tag])
+    feed = client.get(f"/api/images/changes?since={cursor}").json()
+    assert [item["id"] for item in feed["upserted"]] == [a]
+    assert tag in feed["upserted"][0]["tags"]
+
+
+@pytest.mark.parametrize("body", [
+    {"op": "add", "tags": ["x"]},  # add / remove 必须带筛选条件
+    {"op": "rename", "tags": ["x", "y"], "target": "z"},
+    {"op": "merge", "tags": ["x"]},
+    {"op": "add", "ids": [1], "tags": ["  "]},
+])
+def test_bulk_rejects_invalid_requests(client, body):
+    assert bulk(client, **body).status_code == 400
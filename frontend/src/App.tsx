@@ -1,3 +1,4 @@
+import { useEffect } from 'react';
 import { BrowserRouter, Routes, Route, Navigate } from 'react-router-dom';
 import Auth from './pages/Auth';
 import AppLayout from './components/AppLayout';
@@ -5,6 +6,7 @@ import Home from './pages/Home';
 import AI from './pages/AiAssistant';
 import Profile from './pages/Profile';
 import Detail from './pages/Detail';
+import { startMediaSession } from './utils/request';
 
 function PrivateRoute({ children }: { children: JSX.Element }) {
   const token = localStorage.getItem('token');
@@ -12,6 +14,9 @@ function PrivateRoute({ children }: { children: JSX.Element }) {
 }
 
 export default function App() {
+  // 刷新页面后 Cookie 可能已过期，先续一次图片 Cookie
+  useEffect(() => { startMediaSession(); }, []);
+
   return (
     <BrowserRouter>
       <Routes>
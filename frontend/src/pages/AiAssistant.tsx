@@ -2,7 +2,7 @@ import React, { useState, useRef, useEffect } from 'react';
 import { NavBar, Input, Button, Avatar, Toast, Image } from 'antd-mobile';
 import { SendOutline, PictureOutline } from 'antd-mobile-icons';
 import { useNavigate } from 'react-router-dom';
-import request, { STATIC_URL } from '../utils/request';
+import request, { mediaUrl } from '../utils/request';
 import dayjs from 'dayjs';
 
 interface Message {
@@ -40,7 +40,8 @@ export default function AiAssistant() {
       // 2. 发送给后端
       const res: any = await request.post('/chat/completions', {
         message: userMsg,
-        history: newHistory.filter(m => m.role !== 'assistant').map(m => ({ role: m.role, content: m.content })).slice(-5)
+        // 完整的之前对话 (不含欢迎语和本轮消息)，图片只带 ID，由后端按 token 预算裁剪
+        history: messages.slice(1).map(m => ({ role: m.role, content: m.content, image_ids: m.images?.map((img: any) => img.id) }))
       });
 
       // 3. 添加 AI 回复
@@ -105,7 +106,7 @@ export default function AiAssistant() {
                         }}
                       >
                         <Image 
-                          src={`${STATIC_URL}/${img.thumbnail_path}`} 
+                          src={mediaUrl(img.id, 'thumbnail')} 
                           fit='cover' 
                           style={{ width: 120, height: 120, display: 'block' }} 
                         />
@@ -1,7 +1,7 @@
 import  { useState } from 'react';
 import { Form, Input, Button, Card, Toast, AutoCenter } from 'antd-mobile';
 import { useNavigate } from 'react-router-dom';
-import request from '../utils/request';
+import request, { startMediaSession } from '../utils/request';
 
 export default function Auth() {
   const navigate = useNavigate();
@@ -16,6 +16,7 @@ export default function Auth() {
         formData.append('password', values.password);
         const res: any = await request.post('/auth/login', formData);
         localStorage.setItem('token', res.access_token);
+        await startMediaSession();
         Toast.show('登录成功');
         navigate('/home');
       } else {
@@ -12,7 +12,7 @@ import {
 } from 'antd-mobile-icons';
 import Cropper, { type ReactCropperElement } from "react-cropper";
 import "cropperjs/dist/cropper.css";
-import request, { STATIC_URL } from '../utils/request';
+import request, { mediaUrl } from '../utils/request';
 import dayjs from 'dayjs';
 
 export default function Detail() {
@@ -160,7 +160,7 @@ export default function Detail() {
 
   const handleDownload = () => {
     const link = document.createElement('a');
-    link.href = `${STATIC_URL}/${data.file_path}`;
+    link.href = mediaUrl(data.id, 'original');
     link.download = data.filename;
     document.body.appendChild(link);
     link.click();
@@ -231,7 +231,7 @@ export default function Detail() {
   };
 
   if (!data) return <div style={{ padding: 50, textAlign: 'center', color: '#999' }}>加载中...</div>;
-  const imgUrl = `${STATIC_URL}/${data.file_path}`;
+  const imgUrl = mediaUrl(data.id, 'original');
 
   // --- 视图 1: 修图编辑器 ---
   if (isEditing) {
@@ -7,7 +7,7 @@ import {
   MessageOutline // 新增：AI 助手图标
 } from 'antd-mobile-icons';
 import { useNavigate } from 'react-router-dom';
-import request, { STATIC_URL } from '../utils/request';
+import request, { mediaUrl } from '../utils/request';
 import dayjs from 'dayjs';
 
 export default function Home() {
@@ -134,10 +134,10 @@ export default function Home() {
     }
   };
 
-  const handleDownload = (filePath: string) => {
+  const handleDownload = (img: any) => {
     const link = document.createElement('a');
-    link.href = `${STATIC_URL}/${filePath}`;
-    link.download = filePath.split('/').pop() || 'image.jpg';
+    link.href = mediaUrl(img.id, 'original');
+    link.download = img.filename || img.file_path.split('/').pop() || 'image.jpg';
     document.body.appendChild(link);
     link.click();
     document.body.removeChild(link);
@@ -198,7 +198,7 @@ export default function Home() {
               <EditSOutline fontSize={24} />
               <div style={{ fontSize: 10, marginTop: 2 }}>编辑/详情</div>
             </div>
-            <div onClick={() => handleDownload(currentImg.file_path)} style={{ textAlign: 'center', opacity: 0.9 }}>
+            <div onClick={() => handleDownload(currentImg)} style={{ textAlign: 'center', opacity: 0.9 }}>
               <DownlandOutline fontSize={24} />
               <div style={{ fontSize: 10, marginTop: 2 }}>原图下载</div>
             </div>
@@ -272,7 +272,8 @@ export default function Home() {
                   border: isSelectionMode && isSelected ? '2px solid #1677ff' : 'none'
                 }}
               >
-                <img src={`${STATIC_URL}/${item.thumbnail_path}`} loading="lazy" alt="img" style={{ display: 'block', width: '100%' }} />
+                {/* 缩略图下载前：按 aspect_ratio 预留高度，用主色调占位，避免瀑布流跳动 */}
+                <img src={mediaUrl(item.id, 'thumbnail')} loading="lazy" alt="img" style={{ display: 'block', width: '100%', aspectRatio: item.aspect_ratio || undefined, objectFit: 'cover', background: item.dominant_color || '#f0f2f5' }} />
                 
                 {/* 遮罩层：增强文字可读性 */}
                 {!isSelectionMode && (
@@ -312,7 +313,7 @@ export default function Home() {
         <>
           {renderViewerOverlay()}
           <ImageViewer.Multi
-            images={data.map(item => `${STATIC_URL}/${item.file_path}`)}
+            images={data.map(item => mediaUrl(item.id, 'original'))}
             visible={viewerVisible}
             defaultIndex={viewerIndex}
             onClose={() => setViewerVisible(false)}
@@ -321,7 +322,7 @@ export default function Home() {
         </>
       )}
 
-      <input type="file" multiple ref={fileRef} style={{ display: 'none' }} accept="image/*" onChange={handleUpload} />
+      <input type="file" multiple ref={fileRef} style={{ display: 'none' }} accept="image/*,.heic,.heif,.dng,.cr2,.cr3,.nef,.arw,.raf,.orf,.rw2" onChange={handleUpload} />
       
       {!isSelectionMode && (
         <>
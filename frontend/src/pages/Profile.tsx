@@ -1,6 +1,7 @@
 
 import { List,  Avatar } from 'antd-mobile';
 import { useNavigate } from 'react-router-dom';
+import { endMediaSession } from '../utils/request';
 
 export default function Profile() {
   const navigate = useNavigate();
@@ -11,7 +12,7 @@ export default function Profile() {
         <h2>用户中心</h2>
       </div>
       <List>
-        <List.Item onClick={() => { localStorage.removeItem('token'); navigate('/login'); }} style={{ color: 'red' }}>退出登录</List.Item>
+        <List.Item onClick={async () => { await endMediaSession(); localStorage.removeItem('token'); navigate('/login'); }} style={{ color: 'red' }}>退出登录</List.Item>
       </List>
     </div>
   );
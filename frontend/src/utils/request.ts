@@ -4,8 +4,9 @@ import { Toast } from 'antd-mobile';
 // 动态获取 Base URL (兼容 Vite 代理)
 export const baseURL = '/api'; 
 
-// 保持之前的修复：置空 STATIC_URL，避免路径重复拼接
-export const STATIC_URL = ''; 
+// 图片统一走 /api/media (按用户鉴权)；<img> 带不了 Authorization 头，靠 startMediaSession 下发的 Cookie
+export const mediaUrl = (id: number, kind: 'original' | 'thumbnail' = 'thumbnail') =>
+  `${baseURL}/media/${id}/${kind}`;
 
 const service = axios.create({
   baseURL: baseURL,
@@ -71,4 +72,23 @@ service.interceptors.response.use(
   }
 );
 
-export default service;
\ No newline at end of file
+let mediaSessionTimer: ReturnType<typeof setTimeout> | undefined;
+
+// 用登录 Token 换图片 Cookie，在过期前自动续期
+export const startMediaSession = async () => {
+  clearTimeout(mediaSessionTimer);
+  if (!localStorage.getItem('token')) return;
+  try {
+    const res: any = await service.post('/media/session');
+    mediaSessionTimer = setTimeout(startMediaSession, (res.expires_in * 1000) / 2);
+  } catch (e) { /* 拦截器已处理 */ }
+};
+
+export const endMediaSession = async () => {
+  clearTimeout(mediaSessionTimer);
+  try {
+    await service.delete('/media/session');
+  } catch (e) { /* 拦截器已处理 */ }
+};
+
+export default service;
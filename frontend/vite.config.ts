@@ -8,15 +8,10 @@ export default defineConfig({
     host: '0.0.0.0', // 【关键】允许局域网访问
     port: 5173,      // 指定端口（可选）
     proxy: {
-      // 1. 代理 API 请求
+      // 代理 API 请求 (图片也走 /api/media)
       '/api': {
         target: 'http://127.0.0.1:8000', // 后端地址
         changeOrigin: true,
-      },
-      // 2. 代理静态资源 (图片)
-      '/static': {
-        target: 'http://127.0.0.1:8000',
-        changeOrigin: true,
       }
     }
   }